@@ -0,0 +1,169 @@
+"""Индекс активных погодных предупреждений в памяти процесса"""
+import bisect
+import heapq
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from peewee import Case, fn
+from models import WeatherAlert, SEVERITY_RANKS
+from storage import naive_utc
+
+# Поля предупреждения с метками времени
+TIME_FIELDS = ('start_time', 'end_time', 'issued_at')
+# Метка, записанная строкой со смещением пояса ('2020-01-01 00:00:00+00:00')
+AWARE_TEXT_GLOB = '*[+-][0-9][0-9]:[0-9][0-9]'
+
+def alert_row(alert) -> Dict[str, Any]:
+    """Поля для WeatherAlert из схемы WeatherAlertCreate: метки времени в UTC без пояса, как в базе"""
+    row = alert.model_dump()
+    for key in TIME_FIELDS:
+        row[key] = naive_utc(row[key])
+    return row
+
+def migrate_aware_times() -> int:
+    """Перевод меток, записанных строкой с часовым поясом, в UTC без пояса; возвращает число записей"""
+    fields = [getattr(WeatherAlert, key) for key in TIME_FIELDS]
+    condition = None
+    for field in fields:
+        aware = fn.glob(AWARE_TEXT_GLOB, field)
+        condition = aware if condition is None else condition | aware
+    rows = list(WeatherAlert.select(WeatherAlert.id, *fields).where(condition).tuples())
+    for alert_id, *values in rows:
+        # Peewee не разбирает такие строки и возвращает их как есть
+        update = {
+            field: naive_utc(datetime.fromisoformat(value) if isinstance(value, str) else value)
+            for field, value in zip(fields, values)
+        }
+        WeatherAlert.update(update).where(WeatherAlert.id == alert_id).execute()
+    return len(rows)
+
+class ActiveAlertIndex:
+    """Интервальный индекс действующих и будущих предупреждений (is_active, end_time >= now).
+
+    Начала хранятся в отсортированном списке, окончания — в куче: запрос на момент времени
+    берет предупреждения с началом не позже него, а закончившиеся вычищаются из кучи при обращении.
+    Индекс обновляют обработчики предупреждений и поток проверки аномалий после фиксации
+    транзакции; записи — словари to_dict(), отсортированные по рангу серьезности и времени выдачи.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._alerts: Dict[int, Dict[str, Any]] = {}
+        self._starts: List[Tuple[datetime, int]] = []
+        self._ends: List[Tuple[datetime, int]] = []
+        self._by_location: Dict[int, Set[int]] = {}
+        self.loads = 0
+        self.updates = 0
+        self.queries = 0
+
+    def load(self, now: Optional[datetime] = None):
+        """Заполнение индекса из базы (при запуске); заодно проставляет ранги старым записям
+        и переводит в UTC метки, сохраненные с часовым поясом"""
+        now = now or datetime.now()
+        migrated = migrate_aware_times()
+        if migrated:
+            print(f"✅ Метки времени предупреждений переведены в UTC ({migrated})")
+        (WeatherAlert
+         .update(severity_rank=Case(WeatherAlert.severity, list(SEVERITY_RANKS.items()), 0))
+         .where((WeatherAlert.severity_rank == 0) & WeatherAlert.severity.in_(list(SEVERITY_RANKS)))
+         .execute())
+        alerts = list(WeatherAlert
+                      .select()
+                      .where((WeatherAlert.is_active == True) & (WeatherAlert.end_time >= now)))
+        with self._lock:
+            self._alerts.clear()
+            self._starts.clear()
+            self._ends.clear()
+            self._by_location.clear()
+            for alert in alerts:
+                self._add(alert.to_dict())
+            self.loads += 1
+        print(f"✅ Индекс активных предупреждений заполнен ({len(alerts)})")
+
+    def put(self, alert: WeatherAlert):
+        """Добавление или замена предупреждения после создания или изменения"""
+        data = alert.to_dict()
+        for key in TIME_FIELDS:
+            data[key] = naive_utc(data[key])
+        with self._lock:
+            self._remove(alert.id)
+            if data['is_active'] and data['end_time'] >= datetime.now():
+                self._add(data)
+            self.updates += 1
+
+    def remove(self, alert_id: int):
+        with self._lock:
+            self._remove(alert_id)
+            self.updates += 1
+
+    def remove_location(self, location_id: int):
+        """Удаление предупреждений местоположения (каскадное удаление в базе)"""
+        with self._lock:
+            for alert_id in list(self._by_location.get(location_id, ())):
+                self._remove(alert_id)
+            self.updates += 1
+
+    def _add(self, data: Dict[str, Any]):
+        self._alerts[data['id']] = data
+        bisect.insort(self._starts, (data['start_time'], data['id']))
+        heapq.heappush(self._ends, (data['end_time'], data['id']))
+        self._by_location.setdefault(data['location_id'], set()).add(data['id'])
+
+    def _remove(self, alert_id: int):
+        # Запись в куче окончаний остается и отбрасывается при очистке
+        data = self._alerts.pop(alert_id, None)
+        if data is None:
+            return
+        index = bisect.bisect_left(self._starts, (data['start_time'], alert_id))
+        del self._starts[index]
+        location_ids = self._by_location[data['location_id']]
+        location_ids.discard(alert_id)
+        if not location_ids:
+            del self._by_location[data['location_id']]
+
+    def _prune(self, now: datetime):
+        while self._ends and self._ends[0][0] < now:
+            end_time, alert_id = heapq.heappop(self._ends)
+            data = self._alerts.get(alert_id)
+            if data is not None and data['end_time'] == end_time:
+                self._remove(alert_id)
+
+    def active(self, now: Optional[datetime] = None, location_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Предупреждения, действующие в момент now, от самых серьезных к менее серьезным"""
+        now = now or datetime.now()
+        with self._lock:
+            # Очистка только по текущему времени: запрос на другой момент не должен терять записи
+            self._prune(min(now, datetime.now()))
+            self.queries += 1
+            if location_id is None:
+                end = bisect.bisect_right(self._starts, (now, float('inf')))
+                candidates = [self._alerts[alert_id] for _, alert_id in self._starts[:end]]
+            else:
+                candidates = [self._alerts[alert_id] for alert_id in self._by_location.get(location_id, ())]
+            found = [data for data in candidates if data['start_time'] <= now <= data['end_time']]
+        return sorted(found, key=lambda data: (data['severity_rank'], data['issued_at'], data['id']), reverse=True)
+
+    def next_change(self, location_id: int, now: Optional[datetime] = None) -> Optional[datetime]:
+        """Ближайший момент, когда у местоположения начнется или закончится предупреждение"""
+        now = now or datetime.now()
+        with self._lock:
+            boundaries = []
+            for alert_id in self._by_location.get(location_id, ()):
+                data = self._alerts[alert_id]
+                if data['start_time'] > now:
+                    boundaries.append(data['start_time'])
+                elif data['end_time'] >= now:
+                    boundaries.append(data['end_time'])
+        return min(boundaries, default=None)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._alerts)
+        return {
+            'size': size,
+            'loads': self.loads,
+            'updates': self.updates,
+            'queries': self.queries,
+        }
+
+active_alerts = ActiveAlertIndex()
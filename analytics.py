@@ -0,0 +1,107 @@
+"""Аналитика показаний датчика за окно: процентили, скользящее среднее, скорость изменения, тренд (NumPy)"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+import config
+import rollups
+from storage import iter_sensor_window
+
+RAW_DTYPE = np.dtype([('timestamp', 'i8'), ('value', 'f8')])
+# Одна строка — интервал агрегата; сырое показание — интервал из одного измерения
+WINDOW_DTYPE = np.dtype([('timestamp', 'i8'), ('value', 'f8'), ('count', 'i8'), ('min', 'f8'), ('max', 'f8')])
+
+# Окна длиннее ANALYTICS_RAW_HOURS: до 14 суток — поминутные агрегаты, до года — почасовые, дальше — суточные
+ROLLUP_SOURCES = ((timedelta(days=14), '1m'), (timedelta(days=366), '1h'))
+
+PERCENTILES = (5, 50, 95)
+MS_PER_HOUR = 3600000
+
+def choose_source(start: datetime, end: datetime, now: Optional[datetime] = None) -> str:
+    """Источник окна: 'raw' или разрешение агрегатов; сырые показания старше срока хранения не читаются"""
+    now = now or datetime.now()
+    raw_kept = not config.RAW_RETENTION_DAYS or start >= now - timedelta(days=config.RAW_RETENTION_DAYS)
+    if raw_kept and end - start <= timedelta(hours=config.ANALYTICS_RAW_HOURS):
+        return 'raw'
+    for span, resolution in ROLLUP_SOURCES:
+        if end - start <= span:
+            return resolution
+    return '1d'
+
+def load_window(sensor_id: int, start: datetime, end: datetime, source: str) -> np.ndarray:
+    """Окно [start, end) по возрастанию времени; массив заполняется прямо из курсора .tuples()"""
+    if source != 'raw':
+        return np.fromiter(rollups.iter_window(sensor_id, source, start, end), dtype=WINDOW_DTYPE)
+    raw = np.fromiter(iter_sensor_window(sensor_id, start, end), dtype=RAW_DTYPE)
+    window = np.empty(len(raw), dtype=WINDOW_DTYPE)
+    window['timestamp'] = raw['timestamp']
+    window['value'] = window['min'] = window['max'] = raw['value']
+    window['count'] = 1
+    return window
+
+def analyze(window: np.ndarray, start_ms: int, rolling_ms: int) -> Dict[str, Any]:
+    """Показатели окна; для агрегатов значения интервалов взвешиваются числом измерений.
+
+    Среднее, минимум и максимум по агрегатам точные, процентили и тренд — по средним интервалов.
+    """
+    size = len(window)
+    if not size:
+        return {'count': 0, 'timestamps': [], 'rolling_mean': []}
+    timestamps = window['timestamp']
+    values = window['value']
+    weights = window['count'].astype(np.float64)
+    total = weights.sum()
+    mean = float((values * weights).sum() / total)
+
+    if (weights == 1).all():
+        percentiles = np.percentile(values, PERCENTILES)
+    else:
+        order = np.argsort(values, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        index = np.searchsorted(cumulative, np.array(PERCENTILES) / 100 * total)
+        percentiles = values[order][np.minimum(index, size - 1)]
+
+    # Скользящее среднее по времени: окно (t - rolling, t] через префиксные суммы
+    sums = np.r_[0.0, np.cumsum(values * weights)]
+    counts = np.r_[0.0, np.cumsum(weights)]
+    left = np.searchsorted(timestamps, timestamps - rolling_ms, side='right')
+    right = np.arange(1, size + 1)
+    rolling_mean = (sums[right] - sums[left]) / (counts[right] - counts[left])
+
+    result = {
+        'count': int(total),
+        'mean': mean,
+        'min': float(window['min'].min()),
+        'max': float(window['max'].max()),
+        **{f'p{q}': float(value) for q, value in zip(PERCENTILES, percentiles)},
+        'timestamps': timestamps.astype('datetime64[ms]').tolist(),
+        'rolling_mean': rolling_mean.tolist(),
+    }
+
+    # Скорость изменения между соседними точками, в единицах датчика за час
+    hours = np.diff(timestamps) / MS_PER_HOUR
+    moving = hours > 0
+    rates = np.diff(values)[moving] / hours[moving]
+    if len(rates):
+        result['rate_of_change'] = {
+            'last': float(rates[-1]),
+            'mean': float(rates.mean()),
+            'min': float(rates.min()),
+            'max': float(rates.max()),
+        }
+
+    # Линейный тренд: взвешенный МНК по часам от начала окна
+    x = (timestamps - start_ms) / MS_PER_HOUR
+    x_mean = (x * weights).sum() / total
+    sxx = (weights * (x - x_mean) ** 2).sum()
+    if sxx > 0:
+        sxy = (weights * (x - x_mean) * (values - mean)).sum()
+        syy = (weights * (values - mean) ** 2).sum()
+        slope = sxy / sxx
+        result['trend'] = {
+            'slope_per_hour': float(slope),
+            'intercept': float(mean - slope * x_mean),
+            'r_squared': float(sxy * sxy / (sxx * syy)) if syy > 0 else 1.0,
+        }
+    return result
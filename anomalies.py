@@ -0,0 +1,273 @@
+"""Потоковый детектор аномалий на скользящей статистике датчиков"""
+import math
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple, List, Any
+
+import config
+from models import database, DBContext, Sensor, SensorType, WeatherAlert, SensorRunningStats
+from partitions import registry
+from cache import responses
+from alerts import active_alerts
+from live import hub
+from schemas import WeatherAlertResponse
+
+# Минимальное количество наблюдений до принятия решений
+MIN_SAMPLES = 10
+# Сколько обновлений накапливать до записи контрольной точки
+CHECKPOINT_EVERY = 100
+# Сколько последних показаний использовать для начального прогрева
+WARMUP_LIMIT = 100
+
+@dataclass
+class RunningStats:
+    """Экспоненциально взвешенные среднее и дисперсия (Welford с затуханием)"""
+    weight: float = 0.0
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    last_timestamp: Optional[datetime] = None
+
+    @property
+    def stdev(self) -> float:
+        if self.weight <= 0:
+            return 0.0
+        return math.sqrt(max(self.m2 / self.weight, 0.0))
+
+    def update(self, value: float, timestamp: datetime, window_seconds: float):
+        """Учет нового значения; вес старых наблюдений убывает с постоянной времени окна"""
+        if self.last_timestamp is not None and timestamp > self.last_timestamp:
+            elapsed = (timestamp - self.last_timestamp).total_seconds()
+            decay = math.exp(-elapsed / window_seconds)
+            self.weight *= decay
+            self.m2 *= decay
+        if self.last_timestamp is None or timestamp > self.last_timestamp:
+            self.last_timestamp = timestamp
+        self.weight += 1.0
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.weight
+        self.m2 += delta * (value - self.mean)
+
+class AnomalyDetector:
+    """Решение об аномалии за O(1) на показание по статистике в памяти"""
+    def __init__(self):
+        self._stats: Dict[int, RunningStats] = {}
+        self._dirty = set()
+        self._updates = 0
+        self._lock = threading.Lock()
+
+    def _load(self, sensor: Sensor, before: datetime) -> RunningStats:
+        """Загрузка контрольной точки датчика, при ее отсутствии — прогрев по истории"""
+        row = SensorRunningStats.get_or_none(SensorRunningStats.sensor == sensor.id)
+        if row is not None:
+            return RunningStats(row.weight, row.count, row.mean, row.m2, row.last_timestamp)
+        stats = RunningStats()
+        window_seconds = sensor.sensor_type.anomaly_window_hours * 3600
+        start = before - timedelta(seconds=window_seconds)
+        history = []
+        for model in registry.models(start, before, newest_first=True):
+            history.extend(model
+                           .select(model.value, model.timestamp)
+                           .where(
+                               (model.sensor == sensor.id) &
+                               (model.timestamp >= start) &
+                               (model.timestamp < before))
+                           .order_by(model.timestamp.desc())
+                           .limit(WARMUP_LIMIT - len(history))
+                           .tuples())
+            if len(history) >= WARMUP_LIMIT:
+                break
+        for value, timestamp in reversed(history):
+            stats.update(value, timestamp, window_seconds)
+        return stats
+
+    def observe(self, sensor: Sensor, value: float, timestamp: datetime) -> Tuple[bool, float]:
+        """Проверка значения и обновление статистики; возвращает (аномалия, среднее)"""
+        sensor_type: SensorType = sensor.sensor_type
+        with self._lock:
+            stats = self._stats.get(sensor.id)
+            if stats is None:
+                stats = self._stats[sensor.id] = self._load(sensor, timestamp)
+            stdev = stats.stdev
+            is_anomaly = (
+                stats.count >= MIN_SAMPLES and stdev > 0 and
+                abs(value - stats.mean) > sensor_type.anomaly_threshold * stdev
+            )
+            mean = stats.mean
+            stats.update(value, timestamp, sensor_type.anomaly_window_hours * 3600)
+            self._dirty.add(sensor.id)
+            self._updates += 1
+            if self._updates >= CHECKPOINT_EVERY:
+                self._checkpoint()
+        return is_anomaly, mean
+
+    def checkpoint(self):
+        """Запись измененной статистики в базу данных"""
+        with self._lock:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        # Датчики могли быть удалены с момента последнего обновления
+        existing = {
+            sensor_id for sensor_id, in
+            Sensor.select(Sensor.id).where(Sensor.id.in_(list(self._dirty))).tuples()
+        }
+        rows = []
+        for sensor_id in self._dirty:
+            if sensor_id not in existing:
+                self._stats.pop(sensor_id, None)
+                continue
+            stats = self._stats[sensor_id]
+            rows.append({
+                'sensor': sensor_id,
+                'weight': stats.weight,
+                'count': stats.count,
+                'mean': stats.mean,
+                'm2': stats.m2,
+                'last_timestamp': stats.last_timestamp,
+            })
+        if rows:
+            with database.atomic():
+                SensorRunningStats.replace_many(rows).execute()
+        self._dirty.clear()
+        self._updates = 0
+
+detector = AnomalyDetector()
+
+def create_anomaly_alert(sensor: Sensor, value: float, timestamp: datetime, mean: float) -> WeatherAlert:
+    """Предупреждение об аномальном значении датчика"""
+    print(f"⚠️ Аномальное значение: {value} (среднее: {mean})")
+    return WeatherAlert.create(
+        location_id=sensor.station.location_id,
+        alert_type="DATA_ANOMALY",
+        severity="СРЕДНЯЯ",
+        title=f"Аномальное значение датчика {sensor.sensor_code}",
+        description=f"Значение {value}{sensor.sensor_type.unit} значительно отличается от ожидаемого",
+        start_time=timestamp,
+        end_time=timestamp + timedelta(hours=1),
+        issued_at=datetime.now(),
+        issuer="Система мониторинга",
+        is_active=True
+    )
+
+class AnomalyWorker:
+    """Ограниченная очередь проверки аномалий, разбираемая отдельным потоком пачками"""
+    def __init__(self, maxsize: int, batch_size: int, put_timeout: float):
+        self._queue = queue.Queue(maxsize)
+        self._batch_size = batch_size
+        self._put_timeout = put_timeout
+        self._thread = None
+        self._stopping = threading.Event()
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.alerts = 0
+        self.last_batch_size = 0
+        self.last_lag = 0.0
+
+    def submit(self, readings: Iterable[Tuple[Sensor, float, datetime]]) -> int:
+        """Постановка пакета показаний (датчик, значение, метка) в очередь, возвращает число поставленных.
+
+        При переполнении пакет ждет места не дольше put_timeout в сумме, а не на каждое показание,
+        после чего остаток пакета отбрасывается: задержка записи не зависит от размера пакета.
+        """
+        now = time.monotonic()
+        deadline = now + self._put_timeout
+        readings = list(readings)
+        submitted = 0
+        for sensor, value, timestamp in readings:
+            item = (now, sensor, value, timestamp)
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._queue.put(item, timeout=remaining)
+                else:
+                    self._queue.put_nowait(item)
+            except queue.Full:
+                break
+            submitted += 1
+        self.enqueued += submitted
+        self.dropped += len(readings) - submitted
+        return submitted
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='anomaly-worker', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Остановка потока после обработки уже поставленных показаний"""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def _take_batch(self) -> List[Any]:
+        batch = [self._queue.get(timeout=0.5)]
+        while len(batch) < self._batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            try:
+                batch = self._take_batch()
+            except queue.Empty:
+                if self._stopping.is_set():
+                    break
+                continue
+            self.last_lag = time.monotonic() - batch[0][0]
+            self.last_batch_size = len(batch)
+            try:
+                self._process(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                print(f"Ошибка при проверке аномалий: {e}")
+            self.processed += len(batch)
+
+    def _process(self, batch: List[Any]):
+        with DBContext():
+            found = []
+            for _, sensor, value, timestamp in batch:
+                is_anomaly, mean = detector.observe(sensor, value, timestamp)
+                if is_anomaly:
+                    found.append((sensor, value, timestamp, mean))
+            if found:
+                with database.atomic():
+                    alerts = [create_anomaly_alert(*anomaly) for anomaly in found]
+                for alert in alerts:
+                    active_alerts.put(alert)
+                    hub.publish('alert', WeatherAlertResponse.model_validate(alert.to_dict()),
+                                location_id=alert.location_id)
+                responses.invalidate('location', *(alert.location_id for alert in alerts))
+                self.alerts += len(found)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._queue.mutex:
+            oldest = self._queue.queue[0][0] if self._queue.queue else None
+        return {
+            'depth': self._queue.qsize(),
+            'capacity': self._queue.maxsize,
+            'enqueued': self.enqueued,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'alerts': self.alerts,
+            'last_batch_size': self.last_batch_size,
+            'last_lag_seconds': round(self.last_lag, 3),
+            'oldest_queued_seconds': round(time.monotonic() - oldest, 3) if oldest is not None else 0.0,
+            'running': self._thread is not None and self._thread.is_alive(),
+        }
+
+worker = AnomalyWorker(config.ANOMALY_QUEUE_SIZE, config.ANOMALY_BATCH_SIZE, config.ANOMALY_QUEUE_PUT_TIMEOUT)
@@ -0,0 +1,324 @@
+"""Кэши в памяти процесса: метаданные (датчики, типы, станции, местоположения) и готовые ответы"""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+import config
+from models import Location, WeatherStation, SensorType, Sensor
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш с версиями ключей для защиты от гонок с инвалидацией.
+
+    Объем ограничен числом записей и, если задан sizeof, суммарным размером значений maxbytes.
+    """
+    def __init__(self, maxsize: int, maxbytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._sizeof = sizeof
+        self._bytes = 0
+        self._data: OrderedDict = OrderedDict()
+        self._versions: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def version(self, key: Hashable) -> int:
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def put(self, key: Hashable, value: Any, version: int):
+        """Сохранение значения, если ключ не инвалидировали с момента чтения версии"""
+        with self._lock:
+            if self._versions.get(key, 0) != version:
+                return
+            size = self._sizeof(value) if self._sizeof else 0
+            if self.maxbytes is not None and size > self.maxbytes:
+                return
+            self._remove(key)
+            self._data[key] = value
+            self._bytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self._bytes > self.maxbytes):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        value = self._data.pop(key, None)
+        if value is not None and self._sizeof:
+            self._bytes -= self._sizeof(value)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            version = self.version(key)
+            value = loader()
+            self.put(key, value, version)
+        return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._remove(key)
+            self.invalidations += 1
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]):
+        with self._lock:
+            keys = [key for key, value in self._data.items() if predicate(key, value)]
+        for key in keys:
+            self.invalidate(key)
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._data)
+        for key in keys:
+            self.invalidate(key)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._data)
+            size_bytes = self._bytes
+        return {
+            'size': size,
+            'maxsize': self.maxsize,
+            **({'bytes': size_bytes, 'maxbytes': self.maxbytes} if self._sizeof else {}),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+class MetadataCache:
+    """Метаданные для приема и проверки показаний без обращений к базе.
+
+    Датчик кэшируется вместе с типом и станцией, станция — вместе с местоположением,
+    поэтому изменение типа, станции или местоположения сбрасывает и зависимые датчики.
+    Датчики и станции доступны также по кодам (ключи sensor_code и station_code).
+    Методы get_* бросают DoesNotExist, как Model.get.
+    """
+    def __init__(self, maxsize: int):
+        self._cache = LRUCache(maxsize)
+
+    @staticmethod
+    def _sensor_query():
+        return (Sensor
+                .select(Sensor, SensorType, WeatherStation)
+                .join(SensorType)
+                .switch(Sensor)
+                .join(WeatherStation))
+
+    def get_sensor(self, sensor_id: int) -> Sensor:
+        return self._cache.get_or_load(
+            ('sensor', sensor_id),
+            lambda: self._sensor_query().where(Sensor.id == sensor_id).get()
+        )
+
+    def get_sensors(self, sensor_ids: Iterable[int]) -> Dict[int, Sensor]:
+        """Несколько датчиков: промахи догружаются одним запросом, отсутствующие пропускаются"""
+        sensors = {}
+        missing = {}
+        for sensor_id in set(sensor_ids):
+            sensor = self._cache.get(('sensor', sensor_id))
+            if sensor is None:
+                missing[sensor_id] = self._cache.version(('sensor', sensor_id))
+            else:
+                sensors[sensor_id] = sensor
+        if missing:
+            for sensor in self._sensor_query().where(Sensor.id.in_(list(missing))):
+                self._cache.put(('sensor', sensor.id), sensor, missing[sensor.id])
+                sensors[sensor.id] = sensor
+        return sensors
+
+    def get_sensors_by_code(self, station_id: int, sensor_codes: Iterable[str]) -> Dict[str, Sensor]:
+        """Датчики станции по кодам: промахи догружаются одним запросом, отсутствующие пропускаются"""
+        sensors = {}
+        missing = {}
+        for sensor_code in set(sensor_codes):
+            key = ('sensor_code', station_id, sensor_code)
+            sensor = self._cache.get(key)
+            if sensor is None:
+                missing[sensor_code] = self._cache.version(key)
+            else:
+                sensors[sensor_code] = sensor
+        if missing:
+            query = self._sensor_query().where(
+                (Sensor.station == station_id) & Sensor.sensor_code.in_(list(missing)))
+            for sensor in query:
+                key = ('sensor_code', station_id, sensor.sensor_code)
+                self._cache.put(key, sensor, missing[sensor.sensor_code])
+                sensors[sensor.sensor_code] = sensor
+        return sensors
+
+    def get_sensor_type(self, sensor_type_id: int) -> SensorType:
+        return self._cache.get_or_load(
+            ('sensor_type', sensor_type_id),
+            lambda: SensorType.get(SensorType.id == sensor_type_id)
+        )
+
+    def get_station(self, station_id: int) -> WeatherStation:
+        return self._cache.get_or_load(
+            ('station', station_id),
+            lambda: (WeatherStation
+                     .select(WeatherStation, Location)
+                     .join(Location)
+                     .where(WeatherStation.id == station_id)
+                     .get())
+        )
+
+    def get_station_by_code(self, station_code: str) -> WeatherStation:
+        return self._cache.get_or_load(
+            ('station_code', station_code),
+            lambda: (WeatherStation
+                     .select(WeatherStation, Location)
+                     .join(Location)
+                     .where(WeatherStation.station_code == station_code)
+                     .get())
+        )
+
+    def get_location(self, location_id: int) -> Location:
+        return self._cache.get_or_load(
+            ('location', location_id),
+            lambda: Location.get(Location.id == location_id)
+        )
+
+    def invalidate_sensor(self, sensor_id: int):
+        self._cache.invalidate(('sensor', sensor_id))
+        self._cache.invalidate_where(
+            lambda key, value: key[0] == 'sensor_code' and value.id == sensor_id
+        )
+
+    def invalidate_sensor_type(self, sensor_type_id: int):
+        self._cache.invalidate(('sensor_type', sensor_type_id))
+        self._cache.invalidate_where(
+            lambda key, value: key[0] in ('sensor', 'sensor_code') and value.sensor_type_id == sensor_type_id
+        )
+
+    def invalidate_station(self, station_id: int):
+        self._cache.invalidate(('station', station_id))
+        self._cache.invalidate_where(
+            lambda key, value: (
+                (key[0] == 'station_code' and value.id == station_id) or
+                (key[0] in ('sensor', 'sensor_code') and value.station_id == station_id)
+            )
+        )
+
+    def invalidate_location(self, location_id: int):
+        self._cache.invalidate(('location', location_id))
+        self._cache.invalidate_where(
+            lambda key, value: (
+                (key[0] in ('station', 'station_code') and value.location_id == location_id) or
+                (key[0] in ('sensor', 'sensor_code') and value.station.location_id == location_id)
+            )
+        )
+
+    def metrics(self) -> Dict[str, Any]:
+        return self._cache.metrics()
+
+metadata = MetadataCache(config.METADATA_CACHE_SIZE)
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    generation: Tuple[int, int]
+    expires_at: Optional[datetime] = None
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверка заголовка If-None-Match (список через запятую, '*', слабые W/-метки сравниваются без префикса)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate == etag:
+            return True
+    return False
+
+class ResponseCache:
+    """Сериализованные составные ответы (станция, местоположение) со строгими ETag.
+
+    Ключ — (вид, id, параметры запроса). Записи сбрасываются поколениями: запись хранит
+    поколение вида и сущности на момент начала чтения из базы и считается устаревшей,
+    если с тех пор была запись в затронутые данные или наступил expires_at.
+    Кроме числа записей кэш ограничен суммарным размером тел ответов: ответы аналитики
+    в сотни раз больше ответов станций.
+    """
+    def __init__(self, maxsize: int, maxbytes: int):
+        self._cache = LRUCache(maxsize, maxbytes, lambda entry: len(entry.body))
+        self._kinds: Dict[str, int] = {}
+        self._entities: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+        self.not_modified = 0
+        self.stale = 0
+        self.invalidations = 0
+
+    def generation(self, key: Tuple) -> Tuple[int, int]:
+        """Поколение ключа; читается до обращения к базе и передается в put"""
+        kind, entity_id = key[0], key[1]
+        with self._lock:
+            return self._kinds.get(kind, 0), self._entities.get((kind, entity_id), 0)
+
+    def get(self, key: Tuple) -> Optional[CachedResponse]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry.generation != self.generation(key) or (
+                entry.expires_at is not None and datetime.now() >= entry.expires_at):
+            self.stale += 1
+            return None
+        return entry
+
+    def put(
+        self,
+        key: Tuple,
+        body: bytes,
+        generation: Tuple[int, int],
+        expires_at: Optional[datetime] = None
+    ) -> CachedResponse:
+        """Сохранение ответа; если ключ инвалидировали во время чтения, ответ отдается, но не кэшируется"""
+        entry = CachedResponse(body, '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"',
+                               generation, expires_at)
+        if generation == self.generation(key):
+            self._cache.put(key, entry, self._cache.version(key))
+        return entry
+
+    def check_not_modified(self, entry: CachedResponse, if_none_match: Optional[str]) -> bool:
+        if etag_matches(if_none_match, entry.etag):
+            self.not_modified += 1
+            return True
+        return False
+
+    def invalidate(self, kind: str, *entity_ids: Optional[int]):
+        with self._lock:
+            for entity_id in set(entity_ids):
+                if entity_id is not None:
+                    self._entities[(kind, entity_id)] = self._entities.get((kind, entity_id), 0) + 1
+            self.invalidations += 1
+
+    def invalidate_all(self, kind: str):
+        with self._lock:
+            self._kinds[kind] = self._kinds.get(kind, 0) + 1
+            self.invalidations += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._cache.metrics(),
+            'invalidations': self.invalidations,
+            'not_modified': self.not_modified,
+            'stale': self.stale,
+        }
+
+responses = ResponseCache(config.RESPONSE_CACHE_SIZE, config.RESPONSE_CACHE_BYTES)
@@ -0,0 +1,70 @@
+"""Компактный бинарный колоночный формат временных рядов.
+
+Формат (little-endian):
+    заголовок   4s magic b'WXCF', B версия, H число колонок, I число строк
+    колонки     B длина имени, имя (utf-8), c тип array ('q' int64, 'd' float64, 'B' uint8)
+    данные      буферы колонок подряд в порядке описания
+
+Метки времени передаются в миллисекундах от эпохи Unix (UTC), округленными как в SQLite.
+"""
+import calendar
+import struct
+import sys
+from array import array
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from peewee import fn
+
+COLUMNAR_MEDIA_TYPE = 'application/x-weather-columnar'
+
+MAGIC = b'WXCF'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sBHI')
+
+def accepts_columnar(accept: Optional[str]) -> bool:
+    """Запрошен ли колоночный формат в заголовке Accept"""
+    if not accept:
+        return False
+    return any(part.split(';')[0].strip() == COLUMNAR_MEDIA_TYPE for part in accept.split(','))
+
+def epoch_ms(timestamp: datetime) -> int:
+    """Миллисекунды от эпохи; метки без часового пояса считаются UTC"""
+    return calendar.timegm(timestamp.utctimetuple()) * 1000 + (timestamp.microsecond + 500) // 1000
+
+def sql_epoch_ms(column):
+    """То же на стороне SQLite: метка колонки в мс от эпохи, datetime в Python не разбирается"""
+    return fn.ROUND((fn.julianday(column) - 2440587.5) * 86400000).cast('INTEGER')
+
+def encode_columns(columns: List[Tuple[str, array]]) -> bytes:
+    """Упаковка колонок одинаковой длины в один буфер"""
+    nrows = len(columns[0][1]) if columns else 0
+    parts = [_HEADER.pack(MAGIC, VERSION, len(columns), nrows)]
+    for name, values in columns:
+        if len(values) != nrows:
+            raise ValueError(f"Колонка {name} длиной {len(values)} вместо {nrows}")
+        encoded = name.encode()
+        parts.append(struct.pack('<B', len(encoded)) + encoded + values.typecode.encode())
+    for _, values in columns:
+        if sys.byteorder == 'big' and values.itemsize > 1:
+            values = array(values.typecode, values)
+            values.byteswap()
+        parts.append(values.tobytes())
+    return b''.join(parts)
+
+def rollup_columns(rollups: Iterable) -> bytes:
+    """Агрегаты в колоночном формате: timestamp, count, avg, min, max, last"""
+    timestamps, counts = array('q'), array('q')
+    avg, minimum, maximum, last = array('d'), array('d'), array('d'), array('d')
+    for rollup in rollups:
+        timestamps.append(epoch_ms(rollup.bucket))
+        counts.append(rollup.count)
+        avg.append(rollup.sum_value / rollup.count)
+        minimum.append(rollup.min_value)
+        maximum.append(rollup.max_value)
+        last.append(rollup.last_value)
+    return encode_columns([
+        ('timestamp', timestamps), ('count', counts), ('avg_value', avg),
+        ('min_value', minimum), ('max_value', maximum), ('last_value', last),
+    ])
@@ -0,0 +1,65 @@
+"""Настройки приложения (переопределяются переменными окружения)"""
+import os
+
+def _int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+def _float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+# Отдельные пулы потоков для асинхронных эндпоинтов: чтение и запись не занимают общий пул FastAPI
+DB_READ_WORKERS = _int('DB_READ_WORKERS', 16)
+DB_WRITE_WORKERS = _int('DB_WRITE_WORKERS', 4)
+# Пул потоков AnyIO для синхронных эндпоинтов (по умолчанию в AnyIO — 40 потоков)
+DB_SYNC_WORKERS = _int('DB_SYNC_WORKERS', 16)
+# Прочие потоки с соединением: проверка аномалий, буфер приема, очистка и событийный цикл (запуск и остановка)
+DB_BACKGROUND_CONNECTIONS = 4
+
+# Пул соединений с базой данных. Соединение закреплено за потоком, поэтому по умолчанию
+# пул вмещает все потоки, которые могут работать с базой одновременно
+DB_MAX_CONNECTIONS = _int(
+    'DB_MAX_CONNECTIONS', DB_READ_WORKERS + DB_WRITE_WORKERS + DB_SYNC_WORKERS + DB_BACKGROUND_CONNECTIONS)
+# Через сколько секунд простоя соединение закрывается (0 — никогда)
+DB_STALE_TIMEOUT = _int('DB_STALE_TIMEOUT', 3600)
+# Сколько секунд ждать свободного соединения при исчерпании пула
+DB_POOL_TIMEOUT = _int('DB_POOL_TIMEOUT', 10)
+
+# Очередь проверки аномалий
+ANOMALY_QUEUE_SIZE = _int('ANOMALY_QUEUE_SIZE', 10000)
+ANOMALY_BATCH_SIZE = _int('ANOMALY_BATCH_SIZE', 500)
+# Сколько секунд в сумме пакет показаний ждет места в очереди, затем остаток отбрасывается (0 — не ждать)
+ANOMALY_QUEUE_PUT_TIMEOUT = _float('ANOMALY_QUEUE_PUT_TIMEOUT', 0.5)
+
+# Кэш метаданных (датчики, типы, станции, местоположения)
+METADATA_CACHE_SIZE = _int('METADATA_CACHE_SIZE', 10000)
+# Кэш готовых ответов GET /stations/{id}, GET /locations/{id} и аналитики датчиков (число записей)
+RESPONSE_CACHE_SIZE = _int('RESPONSE_CACHE_SIZE', 2000)
+# Суммарный размер тел ответов в кэше (байт)
+RESPONSE_CACHE_BYTES = _int('RESPONSE_CACHE_BYTES', 64 * 1024 * 1024)
+
+# Размер страницы при потоковой выгрузке данных
+EXPORT_PAGE_SIZE = _int('EXPORT_PAGE_SIZE', 5000)
+
+# Хранение сырых показаний: сколько суток хранить (0 — бессрочно); агрегаты хранятся всегда
+RAW_RETENTION_DAYS = _int('RAW_RETENTION_DAYS', 0)
+# Период запуска очистки (с)
+RETENTION_INTERVAL = _int('RETENTION_INTERVAL', 3600)
+# Строк в одной транзакции удаления и пауза между транзакциями (с)
+RETENTION_CHUNK_SIZE = _int('RETENTION_CHUNK_SIZE', 5000)
+RETENTION_CHUNK_PAUSE = _float('RETENTION_CHUNK_PAUSE', 0.05)
+
+# Подписка на новые показания и предупреждения (SSE): буфер событий на подписчика
+# и период комментария-пинга при простое (с)
+LIVE_BUFFER_SIZE = _int('LIVE_BUFFER_SIZE', 1000)
+LIVE_KEEPALIVE = _float('LIVE_KEEPALIVE', 15)
+
+# Буферизованный прием показаний (POST /weather-data/buffered): емкость буфера в строках,
+# группа фиксируется через INGEST_FLUSH_INTERVAL_MS после первого пакета или по набору INGEST_FLUSH_ROWS строк
+INGEST_BUFFER_SIZE = _int('INGEST_BUFFER_SIZE', 100000)
+INGEST_FLUSH_INTERVAL_MS = _int('INGEST_FLUSH_INTERVAL_MS', 50)
+INGEST_FLUSH_ROWS = _int('INGEST_FLUSH_ROWS', 5000)
+
+# Аналитика датчика (GET /sensors/{id}/analytics): окна до ANALYTICS_RAW_HOURS часов считаются
+# по сырым показаниям, длиннее — по агрегатам; ответы для открытого окна (без end) живут ANALYTICS_CACHE_SECONDS
+ANALYTICS_RAW_HOURS = _int('ANALYTICS_RAW_HOURS', 48)
+ANALYTICS_CACHE_SECONDS = _int('ANALYTICS_CACHE_SECONDS', 60)
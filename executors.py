@@ -0,0 +1,58 @@
+"""Выделенные пулы потоков для работы с базой из async-эндпоинтов"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator
+
+import config
+from models import DBContext
+
+class DBExecutor:
+    """Пул потоков с собственным размером; вызовы выполняются в контексте БД (соединение из пула).
+
+    Запись и чтение разнесены по разным пулам, поэтому медленная загрузка показаний
+    не задерживает чтение, а число одновременных запросов к SQLite ограничено размерами пулов,
+    а не общим пулом потоков AnyIO.
+    """
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self.pending = 0
+        self.completed = 0
+
+    @staticmethod
+    def _call(func: Callable, *args, **kwargs):
+        with DBContext():
+            return func(*args, **kwargs)
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            return await loop.run_in_executor(self._pool, functools.partial(self._call, func, *args, **kwargs))
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def iterate(self, iterator: Iterator) -> AsyncIterator:
+        """Обход синхронного итератора, каждый шаг которого выполняется в пуле"""
+        done = object()
+        while True:
+            item = await self.run(next, iterator, done)
+            if item is done:
+                return
+            yield item
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'pending': self.pending,
+            'completed': self.completed,
+        }
+
+read_executor = DBExecutor('db-read', config.DB_READ_WORKERS)
+write_executor = DBExecutor('db-write', config.DB_WRITE_WORKERS)
@@ -0,0 +1,49 @@
+"""Потоковая выгрузка погодных данных в NDJSON и CSV"""
+import csv
+import io
+import json
+from typing import Iterable, Iterator, List
+
+EXPORT_COLUMNS = ('id', 'sensor_id', 'timestamp', 'value', 'quality', 'raw_data')
+
+MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+def ndjson_chunks(pages: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """Одна строка JSON на показание, один фрагмент ответа на страницу"""
+    for page in pages:
+        lines = []
+        for data_id, sensor_id, timestamp, value, quality, raw_data in page:
+            lines.append(json.dumps({
+                'id': data_id,
+                'sensor_id': sensor_id,
+                'timestamp': timestamp.isoformat(),
+                'value': value,
+                'quality': quality,
+                'raw_data': raw_data,
+            }, ensure_ascii=False))
+        lines.append('')
+        yield '\n'.join(lines).encode()
+
+def csv_chunks(pages: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """CSV с заголовком; raw_data выгружается строкой JSON"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue().encode()
+    for page in pages:
+        buffer.seek(0)
+        buffer.truncate()
+        for data_id, sensor_id, timestamp, value, quality, raw_data in page:
+            writer.writerow((
+                data_id, sensor_id, timestamp.isoformat(), value, quality,
+                json.dumps(raw_data, ensure_ascii=False) if raw_data is not None else ''
+            ))
+        yield buffer.getvalue().encode()
+
+FORMATTERS = {
+    'ndjson': ndjson_chunks,
+    'csv': csv_chunks,
+}
@@ -0,0 +1,97 @@
+"""Компактный бинарный кадр показаний станции для узких каналов связи.
+
+Формат (little-endian):
+    заголовок   4s magic b'WXIF', B версия, B длина кода станции, код станции (utf-8)
+    датчики     H число кодов, для каждого: B длина, код датчика (utf-8)
+    записи      I число записей, затем записи по 19 байт:
+                H индекс кода датчика в таблице, q метка в мс от эпохи Unix (UTC),
+                d значение, B качество (0-100)
+
+Коды датчиков передаются один раз в таблице, записи ссылаются на них индексом,
+поэтому запись занимает 19 байт вместо ~150 байт JSON.
+"""
+import struct
+from datetime import datetime, timedelta
+from typing import Iterable, List, Tuple
+
+FRAME_MEDIA_TYPE = 'application/x-weather-frame'
+
+MAGIC = b'WXIF'
+VERSION = 1
+
+# Не больше, чем в пакетной отправке JSON
+MAX_RECORDS = 10000
+
+_HEADER = struct.Struct('<4sBB')
+_COUNT16 = struct.Struct('<H')
+_COUNT32 = struct.Struct('<I')
+RECORD = struct.Struct('<HqdB')
+
+_EPOCH = datetime(1970, 1, 1)
+
+class FrameError(ValueError):
+    """Кадр не соответствует формату"""
+
+def from_epoch_ms(value: int) -> datetime:
+    """Метка без часового пояса (UTC), обратная columnar.epoch_ms"""
+    return _EPOCH + timedelta(milliseconds=value)
+
+def _read_code(data: memoryview, offset: int) -> Tuple[str, int]:
+    if offset >= len(data):
+        raise FrameError("кадр обрезан")
+    length = data[offset]
+    end = offset + 1 + length
+    if end > len(data):
+        raise FrameError("кадр обрезан")
+    try:
+        return bytes(data[offset + 1:end]).decode(), end
+    except UnicodeDecodeError:
+        raise FrameError("код не в кодировке UTF-8")
+
+def decode_frame(body: bytes) -> Tuple[str, List[str], List[Tuple[int, int, float, int]]]:
+    """Разбор кадра: код станции, таблица кодов датчиков и записи (индекс, метка мс, значение, качество).
+
+    Записи распаковываются одним вызовом struct.iter_unpack без промежуточных объектов.
+    """
+    data = memoryview(body)
+    if len(data) < _HEADER.size:
+        raise FrameError("кадр обрезан")
+    magic, version, _ = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise FrameError("неизвестная сигнатура")
+    if version != VERSION:
+        raise FrameError(f"неподдерживаемая версия {version}")
+    station_code, offset = _read_code(data, _HEADER.size - 1)
+    if offset + _COUNT16.size > len(data):
+        raise FrameError("кадр обрезан")
+    count, = _COUNT16.unpack_from(data, offset)
+    offset += _COUNT16.size
+    sensor_codes = []
+    for _ in range(count):
+        code, offset = _read_code(data, offset)
+        sensor_codes.append(code)
+    if offset + _COUNT32.size > len(data):
+        raise FrameError("кадр обрезан")
+    nrecords, = _COUNT32.unpack_from(data, offset)
+    offset += _COUNT32.size
+    if nrecords > MAX_RECORDS:
+        raise FrameError(f"больше {MAX_RECORDS} записей")
+    if len(data) - offset != nrecords * RECORD.size:
+        raise FrameError("размер записей не совпадает с их числом")
+    return station_code, sensor_codes, list(RECORD.iter_unpack(data[offset:]))
+
+def encode_frame(station_code: str, records: Iterable[Tuple[str, int, float, int]]) -> bytes:
+    """Сборка кадра из записей (код датчика, метка мс, значение, качество) — для логгеров и тестов"""
+    codes = {}
+    packed = []
+    for sensor_code, timestamp, value, quality in records:
+        index = codes.setdefault(sensor_code, len(codes))
+        packed.append(RECORD.pack(index, timestamp, value, quality))
+    station = station_code.encode()
+    parts = [_HEADER.pack(MAGIC, VERSION, len(station)), station, _COUNT16.pack(len(codes))]
+    for sensor_code in codes:
+        encoded = sensor_code.encode()
+        parts.append(struct.pack('<B', len(encoded)) + encoded)
+    parts.append(_COUNT32.pack(len(packed)))
+    parts.extend(packed)
+    return b''.join(parts)
@@ -0,0 +1,200 @@
+"""Буферизованный прием показаний: групповая фиксация транзакций отдельным потоком"""
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import config
+from models import DBContext, Sensor
+from storage import insert_readings
+
+# Сколько последних неудачных пакетов помнить для запроса статуса
+FAILURES_KEPT = 1000
+
+@dataclass
+class IngestItem:
+    sequence: int
+    enqueued_at: float
+    readings: List[Tuple[Sensor, Dict[str, Any]]]
+
+class IngestBuffer:
+    """Очередь проверенных показаний, которые поток записи фиксирует группами.
+
+    Поток ждет первый пакет, затем добирает очередь до flush_rows строк или до истечения
+    flush_interval с момента постановки первого пакета и вставляет все одной транзакцией
+    (одна синхронизация WAL на группу вместо одной на показание). Каждый пакет получает
+    номер; пакеты фиксируются по порядку, поэтому durable_sequence — граница, до которой
+    включительно все принятые пакеты записаны. При ошибке групповой вставки пакеты
+    повторяются по одному, чтобы неудачным оказался только некорректный пакет.
+    """
+    def __init__(self, capacity: int, flush_interval: float, flush_rows: int):
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._sequences = itertools.count(1)
+        self._failures: OrderedDict = OrderedDict()
+        self._on_commit: Optional[Callable] = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self.pending_rows = 0
+        self.sequence = 0
+        self.durable_sequence = 0
+        self.enqueued = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failed = 0
+        self.last_flush_rows = 0
+        self.last_flush_seconds = 0.0
+
+    def submit(self, readings: List[Tuple[Sensor, Dict[str, Any]]]) -> Optional[int]:
+        """Постановка пакета показаний в очередь, возвращает номер пакета или None при переполнении"""
+        with self._lock:
+            if self._thread is None or self.pending_rows + len(readings) > self.capacity:
+                self.rejected += len(readings)
+                return None
+            self.pending_rows += len(readings)
+            self.sequence = next(self._sequences)
+            self._queue.put(IngestItem(self.sequence, time.monotonic(), readings))
+            self.enqueued += len(readings)
+            return self.sequence
+
+    def flush_deadline(self) -> datetime:
+        """Ориентир, к которому пакет, принятый сейчас, будет записан при обычной нагрузке"""
+        return datetime.now() + timedelta(seconds=self.flush_interval)
+
+    def status(self, sequence: int) -> Dict[str, Any]:
+        with self._lock:
+            error = self._failures.get(sequence)
+            if error is not None:
+                state = 'failed'
+            elif sequence <= self.durable_sequence:
+                state = 'durable'
+            elif sequence <= self.sequence:
+                state = 'pending'
+            else:
+                state = 'unknown'
+            return {
+                'sequence': sequence,
+                'state': state,
+                'error': error,
+                'durable_sequence': self.durable_sequence,
+            }
+
+    def start(self, on_commit: Callable[[List[Tuple[Sensor, Dict[str, Any]]], List[int]], None]):
+        """Запуск потока записи; on_commit вызывается после фиксации с показаниями и их id"""
+        if self._thread is not None:
+            return
+        self._on_commit = on_commit
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='ingest-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Прием прекращается, уже поставленные показания записываются до остановки потока"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stopping.set()
+        # Пустой элемент будит поток, ожидающий добора группы
+        self._queue.put(None)
+        thread.join()
+
+    def _take_group(self) -> List[IngestItem]:
+        first = self._queue.get(timeout=0.5)
+        if first is None:
+            raise queue.Empty
+        group = [first]
+        rows = len(first.readings)
+        deadline = group[0].enqueued_at + self.flush_interval
+        while rows < self.flush_rows:
+            # При остановке группа добирается без ожидания
+            timeout = 0 if self._stopping.is_set() else deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                continue
+            group.append(item)
+            rows += len(item.readings)
+        return group
+
+    def _run(self):
+        while True:
+            try:
+                group = self._take_group()
+            except queue.Empty:
+                if self._stopping.is_set():
+                    break
+                continue
+            started = time.monotonic()
+            rows = sum(len(item.readings) for item in group)
+            try:
+                self._flush(group)
+            except Exception as e:
+                print(f"Ошибка групповой записи показаний, пакеты записываются по одному: {e}")
+                for item in group:
+                    self._flush([item])
+            with self._lock:
+                self.pending_rows -= rows
+                self.durable_sequence = group[-1].sequence
+            self.flushes += 1
+            self.last_flush_rows = rows
+            self.last_flush_seconds = time.monotonic() - started
+
+    def _flush(self, group: List[IngestItem]):
+        readings = [reading for item in group for reading in item.readings]
+        try:
+            with DBContext():
+                ids = insert_readings([row for _, row in readings])
+        except Exception as e:
+            if len(group) == 1:
+                self._fail(group[0], e)
+                return
+            raise
+        self.flushed += len(readings)
+        try:
+            self._on_commit(readings, ids)
+        except Exception as e:
+            print(f"Ошибка обработки записанных показаний: {e}")
+
+    def _fail(self, item: IngestItem, error: Exception):
+        with self._lock:
+            self._failures[item.sequence] = str(error)
+            while len(self._failures) > FAILURES_KEPT:
+                self._failures.popitem(last=False)
+        self.failed += len(item.readings)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._queue.mutex:
+            oldest = next((item.enqueued_at for item in self._queue.queue if item is not None), None)
+        return {
+            'depth_rows': self.pending_rows,
+            'depth_batches': self._queue.qsize(),
+            'capacity': self.capacity,
+            'flush_interval_ms': round(self.flush_interval * 1000),
+            'flush_rows': self.flush_rows,
+            'enqueued': self.enqueued,
+            'rejected': self.rejected,
+            'flushed': self.flushed,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'last_flush_rows': self.last_flush_rows,
+            'last_flush_seconds': round(self.last_flush_seconds, 3),
+            'oldest_queued_seconds': round(time.monotonic() - oldest, 3) if oldest is not None else 0.0,
+            'sequence': self.sequence,
+            'durable_sequence': self.durable_sequence,
+            'running': self._thread is not None and self._thread.is_alive(),
+        }
+
+ingest_buffer = IngestBuffer(
+    config.INGEST_BUFFER_SIZE, config.INGEST_FLUSH_INTERVAL_MS / 1000, config.INGEST_FLUSH_ROWS
+)
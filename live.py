@@ -0,0 +1,161 @@
+"""Рассылка новых показаний и предупреждений подписчикам (Server-Sent Events)"""
+import asyncio
+import itertools
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from pydantic import BaseModel
+
+import config
+
+EVENT_TYPES = ('reading', 'alert')
+
+class Subscription:
+    """Подписчик с ограниченным буфером: при переполнении вытесняются самые старые события.
+
+    Фильтры внутри множества объединяются по ИЛИ, между множествами — по И; None не ограничивает.
+    Предупреждения относятся к местоположению, поэтому для них фильтр по станциям
+    заменяется местоположениями этих станций (alert_location_ids).
+    """
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        buffer_size: int,
+        events: Set[str],
+        station_ids: Optional[Set[int]],
+        location_ids: Optional[Set[int]],
+        sensor_type_ids: Optional[Set[int]],
+        alert_location_ids: Optional[Set[int]]
+    ):
+        self.events = events
+        self.station_ids = station_ids
+        self.location_ids = location_ids
+        self.sensor_type_ids = sensor_type_ids
+        self.alert_location_ids = alert_location_ids
+        self._loop = loop
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+        self._signaled = False
+        self.delivered = 0
+        self.dropped = 0
+        self._reported_dropped = 0
+
+    def matches(self, event: str, station_id: Optional[int], location_id: Optional[int],
+                sensor_type_id: Optional[int]) -> bool:
+        if event not in self.events:
+            return False
+        if event == 'alert':
+            return self.alert_location_ids is None or location_id in self.alert_location_ids
+        return ((self.station_ids is None or station_id in self.station_ids) and
+                (self.location_ids is None or location_id in self.location_ids) and
+                (self.sensor_type_ids is None or sensor_type_id in self.sensor_type_ids))
+
+    def push(self, message: str):
+        """Вызывается из потоков записи: не блокирует и не ждет подписчика"""
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(message)
+            if self._signaled:
+                return
+            self._signaled = True
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # Цикл событий уже закрыт, подписчик будет снят при завершении потока
+            pass
+
+    async def messages(self, keepalive: float) -> AsyncIterator[str]:
+        """Готовые SSE-сообщения; при простое отдается комментарий для поддержания соединения"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), keepalive)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            with self._lock:
+                self._wakeup.clear()
+                self._signaled = False
+                batch = list(self._buffer)
+                self._buffer.clear()
+                dropped = self.dropped - self._reported_dropped
+                self._reported_dropped = self.dropped
+            if dropped:
+                # Клиент отстал: часть событий потеряна, данные стоит перечитать запросом
+                yield f'event: lagged\ndata: {{"dropped": {dropped}}}\n\n'
+            self.delivered += len(batch)
+            yield ''.join(batch)
+
+class LiveHub:
+    """Внутрипроцессный хаб: обработчики записи публикуют события, подписчики получают копии.
+
+    Событие сериализуется один раз и только если есть подходящий подписчик;
+    публикация не ждет подписчиков, медленный клиент теряет старые события своего буфера.
+    """
+    def __init__(self, buffer_size: int, keepalive: float):
+        self.buffer_size = buffer_size
+        self.keepalive = keepalive
+        self._subscribers: Set[Subscription] = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.published = 0
+
+    @property
+    def active(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self, **filters) -> Subscription:
+        """Регистрация подписчика; вызывается из цикла событий, который будет читать его буфер"""
+        subscription = Subscription(asyncio.get_running_loop(), self.buffer_size, **filters)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(
+        self,
+        event: str,
+        payload: BaseModel,
+        station_id: Optional[int] = None,
+        location_id: Optional[int] = None,
+        sensor_type_id: Optional[int] = None
+    ):
+        if not self._subscribers:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+        message = None
+        for subscription in subscribers:
+            if not subscription.matches(event, station_id, location_id, sensor_type_id):
+                continue
+            if message is None:
+                message = f'id: {next(self._ids)}\nevent: {event}\ndata: {payload.model_dump_json()}\n\n'
+                self.published += 1
+            subscription.push(message)
+
+    async def stream(self, **filters) -> AsyncIterator[str]:
+        """Поток SSE-сообщений; подписка живет, пока клиент читает поток"""
+        subscription = self.subscribe(**filters)
+        try:
+            async for message in subscription.messages(self.keepalive):
+                yield message
+        finally:
+            self.unsubscribe(subscription)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        return {
+            'subscribers': len(subscribers),
+            'published': self.published,
+            'delivered': sum(subscription.delivered for subscription in subscribers),
+            'dropped': sum(subscription.dropped for subscription in subscribers),
+            'buffer_size': self.buffer_size,
+        }
+
+hub = LiveHub(config.LIVE_BUFFER_SIZE, config.LIVE_KEEPALIVE)
@@ -1,561 +1,1239 @@
-from fastapi import FastAPI, HTTPException, Depends, Query, BackgroundTasks
-from peewee import fn, JOIN, DoesNotExist
-from typing import List, Optional
-from datetime import datetime, timedelta
-import statistics
-import json
-
-from models import (
-    Location, WeatherStation, SensorType, Sensor, WeatherData, WeatherAlert,
-    create_tables, DBContext
-)
-from schemas import (
-    LocationCreate, LocationResponse, LocationWithStations,
-    WeatherStationCreate, WeatherStationResponse, WeatherStationWithSensors,
-    SensorTypeCreate, SensorTypeResponse,
-    SensorCreate, SensorResponse, SensorWithData,
-    WeatherDataCreate, WeatherDataResponse, WeatherDataWithSensor,
-    WeatherAlertCreate, WeatherAlertResponse, WeatherAlertWithLocation
-)
-
-app = FastAPI(
-    title="Weather Stations API",
-    version="1.0.0",
-    description="API для сбора и хранения данных с метеостанций",
-    docs_url="/api/docs",
-    redoc_url="/api/redoc"
-)
-
-@app.on_event("startup")
-def startup():
-    create_tables()
-    print("🚀 Weather Stations API запущен")
-
-# ========== CRUD для Location ==========
-@app.post("/locations/", response_model=LocationResponse, status_code=201)
-def create_location(location: LocationCreate):
-    with DBContext():
-        existing = Location.select().where(
-            (Location.latitude == location.latitude) &
-            (Location.longitude == location.longitude)
-        ).first()
-        if existing:
-            raise HTTPException(status_code=400, detail="Местоположение с такими координатами уже существует")
-        location_db = Location.create(**location.model_dump())
-        return LocationResponse.model_validate(location_db.__data__)
-
-@app.get("/locations/", response_model=List[LocationResponse])
-def read_locations(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000),
-    active_only: bool = True,
-    city: Optional[str] = None,
-    country: Optional[str] = None
-):
-    with DBContext():
-        query = Location.select()
-        if active_only:
-            query = query.where(Location.is_active == True)
-        if city:
-            query = query.where(Location.city.contains(city))
-        if country:
-            query = query.where(Location.country.contains(country))
-        locations = query.offset(skip).limit(limit)
-        return [LocationResponse.model_validate(loc.__data__) for loc in locations]
-
-@app.get("/locations/{location_id}", response_model=LocationWithStations)
-def read_location(location_id: int):
-    with DBContext():
-        try:
-            location = Location.get(Location.id == location_id)
-            stations = []
-            for station in location.stations.where(WeatherStation.is_active == True):
-                stations.append(WeatherStationResponse.model_validate(station.__data__))
-            active_alerts = []
-            now = datetime.now()
-            for alert in location.alerts.where(
-                (WeatherAlert.is_active == True) &
-                (WeatherAlert.start_time <= now) &
-                (WeatherAlert.end_time >= now)
-            ):
-                active_alerts.append(WeatherAlertResponse.model_validate(alert.__data__))
-            location_data = LocationWithStations.model_validate(location.__data__)
-            location_data.stations = stations
-            location_data.active_alerts = active_alerts
-            return location_data
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Местоположение не найдено")
-
-@app.put("/locations/{location_id}", response_model=LocationResponse)
-def update_location(location_id: int, location: LocationCreate):
-    with DBContext():
-        try:
-            location_db = Location.get(Location.id == location_id)
-            if (location_db.latitude != location.latitude or 
-                location_db.longitude != location.longitude):
-                existing = Location.select().where(
-                    (Location.latitude == location.latitude) &
-                    (Location.longitude == location.longitude) &
-                    (Location.id != location_id)
-                ).first()
-                if existing:
-                    raise HTTPException(status_code=400, detail="Местоположение с такими координатами уже существует")
-            for key, value in location.model_dump().items():
-                setattr(location_db, key, value)
-            location_db.save()
-            return LocationResponse.model_validate(location_db.__data__)
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Местоположение не найдено")
-
-@app.delete("/locations/{location_id}")
-def delete_location(location_id: int):
-    with DBContext():
-        try:
-            location = Location.get(Location.id == location_id)
-            location.delete_instance()
-            return {"message": "Местоположение успешно удалено"}
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Местоположение не найдено")
-
-# ========== CRUD для WeatherStation ==========
-@app.post("/stations/", response_model=WeatherStationResponse, status_code=201)
-def create_station(station: WeatherStationCreate):
-    with DBContext():
-        try:
-            Location.get(Location.id == station.location_id)
-            existing = WeatherStation.select().where(
-                WeatherStation.station_code == station.station_code
-            ).first()
-            if existing:
-                raise HTTPException(status_code=400, detail="Станция с таким кодом уже существует")
-            station_db = WeatherStation.create(**station.model_dump())
-            return WeatherStationResponse.model_validate(station_db.__data__)
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Местоположение не найдено")
-
-@app.get("/stations/", response_model=List[WeatherStationResponse])
-def read_stations(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000),
-    active_only: bool = True,
-    location_id: Optional[int] = None
-):
-    with DBContext():
-        query = WeatherStation.select()
-        if active_only:
-            query = query.where(WeatherStation.is_active == True)
-        if location_id:
-            query = query.where(WeatherStation.location == location_id)
-        stations = query.offset(skip).limit(limit)
-        return [WeatherStationResponse.model_validate(station.__data__) for station in stations]
-
-@app.get("/stations/{station_id}", response_model=WeatherStationWithSensors)
-def read_station(station_id: int):
-    with DBContext():
-        try:
-            station = WeatherStation.get(WeatherStation.id == station_id)
-            sensors_with_types = []
-            for sensor in station.sensors:
-                sensor_data = SensorWithData.model_validate(sensor.__data__)
-                sensor_data.sensor_type = SensorTypeResponse.model_validate(sensor.sensor_type.__data__)
-                data_query = sensor.weather_data
-                data_count = data_query.count()
-                sensor_data.data_count = data_count
-                if data_count > 0:
-                    latest = data_query.order_by(WeatherData.timestamp.desc()).first()
-                    sensor_data.latest_data = WeatherDataResponse.model_validate(latest.__data__)
-                    values = [d.value for d in data_query]
-                    sensor_data.avg_value = statistics.mean(values) if values else None
-                    sensor_data.min_value = min(values) if values else None
-                    sensor_data.max_value = max(values) if values else None
-                sensors_with_types.append(sensor_data)
-            station_data = WeatherStationWithSensors.model_validate(station.__data__)
-            station_data.location = LocationResponse.model_validate(station.location.__data__)
-            station_data.sensors = sensors_with_types
-            return station_data
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Метеостанция не найдена")
-
-@app.put("/stations/{station_id}", response_model=WeatherStationResponse)
-def update_station(station_id: int, station: WeatherStationCreate):
-    with DBContext():
-        try:
-            station_db = WeatherStation.get(WeatherStation.id == station_id)
-            Location.get(Location.id == station.location_id)
-            if station_db.station_code != station.station_code:
-                existing = WeatherStation.select().where(
-                    (WeatherStation.station_code == station.station_code) &
-                    (WeatherStation.id != station_id)
-                ).first()
-                if existing:
-                    raise HTTPException(status_code=400, detail="Станция с таким кодом уже существует")
-            for key, value in station.model_dump().items():
-                setattr(station_db, key, value)
-            station_db.save()
-            return WeatherStationResponse.model_validate(station_db.__data__)
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Метеостанция не найдена")
-
-@app.delete("/stations/{station_id}")
-def delete_station(station_id: int):
-    with DBContext():
-        try:
-            station = WeatherStation.get(WeatherStation.id == station_id)
-            station.delete_instance()
-            return {"message": "Метеостанция успешно удалена"}
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Метеостанция не найдена")
-
-# ========== CRUD для SensorType ==========
-@app.post("/sensor-types/", response_model=SensorTypeResponse, status_code=201)
-def create_sensor_type(sensor_type: SensorTypeCreate):
-    with DBContext():
-        existing = SensorType.select().where(
-            (SensorType.name == sensor_type.name) & (SensorType.unit == sensor_type.unit)
-        ).first()
-        if existing:
-            raise HTTPException(status_code=400, detail="Тип датчика с таким названием и единицами уже существует")
-        sensor_type_db = SensorType.create(**sensor_type.model_dump())
-        return SensorTypeResponse.model_validate(sensor_type_db.__data__)
-
-@app.get("/sensor-types/", response_model=List[SensorTypeResponse])
-def read_sensor_types():
-    with DBContext():
-        sensor_types = SensorType.select()
-        return [SensorTypeResponse.model_validate(st.__data__) for st in sensor_types]
-
-@app.put("/sensor-types/{sensor_type_id}", response_model=SensorTypeResponse)
-def update_sensor_type(sensor_type_id: int, sensor_type: SensorTypeCreate):
-    with DBContext():
-        try:
-            sensor_type_db = SensorType.get(SensorType.id == sensor_type_id)
-            for key, value in sensor_type.model_dump().items():
-                setattr(sensor_type_db, key, value)
-            sensor_type_db.save()
-            return SensorTypeResponse.model_validate(sensor_type_db.__data__)
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Тип датчика не найден")
-
-@app.delete("/sensor-types/{sensor_type_id}")
-def delete_sensor_type(sensor_type_id: int):
-    with DBContext():
-        try:
-            sensor_type = SensorType.get(SensorType.id == sensor_type_id)
-            sensor_type.delete_instance()
-            return {"message": "Тип датчика успешно удален"}
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Тип датчика не найден")
-
-# ========== CRUD для Sensor ==========
-@app.post("/sensors/", response_model=SensorResponse, status_code=201)
-def create_sensor(sensor: SensorCreate):
-    with DBContext():
-        try:
-            WeatherStation.get(WeatherStation.id == sensor.station_id)
-            SensorType.get(SensorType.id == sensor.sensor_type_id)
-            existing = Sensor.select().where(
-                (Sensor.station == sensor.station_id) &
-                (Sensor.sensor_code == sensor.sensor_code)
-            ).first()
-            if existing:
-                raise HTTPException(status_code=400, detail="Датчик с таким кодом уже существует на этой станции")
-            sensor_db = Sensor.create(**sensor.model_dump())
-            return SensorResponse.model_validate(sensor_db.__data__)
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Метеостанция или тип датчика не найдены")
-
-@app.get("/sensors/", response_model=List[SensorResponse])
-def read_sensors(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000),
-    station_id: Optional[int] = None,
-    sensor_type_id: Optional[int] = None,
-    active_only: bool = True
-):
-    with DBContext():
-        query = Sensor.select()
-        if active_only:
-            query = query.where(Sensor.is_active == True)
-        if station_id:
-            query = query.where(Sensor.station == station_id)
-        if sensor_type_id:
-            query = query.where(Sensor.sensor_type == sensor_type_id)
-        sensors = query.offset(skip).limit(limit)
-        return [SensorResponse.model_validate(sensor.__data__) for sensor in sensors]
-
-@app.get("/sensors/{sensor_id}", response_model=SensorWithData)
-def read_sensor(sensor_id: int):
-    with DBContext():
-        try:
-            sensor = Sensor.get(Sensor.id == sensor_id)
-            sensor_data = SensorWithData.model_validate(sensor.__data__)
-            sensor_data.sensor_type = SensorTypeResponse.model_validate(sensor.sensor_type.__data__)
-            data_query = sensor.weather_data
-            data_count = data_query.count()
-            sensor_data.data_count = data_count
-            if data_count > 0:
-                latest = data_query.order_by(WeatherData.timestamp.desc()).first()
-                sensor_data.latest_data = WeatherDataResponse.model_validate(latest.__data__)
-                values = [d.value for d in data_query]
-                sensor_data.avg_value = statistics.mean(values) if values else None
-                sensor_data.min_value = min(values) if values else None
-                sensor_data.max_value = max(values) if values else None
-            return sensor_data
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Датчик не найден")
-
-@app.put("/sensors/{sensor_id}", response_model=SensorResponse)
-def update_sensor(sensor_id: int, sensor: SensorCreate):
-    with DBContext():
-        try:
-            sensor_db = Sensor.get(Sensor.id == sensor_id)
-            WeatherStation.get(WeatherStation.id == sensor.station_id)
-            SensorType.get(SensorType.id == sensor.sensor_type_id)
-            if sensor_db.sensor_code != sensor.sensor_code:
-                existing = Sensor.select().where(
-                    (Sensor.station == sensor.station_id) &
-                    (Sensor.sensor_code == sensor.sensor_code) &
-                    (Sensor.id != sensor_id)
-                ).first()
-                if existing:
-                    raise HTTPException(status_code=400, detail="Датчик с таким кодом уже существует на этой станции")
-            for key, value in sensor.model_dump().items():
-                setattr(sensor_db, key, value)
-            sensor_db.save()
-            return SensorResponse.model_validate(sensor_db.__data__)
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Датчик не найден")
-
-@app.delete("/sensors/{sensor_id}")
-def delete_sensor(sensor_id: int):
-    with DBContext():
-        try:
-            sensor = Sensor.get(Sensor.id == sensor_id)
-            sensor.delete_instance()
-            return {"message": "Датчик успешно удален"}
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Датчик не найден")
-
-@app.get("/sensors/{sensor_id}/data", response_model=List[WeatherDataResponse])
-def get_sensor_data(
-    sensor_id: int,
-    start_time: Optional[datetime] = None,
-    end_time: Optional[datetime] = None,
-    limit: int = Query(1000, ge=1, le=10000)
-):
-    with DBContext():
-        try:
-            sensor = Sensor.get(Sensor.id == sensor_id)
-            query = sensor.weather_data
-            if start_time:
-                query = query.where(WeatherData.timestamp >= start_time)
-            if end_time:
-                query = query.where(WeatherData.timestamp <= end_time)
-            data = query.order_by(WeatherData.timestamp.desc()).limit(limit)
-            return [WeatherDataResponse.model_validate(d.__data__) for d in data]
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Датчик не найден")
-
-# ========== CRUD для WeatherData ==========
-@app.post("/weather-data/", response_model=WeatherDataResponse, status_code=201)
-def create_weather_data(data: WeatherDataCreate, background_tasks: BackgroundTasks):
-    with DBContext():
-        try:
-            sensor = Sensor.get(Sensor.id == data.sensor_id)
-            sensor_type = sensor.sensor_type
-            if sensor_type.min_value is not None and data.value < sensor_type.min_value:
-                raise HTTPException(status_code=400, detail=f"Значение ниже минимального ({sensor_type.min_value})")
-            if sensor_type.max_value is not None and data.value > sensor_type.max_value:
-                raise HTTPException(status_code=400, detail=f"Значение выше максимального ({sensor_type.max_value})")
-            data_dict = data.model_dump()
-            if isinstance(data_dict.get('raw_data'), dict):
-                data_dict['raw_data'] = json.dumps(data_dict['raw_data'])
-            data_db = WeatherData.create(**data_dict)
-            background_tasks.add_task(check_for_anomalies, data_db.id)
-            return WeatherDataResponse.model_validate(data_db.__data__)
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Датчик не найден")
-
-async def check_for_anomalies(data_id: int):
-    with DBContext():
-        try:
-            data = WeatherData.get(WeatherData.id == data_id)
-            sensor = data.sensor
-            sensor_type = sensor.sensor_type
-            historical_data = sensor.weather_data.where(
-                WeatherData.timestamp >= datetime.now() - timedelta(days=7)
-            ).limit(100)
-            if historical_data.count() > 10:
-                values = [d.value for d in historical_data]
-                mean = statistics.mean(values)
-                stdev = statistics.stdev(values) if len(values) > 1 else 0
-                if stdev > 0 and abs(data.value - mean) > 3 * stdev:
-                    print(f"⚠️ Аномальное значение: {data.value} (среднее: {mean})")
-                    WeatherAlert.create(
-                        location_id=sensor.station.location.id,
-                        alert_type="DATA_ANOMALY",
-                        severity="СРЕДНЯЯ",
-                        title=f"Аномальное значение датчика {sensor.sensor_code}",
-                        description=f"Значение {data.value}{sensor_type.unit} значительно отличается от ожидаемого",
-                        start_time=data.timestamp,
-                        end_time=data.timestamp + timedelta(hours=1),
-                        issued_at=datetime.now(),
-                        issuer="Система мониторинга",
-                        is_active=True
-                    )
-        except Exception as e:
-            print(f"Ошибка при проверке аномалий: {e}")
-
-@app.get("/weather-data/latest", response_model=List[WeatherDataWithSensor])
-def get_latest_weather_data(
-    station_id: Optional[int] = None,
-    location_id: Optional[int] = None,
-    limit: int = Query(100, ge=1, le=1000)
-):
-    with DBContext():
-        query = (WeatherData
-                 .select(WeatherData, Sensor, SensorType)
-                 .join(Sensor)
-                 .join(SensorType))
-        if station_id:
-            query = query.where(Sensor.station == station_id)
-        elif location_id:
-            query = (query
-                     .join(WeatherStation)
-                     .where(WeatherStation.location == location_id))
-        data = query.order_by(WeatherData.timestamp.desc()).limit(limit)
-        result = []
-        for item in data:
-            data_with_sensor = WeatherDataWithSensor.model_validate(item.__data__)
-            sensor_data = SensorWithData.model_validate(item.sensor.__data__)
-            sensor_data.sensor_type = SensorTypeResponse.model_validate(item.sensor.sensor_type.__data__)
-            data_with_sensor.sensor = sensor_data
-            result.append(data_with_sensor)
-        return result
-
-@app.put("/weather-data/{weather_data_id}", response_model=WeatherDataResponse)
-def update_weather_data(weather_data_id: int, data: WeatherDataCreate):
-    with DBContext():
-        try:
-            data_db = WeatherData.get(WeatherData.id == weather_data_id)
-            sensor = Sensor.get(Sensor.id == data.sensor_id)
-            sensor_type = sensor.sensor_type
-            if sensor_type.min_value is not None and data.value < sensor_type.min_value:
-                raise HTTPException(status_code=400, detail=f"Значение ниже минимального ({sensor_type.min_value})")
-            if sensor_type.max_value is not None and data.value > sensor_type.max_value:
-                raise HTTPException(status_code=400, detail=f"Значение выше максимального ({sensor_type.max_value})")
-            for key, value in data.model_dump().items():
-                setattr(data_db, key, value)
-            data_db.save()
-            return WeatherDataResponse.model_validate(data_db.__data__)
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Данные не найдены")
-
-@app.delete("/weather-data/{weather_data_id}")
-def delete_weather_data(weather_data_id: int):
-    with DBContext():
-        try:
-            data = WeatherData.get(WeatherData.id == weather_data_id)
-            data.delete_instance()
-            return {"message": "Данные успешно удалены"}
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Данные не найдены")
-
-# ========== CRUD для WeatherAlert ==========
-@app.post("/alerts/", response_model=WeatherAlertResponse, status_code=201)
-def create_weather_alert(alert: WeatherAlertCreate):
-    with DBContext():
-        try:
-            Location.get(Location.id == alert.location_id)
-            alert_db = WeatherAlert.create(**alert.model_dump())
-            return WeatherAlertResponse.model_validate(alert_db.__data__)
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Местоположение не найдено")
-
-@app.get("/alerts/", response_model=List[WeatherAlertWithLocation])
-def read_alerts(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000),
-    active_only: bool = True,
-    location_id: Optional[int] = None,
-    severity: Optional[str] = None,
-    start_time: Optional[datetime] = None,
-    end_time: Optional[datetime] = None
-):
-    with DBContext():
-        query = WeatherAlert.select(WeatherAlert, Location).join(Location)
-        if active_only:
-            query = query.where(WeatherAlert.is_active == True)
-        if location_id:
-            query = query.where(WeatherAlert.location == location_id)
-        if severity:
-            query = query.where(WeatherAlert.severity == severity)
-        if start_time:
-            query = query.where(WeatherAlert.start_time >= start_time)
-        if end_time:
-            query = query.where(WeatherAlert.end_time <= end_time)
-        alerts = query.order_by(WeatherAlert.issued_at.desc()).offset(skip).limit(limit)
-        result = []
-        for alert in alerts:
-            alert_with_loc = WeatherAlertWithLocation.model_validate(alert.__data__)
-            alert_with_loc.location = LocationResponse.model_validate(alert.location.__data__)
-            result.append(alert_with_loc)
-        return result
-
-@app.get("/alerts/active", response_model=List[WeatherAlertWithLocation])
-def get_active_alerts():
-    with DBContext():
-        now = datetime.now()
-        alerts = (WeatherAlert
-                  .select(WeatherAlert, Location)
-                  .join(Location)
-                  .where(
-                      (WeatherAlert.is_active == True) &
-                      (WeatherAlert.start_time <= now) &
-                      (WeatherAlert.end_time >= now)
-                  )
-                  .order_by(WeatherAlert.severity.desc(), WeatherAlert.issued_at.desc()))
-        result = []
-        for alert in alerts:
-            alert_with_loc = WeatherAlertWithLocation.model_validate(alert.__data__)
-            alert_with_loc.location = LocationResponse.model_validate(alert.location.__data__)
-            result.append(alert_with_loc)
-        return result
-
-@app.get("/alerts/{alert_id}", response_model=WeatherAlertWithLocation)
-def read_alert(alert_id: int):
-    with DBContext():
-        try:
-            alert = WeatherAlert.get(WeatherAlert.id == alert_id)
-            alert_with_loc = WeatherAlertWithLocation.model_validate(alert.__data__)
-            alert_with_loc.location = LocationResponse.model_validate(alert.location.__data__)
-            return alert_with_loc
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Предупреждение не найдено")
-
-@app.put("/alerts/{alert_id}", response_model=WeatherAlertResponse)
-def update_weather_alert(alert_id: int, alert: WeatherAlertCreate):
-    with DBContext():
-        try:
-            alert_db = WeatherAlert.get(WeatherAlert.id == alert_id)
-            Location.get(Location.id == alert.location_id)
-            for key, value in alert.model_dump().items():
-                setattr(alert_db, key, value)
-            alert_db.save()
-            return WeatherAlertResponse.model_validate(alert_db.__data__)
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Предупреждение не найдено")
-
-@app.delete("/alerts/{alert_id}")
-def delete_weather_alert(alert_id: int):
-    with DBContext():
-        try:
-            alert = WeatherAlert.get(WeatherAlert.id == alert_id)
-            alert.delete_instance()
-            return {"message": "Предупреждение успешно удалено"}
-        except DoesNotExist:
-            raise HTTPException(status_code=404, detail="Предупреждение не найдено")
-
-if __name__ == "__main__":
-    import uvicorn
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, Header, Path
+from fastapi.responses import StreamingResponse
+from anyio import to_thread
+from peewee import fn, JOIN, DoesNotExist, Tuple
+from typing import List, Optional, Union
+from datetime import date, datetime, timedelta
+
+from models import (
+    Location, WeatherStation, SensorType, Sensor, WeatherAlert, SensorLatest,
+    database, create_tables, DBContext
+)
+from storage import (
+    check_value_range, naive_utc, reading_row, insert_readings, sensor_stats, latest_readings,
+    iter_reading_pages, sensor_reading_rows, sensor_reading_columns, station_reading_columns, refresh_latest, ensure_latest_built,
+    get_reading, save_reading, delete_reading, drop_partition, ensure_partitions
+)
+import partitions
+from columnar import COLUMNAR_MEDIA_TYPE, accepts_columnar, encode_columns, epoch_ms, rollup_columns
+from frames import FRAME_MEDIA_TYPE, FrameError, decode_frame, from_epoch_ms
+from export import FORMATTERS, MEDIA_TYPES
+from pagination import decode_cursor, set_next_cursor
+from serialization import response_fields, select_columns, schema_defaults, json_response, orjson_response
+import timeseries
+import analytics
+import rollups
+import spatial
+import search
+from anomalies import detector, worker
+from retention import retention_job
+from alerts import active_alerts, alert_row
+from live import hub, EVENT_TYPES
+from ingest import ingest_buffer
+from executors import read_executor, write_executor
+from config import EXPORT_PAGE_SIZE, ANALYTICS_CACHE_SECONDS, DB_SYNC_WORKERS
+from cache import metadata, responses
+from schemas import (
+    LocationCreate, LocationResponse, LocationWithStations, LocationWithDistance,
+    WeatherStationCreate, WeatherStationResponse, WeatherStationWithSensors, WeatherStationWithLatest,
+    SensorTypeCreate, SensorTypeResponse,
+    SensorCreate, SensorResponse, SensorWithData,
+    WeatherDataCreate, WeatherDataResponse, WeatherDataWithSensor,
+    WeatherDataBatchCreate, WeatherDataBatchItemResult, WeatherDataBatchResponse,
+    WeatherDataBufferedResponse, WeatherDataIngestStatus, WeatherDataFrameResponse,
+    WeatherDataRollupResponse, StationTimeseriesResponse, SensorAnalyticsResponse,
+    WeatherAlertCreate, WeatherAlertResponse, WeatherAlertWithLocation,
+    SearchResult
+)
+
+app = FastAPI(
+    title="Weather Stations API",
+    version="1.0.0",
+    description="API для сбора и хранения данных с метеостанций",
+    docs_url="/api/docs",
+    redoc_url="/api/redoc"
+)
+
+@app.on_event("startup")
+def startup():
+    create_tables()
+    with DBContext():
+        partitions.migrate_legacy()
+        partitions.migrate_raw_data()
+        rollups.ensure_built()
+        ensure_latest_built()
+        spatial.ensure_index()
+        search.ensure_index()
+        active_alerts.load()
+    worker.start()
+    ingest_buffer.start(readings_committed)
+    retention_job.start()
+    print("🚀 Weather Stations API запущен")
+
+@app.on_event("startup")
+async def limit_threadpool():
+    # Синхронные эндпоинты занимают потоки AnyIO, каждый со своим соединением из пула
+    to_thread.current_default_thread_limiter().total_tokens = DB_SYNC_WORKERS
+
+@app.on_event("shutdown")
+def shutdown():
+    retention_job.stop()
+    write_executor.shutdown()
+    read_executor.shutdown()
+    # Буфер записывается до остановки проверки аномалий: она получает записанные показания
+    ingest_buffer.stop()
+    worker.stop()
+    with DBContext():
+        detector.checkpoint()
+
+def build_sensor_with_data(sensor, stats, latest) -> SensorWithData:
+    """Сборка ответа по датчику из агрегатов и последнего показания"""
+    sensor_data = SensorWithData.model_validate({
+        **sensor.to_dict(),
+        'sensor_type': sensor.sensor_type.to_dict(),
+        **(stats or {})
+    })
+    if latest is not None:
+        sensor_data.latest_data = WeatherDataResponse.model_validate(latest.to_dict())
+    return sensor_data
+
+def build_locations_with_distance(found, include_stations: bool) -> List[LocationWithDistance]:
+    """Местоположения из пространственного запроса, при необходимости со станциями и последними показаниями"""
+    stations = {}
+    if include_stations and found:
+        station_list = list(WeatherStation.select().where(
+            (WeatherStation.location.in_([location.id for location, _ in found])) &
+            (WeatherStation.is_active == True)
+        ))
+        latest = {}
+        if station_list:
+            query = (SensorLatest
+                     .select(SensorLatest, Sensor.id, Sensor.station)
+                     .join(Sensor)
+                     .where(Sensor.station.in_([station.id for station in station_list])))
+            for item in query:
+                latest.setdefault(item.sensor.station_id, []).append(
+                    WeatherDataResponse.model_validate(item.to_dict()))
+        for station in station_list:
+            stations.setdefault(station.location_id, []).append(WeatherStationWithLatest.model_validate(
+                {**station.to_dict(), 'latest_data': latest.get(station.id, [])}
+            ))
+    result = []
+    for location, distance in found:
+        result.append(LocationWithDistance.model_validate({
+            **location.to_dict(),
+            'distance_km': round(distance, 3) if distance is not None else None,
+            'stations': stations.get(location.id, [])
+        }))
+    return result
+
+def cached_response(key: tuple, if_none_match: Optional[str], build) -> Response:
+    """Ответ из кэша ответов со строгим ETag.
+
+    При совпадении If-None-Match с актуальной записью возвращается 304 без обращения к базе.
+    build выполняется при промахе и возвращает (схему ответа, момент устаревания или None).
+    """
+    entry = responses.get(key)
+    if entry is None:
+        generation = responses.generation(key)
+        with DBContext():
+            model, expires_at = build()
+        entry = responses.put(key, model.model_dump_json().encode(), generation, expires_at)
+    if responses.check_not_modified(entry, if_none_match):
+        return Response(status_code=304, headers={"ETag": entry.etag})
+    return Response(entry.body, media_type="application/json", headers={"ETag": entry.etag})
+
+def parse_ids(value: Optional[str], detail: str) -> Optional[List[int]]:
+    """Список идентификаторов из параметра вида '1,2,3'"""
+    if not value:
+        return None
+    try:
+        return [int(item) for item in value.split(',') if item.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=detail)
+
+def utc_bounds(start: Optional[datetime], end: Optional[datetime]) -> tuple:
+    """Границы периода из запроса в UTC без пояса, как хранятся метки в базе"""
+    return naive_utc(start) if start else None, naive_utc(end) if end else None
+
+def publish_reading(sensor, data: WeatherDataResponse):
+    hub.publish('reading', data, sensor.station_id, sensor.station.location_id, sensor.sensor_type_id)
+
+def readings_committed(readings, ids):
+    """Действия после фиксации новых показаний: кэш ответов, проверка аномалий, подписчики"""
+    responses.invalidate('station', *(sensor.station_id for sensor, _ in readings))
+    worker.submit((sensor, row['value'], row['timestamp']) for sensor, row in readings)
+    for (sensor, row), data_id in zip(readings, ids):
+        if hub.active:
+            publish_reading(sensor, WeatherDataResponse(
+                id=data_id, sensor_id=row['sensor'], timestamp=row['timestamp'],
+                value=row['value'], quality=row['quality'], raw_data=row['raw_data']))
+
+def invalidate_sensor_stations(sensor_ids):
+    """Сброс кэшированных ответов станций, к которым относятся датчики"""
+    responses.invalidate('station', *(sensor.station_id for sensor in metadata.get_sensors(sensor_ids).values()))
+
+# ========== CRUD для Location ==========
+@app.post("/locations/", response_model=LocationResponse, status_code=201)
+def create_location(location: LocationCreate):
+    with DBContext():
+        existing = Location.select().where(
+            (Location.latitude == location.latitude) &
+            (Location.longitude == location.longitude)
+        ).first()
+        if existing:
+            raise HTTPException(status_code=400, detail="Местоположение с такими координатами уже существует")
+        with database.atomic():
+            location_db = Location.create(**location.model_dump())
+            spatial.index_location(location_db)
+            search.index_location(location_db)
+        return LocationResponse.model_validate(location_db.to_dict())
+
+@app.get("/locations/", response_model=List[LocationResponse])
+def read_locations(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    active_only: bool = True,
+    city: Optional[str] = None,
+    country: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Поля ответа через запятую")
+):
+    with DBContext():
+        names = response_fields(fields, LocationResponse)
+        _, columns = select_columns(Location, names + ['id'])
+        query = Location.select(*columns)
+        if cursor:
+            after_id, = decode_cursor(cursor, int)
+            query = query.where(Location.id > after_id)
+        if active_only:
+            query = query.where(Location.is_active == True)
+        if city:
+            query = query.where(Location.city.contains(city))
+        if country:
+            query = query.where(Location.country.contains(country))
+        locations = list(query.order_by(Location.id).offset(skip).limit(limit).dicts())
+        result = json_response(locations, names)
+        set_next_cursor(result, locations, limit, lambda loc: (loc['id'],))
+        return result
+
+@app.get("/locations/nearby", response_model=List[LocationWithDistance])
+def read_locations_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(..., gt=0, le=20038),
+    limit: int = Query(100, ge=1, le=1000),
+    active_only: bool = True,
+    include_stations: bool = False
+):
+    with DBContext():
+        found = spatial.nearby(lat, lon, radius_km, limit, active_only)
+        return build_locations_with_distance(found, include_stations)
+
+@app.get("/locations/within", response_model=List[LocationWithDistance])
+def read_locations_within(
+    bbox: str = Query(..., description="min_lon,min_lat,max_lon,max_lat"),
+    limit: int = Query(1000, ge=1, le=10000),
+    active_only: bool = True,
+    include_stations: bool = False
+):
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(','))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный bbox")
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= 180 and -180 <= max_lon <= 180):
+        raise HTTPException(status_code=400, detail="Некорректный bbox")
+    with DBContext():
+        found = spatial.within(min_lon, min_lat, max_lon, max_lat, limit, active_only)
+        return build_locations_with_distance([(location, None) for location in found], include_stations)
+
+@app.get("/locations/{location_id}", response_model=LocationWithStations)
+def read_location(location_id: int, if_none_match: Optional[str] = Header(None)):
+    try:
+        return cached_response(('location', location_id), if_none_match, lambda: build_location(location_id))
+    except DoesNotExist:
+        raise HTTPException(status_code=404, detail="Местоположение не найдено")
+
+def build_location(location_id: int):
+    location = Location.get(Location.id == location_id)
+    stations = []
+    for station in location.stations.where(WeatherStation.is_active == True):
+        stations.append(WeatherStationResponse.model_validate(station.to_dict()))
+    now = datetime.now()
+    location_data = LocationWithStations.model_validate(location.to_dict())
+    location_data.stations = stations
+    location_data.active_alerts = [
+        WeatherAlertResponse.model_validate(alert) for alert in active_alerts.active(now, location_id)
+    ]
+    # Список активных предупреждений меняется со временем: ответ живет до ближайшей границы
+    return location_data, active_alerts.next_change(location_id, now)
+
+@app.put("/locations/{location_id}", response_model=LocationResponse)
+def update_location(location_id: int, location: LocationCreate):
+    with DBContext():
+        try:
+            location_db = Location.get(Location.id == location_id)
+            if (location_db.latitude != location.latitude or 
+                location_db.longitude != location.longitude):
+                existing = Location.select().where(
+                    (Location.latitude == location.latitude) &
+                    (Location.longitude == location.longitude) &
+                    (Location.id != location_id)
+                ).first()
+                if existing:
+                    raise HTTPException(status_code=400, detail="Местоположение с такими координатами уже существует")
+            for key, value in location.model_dump().items():
+                setattr(location_db, key, value)
+            with database.atomic():
+                location_db.save()
+                spatial.index_location(location_db)
+                search.index_location(location_db)
+            metadata.invalidate_location(location_id)
+            responses.invalidate('location', location_id)
+            responses.invalidate_all('station')
+            return LocationResponse.model_validate(location_db.to_dict())
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Местоположение не найдено")
+
+@app.delete("/locations/{location_id}")
+def delete_location(location_id: int):
+    with DBContext():
+        try:
+            location = Location.get(Location.id == location_id)
+            with database.atomic():
+                search.unindex_location(location_id)
+                location.delete_instance()
+                spatial.unindex_location(location_id)
+            active_alerts.remove_location(location_id)
+            metadata.invalidate_location(location_id)
+            responses.invalidate('location', location_id)
+            responses.invalidate_all('station')
+            return {"message": "Местоположение успешно удалено"}
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Местоположение не найдено")
+
+# ========== CRUD для WeatherStation ==========
+@app.post("/stations/", response_model=WeatherStationResponse, status_code=201)
+def create_station(station: WeatherStationCreate):
+    with DBContext():
+        try:
+            metadata.get_location(station.location_id)
+            existing = WeatherStation.select().where(
+                WeatherStation.station_code == station.station_code
+            ).first()
+            if existing:
+                raise HTTPException(status_code=400, detail="Станция с таким кодом уже существует")
+            with database.atomic():
+                station_db = WeatherStation.create(**station.model_dump())
+                search.index_station(station_db)
+            responses.invalidate('location', station_db.location_id)
+            return WeatherStationResponse.model_validate(station_db.to_dict())
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Местоположение не найдено")
+
+@app.get("/stations/", response_model=List[WeatherStationResponse])
+def read_stations(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    active_only: bool = True,
+    location_id: Optional[int] = None,
+    fields: Optional[str] = Query(None, description="Поля ответа через запятую")
+):
+    with DBContext():
+        names = response_fields(fields, WeatherStationResponse)
+        _, columns = select_columns(WeatherStation, names + ['id'])
+        query = WeatherStation.select(*columns)
+        if cursor:
+            after_id, = decode_cursor(cursor, int)
+            query = query.where(WeatherStation.id > after_id)
+        if active_only:
+            query = query.where(WeatherStation.is_active == True)
+        if location_id:
+            query = query.where(WeatherStation.location == location_id)
+        stations = list(query.order_by(WeatherStation.id).offset(skip).limit(limit).dicts())
+        result = json_response(stations, names)
+        set_next_cursor(result, stations, limit, lambda station: (station['id'],))
+        return result
+
+@app.get("/stations/{station_id}", response_model=WeatherStationWithSensors)
+def read_station(
+    station_id: int,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    start_time, end_time = utc_bounds(start_time, end_time)
+    try:
+        return cached_response(
+            ('station', station_id, start_time, end_time), if_none_match,
+            lambda: (build_station(station_id, start_time, end_time), None)
+        )
+    except DoesNotExist:
+        raise HTTPException(status_code=404, detail="Метеостанция не найдена")
+
+def build_station(station_id: int, start_time: Optional[datetime], end_time: Optional[datetime]):
+    station = metadata.get_station(station_id)
+    sensors = list(station.sensors.select(Sensor, SensorType).join(SensorType))
+    sensor_ids = [sensor.id for sensor in sensors]
+    stats = sensor_stats(sensor_ids, start_time, end_time)
+    latest = latest_readings(sensor_ids)
+    sensors_with_types = [
+        build_sensor_with_data(sensor, stats.get(sensor.id), latest.get(sensor.id))
+        for sensor in sensors
+    ]
+    station_data = WeatherStationWithSensors.model_validate(
+        {**station.to_dict(), 'location': station.location.to_dict()}
+    )
+    station_data.sensors = sensors_with_types
+    return station_data
+
+@app.get("/stations/{station_id}/timeseries", response_model=StationTimeseriesResponse)
+async def get_station_timeseries(
+    station_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    step: str = Query("1h", description="Шаг сетки: 30s, 15m, 1h, 1d"),
+    agg: Optional[str] = Query(
+        None, description="Свертка mean|min|max|last для всех колонок и/или по типам датчиков: mean,3:max,6:last"
+    )
+):
+    return await read_executor.run(_get_station_timeseries, station_id, start, end, step, agg)
+
+def parse_aggregations(value: Optional[str], type_ids: List[int]) -> List[str]:
+    """Свертка для каждой колонки (типа датчика) из параметра agg; по умолчанию mean"""
+    default = 'mean'
+    by_type = {}
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        type_id, _, aggregation = item.rpartition(':')
+        if aggregation not in timeseries.AGGREGATIONS:
+            raise HTTPException(
+                status_code=400, detail=f"Допустимые свертки: {', '.join(timeseries.AGGREGATIONS)}")
+        if not type_id:
+            default = aggregation
+            continue
+        if not type_id.isdigit() or int(type_id) not in type_ids:
+            raise HTTPException(status_code=400, detail=f"Тип датчика {type_id} отсутствует на станции")
+        by_type[int(type_id)] = aggregation
+    return [by_type.get(type_id, default) for type_id in type_ids]
+
+def _get_station_timeseries(station_id, start, end, step, agg) -> Response:
+    try:
+        step_ms = timeseries.parse_step(step)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный шаг сетки")
+    end = end or datetime.now()
+    start = start or end - timedelta(days=1)
+    # Сетка выравнивается по кратным шагу от эпохи, как агрегаты по минутам, часам и суткам
+    start_ms = epoch_ms(start) // step_ms * step_ms
+    end_ms = epoch_ms(end)
+    if end_ms <= start_ms:
+        raise HTTPException(status_code=400, detail="Конец периода должен быть позже начала")
+    nbuckets = -(-(end_ms - start_ms) // step_ms)
+    if nbuckets > timeseries.MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Больше {timeseries.MAX_BUCKETS} интервалов: уменьшите период или увеличьте шаг")
+    with DBContext():
+        try:
+            metadata.get_station(station_id)
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Метеостанция не найдена")
+        sensors = list(Sensor
+                       .select(Sensor, SensorType)
+                       .join(SensorType)
+                       .where(Sensor.station == station_id)
+                       .order_by(Sensor.sensor_type, Sensor.id))
+        # Одна колонка на тип датчика: показания нескольких датчиков одного типа сворачиваются вместе
+        types = {}
+        for sensor in sensors:
+            types.setdefault(sensor.sensor_type_id, (sensor.sensor_type, []))[1].append(sensor.id)
+        type_ids = list(types)
+        aggregations = parse_aggregations(agg, type_ids)
+        sensor_columns = {
+            sensor_id: index for index, type_id in enumerate(type_ids) for sensor_id in types[type_id][1]
+        }
+        grid_start = from_epoch_ms(start_ms)
+        columns = station_reading_columns(list(sensor_columns), grid_start, from_epoch_ms(end_ms))
+    matrix = timeseries.align(sensor_columns, aggregations, *columns, start_ms, step_ms, nbuckets)
+    step_delta = timedelta(milliseconds=step_ms)
+    return orjson_response({
+        'station_id': station_id,
+        'start': grid_start,
+        'end': from_epoch_ms(end_ms),
+        'step_seconds': step_ms // 1000,
+        'timestamps': [grid_start + step_delta * index for index in range(nbuckets)],
+        'columns': [
+            {
+                'sensor_type_id': type_id,
+                'name': types[type_id][0].name,
+                'unit': types[type_id][0].unit,
+                'aggregation': aggregation,
+                'sensor_ids': types[type_id][1],
+            }
+            for type_id, aggregation in zip(type_ids, aggregations)
+        ],
+        'values': matrix.tolist(),
+    })
+
+@app.put("/stations/{station_id}", response_model=WeatherStationResponse)
+def update_station(station_id: int, station: WeatherStationCreate):
+    with DBContext():
+        try:
+            station_db = WeatherStation.get(WeatherStation.id == station_id)
+            metadata.get_location(station.location_id)
+            if station_db.station_code != station.station_code:
+                existing = WeatherStation.select().where(
+                    (WeatherStation.station_code == station.station_code) &
+                    (WeatherStation.id != station_id)
+                ).first()
+                if existing:
+                    raise HTTPException(status_code=400, detail="Станция с таким кодом уже существует")
+            previous_location_id = station_db.location_id
+            for key, value in station.model_dump().items():
+                setattr(station_db, key, value)
+            with database.atomic():
+                station_db.save()
+                search.index_station(station_db)
+            metadata.invalidate_station(station_id)
+            responses.invalidate('station', station_id)
+            responses.invalidate('location', previous_location_id, station_db.location_id)
+            return WeatherStationResponse.model_validate(station_db.to_dict())
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Метеостанция не найдена")
+
+@app.delete("/stations/{station_id}")
+def delete_station(station_id: int):
+    with DBContext():
+        try:
+            station = WeatherStation.get(WeatherStation.id == station_id)
+            with database.atomic():
+                station.delete_instance()
+                search.unindex('station', station_id)
+            metadata.invalidate_station(station_id)
+            responses.invalidate('station', station_id)
+            responses.invalidate('location', station.location_id)
+            return {"message": "Метеостанция успешно удалена"}
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Метеостанция не найдена")
+
+# ========== CRUD для SensorType ==========
+@app.post("/sensor-types/", response_model=SensorTypeResponse, status_code=201)
+def create_sensor_type(sensor_type: SensorTypeCreate):
+    with DBContext():
+        existing = SensorType.select().where(
+            (SensorType.name == sensor_type.name) & (SensorType.unit == sensor_type.unit)
+        ).first()
+        if existing:
+            raise HTTPException(status_code=400, detail="Тип датчика с таким названием и единицами уже существует")
+        sensor_type_db = SensorType.create(**sensor_type.model_dump())
+        return SensorTypeResponse.model_validate(sensor_type_db.to_dict())
+
+@app.get("/sensor-types/", response_model=List[SensorTypeResponse])
+def read_sensor_types(
+    fields: Optional[str] = Query(None, description="Поля ответа через запятую")
+):
+    with DBContext():
+        names = response_fields(fields, SensorTypeResponse)
+        _, columns = select_columns(SensorType, names)
+        return json_response(list(SensorType.select(*columns).dicts()), names)
+
+@app.put("/sensor-types/{sensor_type_id}", response_model=SensorTypeResponse)
+def update_sensor_type(sensor_type_id: int, sensor_type: SensorTypeCreate):
+    with DBContext():
+        try:
+            sensor_type_db = SensorType.get(SensorType.id == sensor_type_id)
+            for key, value in sensor_type.model_dump().items():
+                setattr(sensor_type_db, key, value)
+            sensor_type_db.save()
+            metadata.invalidate_sensor_type(sensor_type_id)
+            responses.invalidate_all('station')
+            return SensorTypeResponse.model_validate(sensor_type_db.to_dict())
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Тип датчика не найден")
+
+@app.delete("/sensor-types/{sensor_type_id}")
+def delete_sensor_type(sensor_type_id: int):
+    with DBContext():
+        try:
+            sensor_type = SensorType.get(SensorType.id == sensor_type_id)
+            sensor_type.delete_instance()
+            metadata.invalidate_sensor_type(sensor_type_id)
+            responses.invalidate_all('station')
+            return {"message": "Тип датчика успешно удален"}
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Тип датчика не найден")
+
+# ========== CRUD для Sensor ==========
+@app.post("/sensors/", response_model=SensorResponse, status_code=201)
+def create_sensor(sensor: SensorCreate):
+    with DBContext():
+        try:
+            metadata.get_station(sensor.station_id)
+            metadata.get_sensor_type(sensor.sensor_type_id)
+            existing = Sensor.select().where(
+                (Sensor.station == sensor.station_id) &
+                (Sensor.sensor_code == sensor.sensor_code)
+            ).first()
+            if existing:
+                raise HTTPException(status_code=400, detail="Датчик с таким кодом уже существует на этой станции")
+            sensor_db = Sensor.create(**sensor.model_dump())
+            responses.invalidate('station', sensor_db.station_id)
+            return SensorResponse.model_validate(sensor_db.to_dict())
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Метеостанция или тип датчика не найдены")
+
+@app.get("/sensors/", response_model=List[SensorResponse])
+def read_sensors(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    station_id: Optional[int] = None,
+    sensor_type_id: Optional[int] = None,
+    active_only: bool = True,
+    fields: Optional[str] = Query(None, description="Поля ответа через запятую")
+):
+    with DBContext():
+        names = response_fields(fields, SensorResponse)
+        _, columns = select_columns(Sensor, names + ['id'])
+        query = Sensor.select(*columns)
+        if cursor:
+            after_id, = decode_cursor(cursor, int)
+            query = query.where(Sensor.id > after_id)
+        if active_only:
+            query = query.where(Sensor.is_active == True)
+        if station_id:
+            query = query.where(Sensor.station == station_id)
+        if sensor_type_id:
+            query = query.where(Sensor.sensor_type == sensor_type_id)
+        sensors = list(query.order_by(Sensor.id).offset(skip).limit(limit).dicts())
+        result = json_response(sensors, names)
+        set_next_cursor(result, sensors, limit, lambda sensor: (sensor['id'],))
+        return result
+
+@app.get("/sensors/{sensor_id}", response_model=SensorWithData)
+def read_sensor(
+    sensor_id: int,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None
+):
+    start_time, end_time = utc_bounds(start_time, end_time)
+    with DBContext():
+        try:
+            sensor = metadata.get_sensor(sensor_id)
+            stats = sensor_stats([sensor.id], start_time, end_time)
+            latest = latest_readings([sensor.id])
+            return build_sensor_with_data(sensor, stats.get(sensor.id), latest.get(sensor.id))
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Датчик не найден")
+
+@app.put("/sensors/{sensor_id}", response_model=SensorResponse)
+def update_sensor(sensor_id: int, sensor: SensorCreate):
+    with DBContext():
+        try:
+            sensor_db = Sensor.get(Sensor.id == sensor_id)
+            metadata.get_station(sensor.station_id)
+            metadata.get_sensor_type(sensor.sensor_type_id)
+            if sensor_db.sensor_code != sensor.sensor_code:
+                existing = Sensor.select().where(
+                    (Sensor.station == sensor.station_id) &
+                    (Sensor.sensor_code == sensor.sensor_code) &
+                    (Sensor.id != sensor_id)
+                ).first()
+                if existing:
+                    raise HTTPException(status_code=400, detail="Датчик с таким кодом уже существует на этой станции")
+            previous_station_id = sensor_db.station_id
+            for key, value in sensor.model_dump().items():
+                setattr(sensor_db, key, value)
+            sensor_db.save()
+            metadata.invalidate_sensor(sensor_id)
+            responses.invalidate('station', previous_station_id, sensor_db.station_id)
+            return SensorResponse.model_validate(sensor_db.to_dict())
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Датчик не найден")
+
+@app.delete("/sensors/{sensor_id}")
+def delete_sensor(sensor_id: int):
+    with DBContext():
+        try:
+            sensor = Sensor.get(Sensor.id == sensor_id)
+            sensor.delete_instance()
+            metadata.invalidate_sensor(sensor_id)
+            responses.invalidate('station', sensor.station_id)
+            return {"message": "Датчик успешно удален"}
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Датчик не найден")
+
+@app.get(
+    "/sensors/{sensor_id}/data",
+    response_model=Union[List[WeatherDataResponse], List[WeatherDataRollupResponse]],
+    responses={200: {"content": {COLUMNAR_MEDIA_TYPE: {}}}}
+)
+async def get_sensor_data(
+    sensor_id: int,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    resolution: Optional[str] = Query(None, pattern="^(1m|1h|1d)$"),
+    include_raw: bool = Query(False, description="Включить сырые данные (распаковываются по запросу)"),
+    fields: Optional[str] = Query(None, description="Поля ответа через запятую"),
+    accept: Optional[str] = Header(None)
+):
+    return await read_executor.run(
+        _get_sensor_data, sensor_id, start_time, end_time, limit, cursor, resolution, include_raw, fields, accept
+    )
+
+def _get_sensor_data(sensor_id, start_time, end_time, limit, cursor, resolution, include_raw, fields, accept):
+    start_time, end_time = utc_bounds(start_time, end_time)
+    with DBContext():
+        try:
+            sensor = metadata.get_sensor(sensor_id)
+            columnar = accepts_columnar(accept)
+            if resolution:
+                before, = decode_cursor(cursor, datetime) if cursor else (None,)
+                buckets = rollups.query_rollups(sensor.id, resolution, start_time, end_time, limit, before)
+                if columnar:
+                    result = Response(rollup_columns(buckets), media_type=COLUMNAR_MEDIA_TYPE)
+                else:
+                    names = response_fields(fields, WeatherDataRollupResponse)
+                    result = json_response(
+                        [WeatherDataRollupResponse.from_rollup(bucket).model_dump() for bucket in buckets], names)
+                set_next_cursor(result, buckets, limit, lambda bucket: (bucket.bucket,))
+                return result
+            before = decode_cursor(cursor, datetime, int) if cursor else None
+            if columnar:
+                ids, timestamps, values, qualities, last_timestamp = sensor_reading_columns(
+                    sensor.id, start_time, end_time, limit, before)
+                binary = Response(
+                    encode_columns([('timestamp', timestamps), ('value', values), ('quality', qualities)]),
+                    media_type=COLUMNAR_MEDIA_TYPE
+                )
+                set_next_cursor(binary, ids, limit, lambda data_id: (last_timestamp, data_id))
+                return binary
+            names = response_fields(fields, WeatherDataResponse)
+            stored = [name for name in names if include_raw or name != 'raw_data']
+            data = sensor_reading_rows(sensor.id, stored + ['timestamp', 'id'], start_time, end_time, limit, before)
+            defaults = schema_defaults(WeatherDataResponse, [name for name in names if name not in stored])
+            for row in data:
+                row.update(defaults)
+            result = json_response(data, names)
+            set_next_cursor(result, data, limit, lambda d: (d['timestamp'], d['id']))
+            return result
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Датчик не найден")
+
+@app.get("/sensors/{sensor_id}/analytics", response_model=SensorAnalyticsResponse)
+async def get_sensor_analytics(
+    sensor_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    rolling: str = Query("1h", description="Окно скользящего среднего: 30s, 15m, 1h, 1d"),
+    if_none_match: Optional[str] = Header(None)
+):
+    return await read_executor.run(_get_sensor_analytics, sensor_id, start, end, rolling, if_none_match)
+
+def _get_sensor_analytics(sensor_id, start, end, rolling, if_none_match) -> Response:
+    try:
+        rolling_ms = timeseries.parse_step(rolling)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректное окно скользящего среднего")
+    start, end = utc_bounds(start, end)
+    if start and end and end <= start:
+        raise HTTPException(status_code=400, detail="Конец периода должен быть позже начала")
+    with DBContext():
+        try:
+            sensor = metadata.get_sensor(sensor_id)
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Датчик не найден")
+    # Ключ под станцией: ответ сбрасывается при записи показаний станции и изменении ее датчиков
+    return cached_response(
+        ('station', sensor.station_id, 'analytics', sensor_id, start, end, rolling_ms), if_none_match,
+        lambda: build_sensor_analytics(sensor_id, start, end, rolling_ms)
+    )
+
+def build_sensor_analytics(sensor_id: int, start: Optional[datetime], end: Optional[datetime], rolling_ms: int):
+    now = datetime.now()
+    window_end = end or now
+    window_start = start or window_end - timedelta(days=1)
+    if window_end <= window_start:
+        raise HTTPException(status_code=400, detail="Конец периода должен быть позже начала")
+    source = analytics.choose_source(window_start, window_end, now)
+    window = analytics.load_window(sensor_id, window_start, window_end, source)
+    result = SensorAnalyticsResponse(
+        sensor_id=sensor_id,
+        start=window_start,
+        end=window_end,
+        source=source,
+        rolling_window_seconds=rolling_ms // 1000,
+        **analytics.analyze(window, epoch_ms(window_start), rolling_ms)
+    )
+    # Окно без end сдвигается вместе с текущим временем, поэтому такой ответ живет ограниченное время
+    return result, None if end else now + timedelta(seconds=ANALYTICS_CACHE_SECONDS)
+
+# ========== CRUD для WeatherData ==========
+@app.post("/weather-data/", response_model=WeatherDataResponse, status_code=201)
+async def create_weather_data(data: WeatherDataCreate):
+    return await write_executor.run(_create_weather_data, data)
+
+def _create_weather_data(data: WeatherDataCreate) -> WeatherDataResponse:
+    with DBContext():
+        try:
+            sensor = metadata.get_sensor(data.sensor_id)
+            error = check_value_range(sensor.sensor_type, data.value)
+            if error:
+                raise HTTPException(status_code=400, detail=error)
+            row = reading_row(data)
+            ids = insert_readings([row])
+            readings_committed([(sensor, row)], ids)
+            return WeatherDataResponse(id=ids[0], **{**data.model_dump(), 'timestamp': row['timestamp']})
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Датчик не найден")
+
+@app.post("/weather-data/batch", response_model=WeatherDataBatchResponse)
+async def create_weather_data_batch(batch: WeatherDataBatchCreate):
+    return await write_executor.run(_create_weather_data_batch, batch)
+
+def validate_batch(batch: WeatherDataBatchCreate):
+    """Проверка пакета: результаты по каждому показанию и принятые пары (результат, (датчик, строка))"""
+    sensors = metadata.get_sensors(reading.sensor_id for reading in batch.readings)
+    results = []
+    accepted = []
+    for index, reading in enumerate(batch.readings):
+        sensor = sensors.get(reading.sensor_id)
+        error = "Датчик не найден" if sensor is None else check_value_range(sensor.sensor_type, reading.value)
+        if error:
+            results.append(WeatherDataBatchItemResult(index=index, accepted=False, error=error))
+            continue
+        item = WeatherDataBatchItemResult(index=index, accepted=True)
+        results.append(item)
+        accepted.append((item, (sensor, reading_row(reading))))
+    return results, accepted
+
+def _create_weather_data_batch(batch: WeatherDataBatchCreate) -> WeatherDataBatchResponse:
+    with DBContext():
+        results, accepted = validate_batch(batch)
+        readings = [reading for _, reading in accepted]
+        ids = insert_readings([row for _, row in readings])
+        readings_committed(readings, ids)
+        for (item, _), data_id in zip(accepted, ids):
+            item.id = data_id
+        return WeatherDataBatchResponse(
+            accepted=len(accepted),
+            rejected=len(results) - len(accepted),
+            results=results
+        )
+
+@app.post(
+    "/weather-data/frame",
+    response_model=WeatherDataFrameResponse,
+    openapi_extra={"requestBody": {"content": {FRAME_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}}}}}
+)
+async def create_weather_data_frame(request: Request):
+    body = await request.body()
+    return await write_executor.run(_create_weather_data_frame, body)
+
+def _create_weather_data_frame(body: bytes) -> WeatherDataFrameResponse:
+    # Кадр проверяется без pydantic: записи уже распакованы в кортежи чисел
+    try:
+        station_code, sensor_codes, records = decode_frame(body)
+    except FrameError as e:
+        raise HTTPException(status_code=400, detail=f"Некорректный кадр: {e}")
+    with DBContext():
+        try:
+            station = metadata.get_station_by_code(station_code)
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Метеостанция не найдена")
+        sensors = metadata.get_sensors_by_code(station.id, sensor_codes)
+        by_index = [sensors.get(sensor_code) for sensor_code in sensor_codes]
+        errors = []
+        readings = []
+        for index, (sensor_index, timestamp, value, quality) in enumerate(records):
+            sensor = by_index[sensor_index] if sensor_index < len(by_index) else None
+            if sensor is None:
+                error = "Датчик не найден"
+            elif quality > 100 or value != value:
+                error = "Некорректное значение или качество"
+            else:
+                error = check_value_range(sensor.sensor_type, value)
+            if error is None:
+                try:
+                    row = {'sensor': sensor.id, 'timestamp': from_epoch_ms(timestamp),
+                           'value': value, 'quality': quality, 'raw_data': None}
+                except OverflowError:
+                    error = "Некорректная метка времени"
+            if error:
+                errors.append(WeatherDataBatchItemResult(index=index, accepted=False, error=error))
+                continue
+            readings.append((sensor, row))
+        ids = insert_readings([row for _, row in readings])
+        readings_committed(readings, ids)
+        return WeatherDataFrameResponse(
+            accepted=len(readings),
+            rejected=len(errors),
+            first_id=ids[0] if ids else None,
+            errors=errors
+        )
+
+@app.post("/weather-data/buffered", response_model=WeatherDataBufferedResponse, status_code=202)
+async def create_weather_data_buffered(batch: WeatherDataBatchCreate):
+    return await write_executor.run(_create_weather_data_buffered, batch)
+
+def _create_weather_data_buffered(batch: WeatherDataBatchCreate) -> WeatherDataBufferedResponse:
+    # Показания проверяются сразу, а записываются потоком буфера группой с другими запросами;
+    # id становятся известны после записи, поэтому в ответе только номер пакета
+    with DBContext():
+        results, accepted = validate_batch(batch)
+    sequence = None
+    if accepted:
+        sequence = ingest_buffer.submit([reading for _, reading in accepted])
+        if sequence is None:
+            raise HTTPException(status_code=503, detail="Буфер приема переполнен, повторите позже")
+    return WeatherDataBufferedResponse(
+        accepted=len(accepted),
+        rejected=len(results) - len(accepted),
+        results=results,
+        sequence=sequence,
+        durable_sequence=ingest_buffer.durable_sequence,
+        flush_deadline=ingest_buffer.flush_deadline()
+    )
+
+@app.get("/weather-data/buffered/{sequence}", response_model=WeatherDataIngestStatus)
+def read_ingest_status(sequence: int):
+    return ingest_buffer.status(sequence)
+
+@app.get("/weather-data/export")
+async def export_weather_data(
+    sensor_ids: Optional[str] = Query(None, description="Идентификаторы датчиков через запятую"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    include_raw: bool = Query(True, description="Выгружать сырые данные")
+):
+    ids = parse_ids(sensor_ids, "Некорректный список датчиков")
+    start, end = utc_bounds(start, end)
+    pages = iter_reading_pages(ids, start, end, EXPORT_PAGE_SIZE, include_raw)
+    # Каждая страница читается и кодируется в пуле чтения, пул потоков FastAPI не занимается
+    return StreamingResponse(
+        read_executor.iterate(FORMATTERS[format](pages)),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="weather_data.{format}"'}
+    )
+
+@app.get("/weather-data/latest", response_model=List[WeatherDataWithSensor])
+async def get_latest_weather_data(
+    station_id: Optional[int] = None,
+    location_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    include_raw: bool = Query(False, description="Включить сырые данные"),
+    fields: Optional[str] = Query(None, description="Поля ответа через запятую")
+):
+    return await read_executor.run(_get_latest_weather_data, station_id, location_id, limit, include_raw, fields)
+
+def _get_latest_weather_data(station_id, location_id, limit, include_raw, fields) -> Response:
+    with DBContext():
+        names = response_fields(fields, WeatherDataWithSensor)
+        stored = [name for name in names if include_raw or name != 'raw_data']
+        data_names, columns = select_columns(SensorLatest, stored, {'id': SensorLatest.data_id})
+        nested = 'sensor' in names
+        if nested:
+            sensor_names, sensor_columns = select_columns(Sensor, SensorWithData.model_fields)
+            type_names, type_columns = select_columns(SensorType, SensorTypeResponse.model_fields)
+            columns += sensor_columns + type_columns
+            sensor_defaults = schema_defaults(SensorWithData, [
+                name for name in SensorWithData.model_fields if name not in sensor_names and name != 'sensor_type'])
+        # Последнее показание каждого датчика, а не последние строки всей таблицы
+        query = SensorLatest.select(*columns).join(Sensor)
+        if nested:
+            query = query.join(SensorType)
+        if station_id:
+            query = query.where(Sensor.station == station_id)
+        elif location_id:
+            query = (query
+                     .switch(Sensor)
+                     .join(WeatherStation)
+                     .where(WeatherStation.location == location_id))
+        defaults = schema_defaults(WeatherDataWithSensor, [
+            name for name in names if name not in data_names and name != 'sensor'])
+        # Колонки показания, датчика и типа идут в кортеже подряд
+        width = len(data_names)
+        type_start = width + len(sensor_names) if nested else width
+        result = []
+        for values in query.order_by(SensorLatest.timestamp.desc()).limit(limit).tuples().iterator():
+            row = dict(zip(data_names, values[:width]), **defaults)
+            if nested:
+                sensor = dict(zip(sensor_names, values[width:type_start]), **sensor_defaults)
+                sensor['sensor_type'] = dict(zip(type_names, values[type_start:]))
+                row['sensor'] = sensor
+            result.append(row)
+        return json_response(result, names)
+
+@app.put("/weather-data/{weather_data_id}", response_model=WeatherDataResponse)
+def update_weather_data(weather_data_id: int, data: WeatherDataCreate):
+    with DBContext():
+        try:
+            data_db = get_reading(weather_data_id)
+            sensor = metadata.get_sensor(data.sensor_id)
+            error = check_value_range(sensor.sensor_type, data.value)
+            if error:
+                raise HTTPException(status_code=400, detail=error)
+            previous = (data_db.sensor_id, data_db.timestamp, data_db.value)
+            values = {**data.model_dump(), 'timestamp': naive_utc(data.timestamp)}
+            ensure_partitions([values['timestamp']])
+            with database.atomic():
+                for key, value in values.items():
+                    setattr(data_db, key, value)
+                data_db = save_reading(data_db)
+                rollups.replace_reading(previous, (data_db.sensor_id, data_db.timestamp, data_db.value))
+                refresh_latest([previous[0], data_db.sensor_id])
+            invalidate_sensor_stations([previous[0], data_db.sensor_id])
+            return WeatherDataResponse.model_validate(data_db.to_dict())
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Данные не найдены")
+
+@app.delete("/weather-data/{weather_data_id}")
+def delete_weather_data(weather_data_id: int):
+    with DBContext():
+        try:
+            data = get_reading(weather_data_id)
+            with database.atomic():
+                delete_reading(data)
+                rollups.replace_reading((data.sensor_id, data.timestamp, data.value), None)
+                refresh_latest([data.sensor_id])
+            invalidate_sensor_stations([data.sensor_id])
+            return {"message": "Данные успешно удалены"}
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Данные не найдены")
+
+# ========== CRUD для WeatherAlert ==========
+@app.post("/alerts/", response_model=WeatherAlertResponse, status_code=201)
+def create_weather_alert(alert: WeatherAlertCreate):
+    with DBContext():
+        try:
+            metadata.get_location(alert.location_id)
+            alert_db = WeatherAlert.create(**alert_row(alert))
+            active_alerts.put(alert_db)
+            responses.invalidate('location', alert_db.location_id)
+            result = WeatherAlertResponse.model_validate(alert_db.to_dict())
+            hub.publish('alert', result, location_id=alert_db.location_id)
+            return result
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Местоположение не найдено")
+
+@app.get("/alerts/", response_model=List[WeatherAlertWithLocation])
+def read_alerts(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    active_only: bool = True,
+    location_id: Optional[int] = None,
+    severity: Optional[str] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description="Поля ответа через запятую")
+):
+    start_time, end_time = utc_bounds(start_time, end_time)
+    with DBContext():
+        names = response_fields(fields, WeatherAlertWithLocation)
+        alert_names, columns = select_columns(WeatherAlert, names + ['issued_at', 'id'])
+        nested = 'location' in names
+        if nested:
+            location_names, location_columns = select_columns(Location, LocationResponse.model_fields)
+            query = WeatherAlert.select(*columns, *location_columns).join(Location)
+        else:
+            query = WeatherAlert.select(*columns)
+        if cursor:
+            # Порядок списка — от новых к старым по (issued_at, id)
+            issued_at, alert_id = decode_cursor(cursor, datetime, int)
+            query = query.where(Tuple(WeatherAlert.issued_at, WeatherAlert.id) < Tuple(issued_at, alert_id))
+        if active_only:
+            query = query.where(WeatherAlert.is_active == True)
+        if location_id:
+            query = query.where(WeatherAlert.location == location_id)
+        if severity:
+            query = query.where(WeatherAlert.severity == severity)
+        if start_time:
+            query = query.where(WeatherAlert.start_time >= start_time)
+        if end_time:
+            query = query.where(WeatherAlert.end_time <= end_time)
+        query = (query
+                 .order_by(WeatherAlert.issued_at.desc(), WeatherAlert.id.desc())
+                 .offset(skip)
+                 .limit(limit))
+        width = len(alert_names)
+        alerts = []
+        for values in query.tuples().iterator():
+            alert = dict(zip(alert_names, values[:width]))
+            if nested:
+                alert['location'] = dict(zip(location_names, values[width:]))
+            alerts.append(alert)
+        result = json_response(alerts, names)
+        set_next_cursor(result, alerts, limit, lambda alert: (alert['issued_at'], alert['id']))
+        return result
+
+@app.get("/alerts/active", response_model=List[WeatherAlertWithLocation])
+def get_active_alerts(
+    fields: Optional[str] = Query(None, description="Поля ответа через запятую")
+):
+    # Предупреждения берутся из индекса в памяти, местоположения — из кэша метаданных
+    with DBContext():
+        names = response_fields(fields, WeatherAlertWithLocation)
+        result = []
+        for alert in active_alerts.active():
+            try:
+                location = metadata.get_location(alert['location_id'])
+            except DoesNotExist:
+                continue
+            result.append({**alert, 'location': location.to_dict()})
+        return json_response(result, names)
+
+@app.get("/alerts/{alert_id}", response_model=WeatherAlertWithLocation)
+def read_alert(alert_id: int):
+    with DBContext():
+        try:
+            alert = WeatherAlert.get(WeatherAlert.id == alert_id)
+            return WeatherAlertWithLocation.model_validate(
+                {**alert.to_dict(), 'location': alert.location.to_dict()}
+            )
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Предупреждение не найдено")
+
+@app.put("/alerts/{alert_id}", response_model=WeatherAlertResponse)
+def update_weather_alert(alert_id: int, alert: WeatherAlertCreate):
+    with DBContext():
+        try:
+            alert_db = WeatherAlert.get(WeatherAlert.id == alert_id)
+            metadata.get_location(alert.location_id)
+            previous_location_id = alert_db.location_id
+            for key, value in alert_row(alert).items():
+                setattr(alert_db, key, value)
+            alert_db.save()
+            active_alerts.put(alert_db)
+            responses.invalidate('location', previous_location_id, alert_db.location_id)
+            return WeatherAlertResponse.model_validate(alert_db.to_dict())
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Предупреждение не найдено")
+
+@app.delete("/alerts/{alert_id}")
+def delete_weather_alert(alert_id: int):
+    with DBContext():
+        try:
+            alert = WeatherAlert.get(WeatherAlert.id == alert_id)
+            alert.delete_instance()
+            active_alerts.remove(alert_id)
+            responses.invalidate('location', alert.location_id)
+            return {"message": "Предупреждение успешно удалено"}
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Предупреждение не найдено")
+
+# ========== Поиск ==========
+@app.get("/search", response_model=List[SearchResult])
+def search_catalog(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: Optional[str] = Query(None, pattern="^(location|station)$"),
+    limit: int = Query(50, ge=1, le=500)
+):
+    with DBContext():
+        found = search.search(q, type, limit)
+        location_ids = [entity_id for entity_type, entity_id, _ in found if entity_type == 'location']
+        station_ids = [entity_id for entity_type, entity_id, _ in found if entity_type == 'station']
+        locations = {location.id: location for location in Location.select().where(Location.id.in_(location_ids))}
+        stations = {station.id: station for station in WeatherStation.select().where(WeatherStation.id.in_(station_ids))}
+        result = []
+        for entity_type, entity_id, rank in found:
+            item = SearchResult(entity_type=entity_type, entity_id=entity_id, rank=rank)
+            if entity_type == 'location' and entity_id in locations:
+                item.location = LocationResponse.model_validate(locations[entity_id].to_dict())
+            elif entity_type == 'station' and entity_id in stations:
+                item.station = WeatherStationResponse.model_validate(stations[entity_id].to_dict())
+            else:
+                continue
+            result.append(item)
+        return result
+
+# ========== Подписка на события ==========
+@app.get("/stream", responses={200: {"content": {"text/event-stream": {}}}})
+async def stream_events(
+    station_ids: Optional[str] = Query(None, description="Идентификаторы станций через запятую"),
+    location_ids: Optional[str] = Query(None, description="Идентификаторы местоположений через запятую"),
+    sensor_type_ids: Optional[str] = Query(None, description="Идентификаторы типов датчиков через запятую"),
+    events: str = Query(",".join(EVENT_TYPES), pattern="^(reading|alert)(,(reading|alert))*$")
+):
+    stations = parse_ids(station_ids, "Некорректный список станций")
+    locations = parse_ids(location_ids, "Некорректный список местоположений")
+    sensor_types = parse_ids(sensor_type_ids, "Некорректный список типов датчиков")
+    # Предупреждения относятся к местоположениям: фильтр по станциям переводится в их местоположения
+    alert_locations = set(locations) if locations else None
+    if stations:
+        try:
+            station_locations = await read_executor.run(
+                lambda: {metadata.get_station(station_id).location_id for station_id in stations})
+        except DoesNotExist:
+            raise HTTPException(status_code=404, detail="Метеостанция не найдена")
+        alert_locations = station_locations if alert_locations is None else alert_locations & station_locations
+    return StreamingResponse(
+        hub.stream(
+            events=set(events.split(',')),
+            station_ids=set(stations) if stations else None,
+            location_ids=set(locations) if locations else None,
+            sensor_type_ids=set(sensor_types) if sensor_types else None,
+            alert_location_ids=alert_locations
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ========== Служебные эндпоинты ==========
+@app.get("/metrics")
+def read_metrics():
+    return {
+        "database": database.metrics(),
+        "executors": {
+            "read": read_executor.metrics(),
+            "write": write_executor.metrics(),
+        },
+        "anomaly_queue": worker.metrics(),
+        "metadata_cache": metadata.metrics(),
+        "response_cache": responses.metrics(),
+        "retention": retention_job.metrics(),
+        "active_alerts": active_alerts.metrics(),
+        "live": hub.metrics(),
+        "ingest_buffer": ingest_buffer.metrics(),
+    }
+
+@app.post("/retention/run", status_code=202)
+def run_retention():
+    if retention_job.retention_days <= 0:
+        raise HTTPException(status_code=400, detail="Очистка отключена (RAW_RETENTION_DAYS = 0)")
+    retention_job.trigger()
+    return {"message": "Очистка запущена", "cutoff": retention_job.cutoff()}
+
+@app.get("/partitions")
+def read_partitions():
+    with DBContext():
+        partitions.registry.reset()
+        return [
+            {"month": f"{model.month:%Y%m}", "table": model._meta.table_name, "rows": model.select().count()}
+            for model in partitions.registry.models()
+        ]
+
+@app.delete("/partitions/{month}")
+def delete_partition(month: str = Path(..., pattern=r"^\d{6}$")):
+    try:
+        month_date = date(int(month[:4]), int(month[4:]), 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный месяц")
+    with DBContext():
+        partitions.registry.reset()
+        if month_date not in partitions.registry.months():
+            raise HTTPException(status_code=404, detail="Секция не найдена")
+        count = drop_partition(month_date)
+        responses.invalidate_all('station')
+        return {"message": "Секция успешно удалена", "rows": count}
+
+if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
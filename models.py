@@ -1,14 +1,137 @@
 from peewee import *
+from playhouse.migrate import SqliteMigrator, migrate
+from playhouse.pool import PooledSqliteDatabase
+from playhouse.sqlite_ext import VirtualModel, FTS5Model, SearchField
 from datetime import datetime
 import json
+import threading
+import zlib
 from typing import Optional, Dict, Any
 
+import config
+
+class ManagedSqliteDatabase(PooledSqliteDatabase):
+    """Пул теплых соединений SQLite с проверкой перед выдачей и счетчиками"""
+    def __init__(self, *args, **kwargs):
+        self._counter_lock = threading.Lock()
+        self.opened = 0
+        self.checkouts = 0
+        self.discarded = 0
+        super().__init__(*args, **kwargs)
+    
+    def _add_conn_hooks(self, conn):
+        # Вызывается только для новых соединений: здесь применяются pragma
+        with self._counter_lock:
+            self.opened += 1
+        super()._add_conn_hooks(conn)
+    
+    def _connect(self):
+        conn = super()._connect()
+        with self._counter_lock:
+            self.checkouts += 1
+        return conn
+    
+    def _is_closed(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+        except Exception:
+            with self._counter_lock:
+                self.discarded += 1
+            return True
+        return False
+    
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            in_use = len(self._in_use)
+            idle = len(self._connections)
+        return {
+            'opened': self.opened,
+            'checkouts': self.checkouts,
+            'reused': self.checkouts - self.opened,
+            'discarded': self.discarded,
+            'in_use': in_use,
+            'idle': idle,
+            'max_connections': self._max_connections,
+        }
+
 # Настройка подключения к базе данных SQLite
-database = SqliteDatabase('weather_stations.db', pragmas={
-    'journal_mode': 'wal',
-    'cache_size': -1024 * 64,
-    'foreign_keys': 1,
-})
+database = ManagedSqliteDatabase(
+    'weather_stations.db',
+    max_connections=config.DB_MAX_CONNECTIONS,
+    stale_timeout=config.DB_STALE_TIMEOUT,
+    timeout=config.DB_POOL_TIMEOUT,
+    check_same_thread=False,
+    pragmas={
+        'journal_mode': 'wal',
+        'cache_size': -1024 * 64,
+        'foreign_keys': 1,
+    }
+)
+
+class JSONField(TextField):
+    """Текстовое поле, хранящее JSON"""
+    def db_value(self, value):
+        if value is None:
+            return None
+        return json.dumps(value, ensure_ascii=False)
+    
+    def python_value(self, value):
+        if value is None:
+            return None
+        return json.loads(value)
+
+# Предустановленный словарь zlib для raw_data: частые ключи и фрагменты JSON логгеров.
+# Словарь участвует в распаковке уже записанных значений, поэтому менять его нельзя —
+# только добавлять новый формат со своим байтом заголовка.
+RAW_DATA_ZDICT = (
+    b'{"raw": , "battery": , "voltage": , "signal_strength": , "signal": , "rssi": , "snr": , "firmware": "'
+    b', "status": "ok", "error": null, "temperature": , "humidity": , "pressure": '
+    b', "samples": [, "serial": "", "channel": , "uptime": , "checksum": "}'
+)
+RAW_DATA_PLAIN = b'\x00'
+RAW_DATA_ZLIB = b'\x01'
+
+def compress_json_text(text: str) -> bytes:
+    """Сжатие JSON-текста: байт формата и данные (несжатые, если сжатие не дает выигрыша)"""
+    encoded = text.encode()
+    compressor = zlib.compressobj(level=6, zdict=RAW_DATA_ZDICT)
+    compressed = compressor.compress(encoded) + compressor.flush()
+    if len(compressed) < len(encoded):
+        return RAW_DATA_ZLIB + compressed
+    return RAW_DATA_PLAIN + encoded
+
+def decompress_json_text(value: bytes) -> str:
+    header, payload = value[:1], value[1:]
+    if header == RAW_DATA_ZLIB:
+        decompressor = zlib.decompressobj(zdict=RAW_DATA_ZDICT)
+        payload = decompressor.decompress(payload) + decompressor.flush()
+    elif header != RAW_DATA_PLAIN:
+        raise ValueError(f"Неизвестный формат сжатых данных: {header!r}")
+    return payload.decode()
+
+class CompressedJSONField(BlobField):
+    """JSON, хранящийся сжатым (zlib с общим словарем ключей) в BLOB.
+
+    Строки, записанные до перехода на сжатие, остаются текстом и читаются как обычный JSON.
+    """
+    def db_value(self, value):
+        if value is None:
+            return None
+        return super().db_value(compress_json_text(json.dumps(value, ensure_ascii=False)))
+    
+    def python_value(self, value):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return json.loads(value)
+        return json.loads(decompress_json_text(bytes(value)))
+
+@database.func('compress_raw_data')
+def compress_raw_data(value):
+    """Функция SQLite для переноса: JSON-текст в формат CompressedJSONField, BLOB без изменений"""
+    if value is None or isinstance(value, bytes):
+        return value
+    return compress_json_text(value)
 
 class BaseModel(Model):
     """Базовая модель с общими полями"""
@@ -20,6 +143,11 @@ class BaseModel(Model):
         self.updated_at = datetime.now()
         return super(BaseModel, self).save(*args, **kwargs)
     
+    def to_dict(self) -> Dict[str, Any]:
+        """Данные записи для схем ответа (внешние ключи как *_id)"""
+        fields = self._meta.fields
+        return {fields[name].column_name: value for name, value in self.__data__.items()}
+    
     class Meta:
         database = database
 
@@ -77,6 +205,8 @@ class SensorType(BaseModel):
     description = TextField(null=True, verbose_name='Описание')
     min_value = FloatField(null=True, verbose_name='Минимальное значение')
     max_value = FloatField(null=True, verbose_name='Максимальное значение')
+    anomaly_window_hours = FloatField(default=168, verbose_name='Окно детектора аномалий (ч)')
+    anomaly_threshold = FloatField(default=3.0, verbose_name='Порог аномалии (σ)')
     
     class Meta:
         table_name = 'sensor_types'
@@ -113,7 +243,11 @@ class Sensor(BaseModel):
         return f"Sensor {self.id}: {self.sensor_code}"
 
 class WeatherData(BaseModel):
-    """Погодные данные"""
+    """Погодные данные.
+
+    Показания хранятся в помесячных секциях weather_data_YYYYMM (см. partitions.py),
+    эта модель задает их схему; таблица weather_data остается только в старых базах до переноса.
+    """
     sensor = ForeignKeyField(
         Sensor,
         backref='weather_data',
@@ -123,7 +257,7 @@ class WeatherData(BaseModel):
     timestamp = DateTimeField(verbose_name='Время измерения', index=True)
     value = FloatField(verbose_name='Значение')
     quality = IntegerField(default=100, verbose_name='Качество данных (0-100)')
-    raw_data = TextField(null=True, verbose_name='Сырые данные')
+    raw_data = CompressedJSONField(null=True, verbose_name='Сырые данные')
     
     class Meta:
         table_name = 'weather_data'
@@ -134,6 +268,23 @@ class WeatherData(BaseModel):
     def __str__(self) -> str:
         return f"WeatherData {self.id}: {self.sensor.sensor_type.name} = {self.value}"
 
+class WeatherDataSequence(Model):
+    """Сквозной счетчик id показаний для всех секций"""
+    name = CharField(primary_key=True)
+    next_id = IntegerField()
+    
+    class Meta:
+        database = database
+        table_name = 'weather_data_sequence'
+
+# Уровни серьезности предупреждений по возрастанию; неизвестный уровень получает ранг 0
+SEVERITY_RANKS = {
+    'НИЗКАЯ': 1,
+    'СРЕДНЯЯ': 2,
+    'ВЫСОКАЯ': 3,
+    'КРИТИЧЕСКАЯ': 4,
+}
+
 class WeatherAlert(BaseModel):
     """Погодные предупреждения"""
     location = ForeignKeyField(
@@ -144,6 +295,7 @@ class WeatherAlert(BaseModel):
     )
     alert_type = CharField(max_length=50, verbose_name='Тип предупреждения')
     severity = CharField(max_length=20, verbose_name='Серьезность')
+    severity_rank = SmallIntegerField(default=0, verbose_name='Ранг серьезности')
     title = CharField(max_length=200, verbose_name='Заголовок')
     description = TextField(verbose_name='Описание')
     start_time = DateTimeField(verbose_name='Время начала')
@@ -159,16 +311,139 @@ class WeatherAlert(BaseModel):
             (('is_active', 'severity'), False),
         )
     
+    def save(self, *args, **kwargs):
+        self.severity_rank = SEVERITY_RANKS.get(self.severity, 0)
+        return super().save(*args, **kwargs)
+    
     def __str__(self) -> str:
         return f"WeatherAlert {self.id}: {self.alert_type} - {self.title}"
 
+class WeatherDataRollup(Model):
+    """Агрегаты погодных данных датчика за интервал времени"""
+    sensor = ForeignKeyField(Sensor, backref='+', on_delete='CASCADE', verbose_name='Датчик')
+    bucket = DateTimeField(verbose_name='Начало интервала')
+    count = IntegerField(verbose_name='Количество измерений')
+    sum_value = FloatField(verbose_name='Сумма значений')
+    min_value = FloatField(verbose_name='Минимальное значение')
+    max_value = FloatField(verbose_name='Максимальное значение')
+    last_value = FloatField(verbose_name='Последнее значение')
+    last_timestamp = DateTimeField(verbose_name='Время последнего измерения')
+    
+    class Meta:
+        database = database
+        primary_key = CompositeKey('sensor', 'bucket')
+
+class WeatherDataMinute(WeatherDataRollup):
+    """Поминутные агрегаты"""
+    class Meta:
+        table_name = 'weather_data_1m'
+
+class WeatherDataHour(WeatherDataRollup):
+    """Почасовые агрегаты"""
+    class Meta:
+        table_name = 'weather_data_1h'
+
+class WeatherDataDay(WeatherDataRollup):
+    """Посуточные агрегаты"""
+    class Meta:
+        table_name = 'weather_data_1d'
+
+class SensorRunningStats(Model):
+    """Контрольная точка скользящей статистики детектора аномалий"""
+    sensor = ForeignKeyField(Sensor, primary_key=True, backref='+', on_delete='CASCADE', verbose_name='Датчик')
+    weight = FloatField(verbose_name='Суммарный вес наблюдений')
+    count = IntegerField(verbose_name='Количество наблюдений')
+    mean = FloatField(verbose_name='Среднее')
+    m2 = FloatField(verbose_name='Взвешенная сумма квадратов отклонений')
+    last_timestamp = DateTimeField(verbose_name='Время последнего наблюдения')
+    
+    class Meta:
+        database = database
+        table_name = 'sensor_running_stats'
+
+class SensorLatest(Model):
+    """Последнее показание датчика (по одной строке на датчик)"""
+    sensor = ForeignKeyField(Sensor, primary_key=True, backref='+', on_delete='CASCADE', verbose_name='Датчик')
+    data_id = IntegerField(verbose_name='ID показания')
+    timestamp = DateTimeField(verbose_name='Время измерения')
+    value = FloatField(verbose_name='Значение')
+    quality = IntegerField(verbose_name='Качество данных (0-100)')
+    raw_data = JSONField(null=True, verbose_name='Сырые данные')
+    
+    class Meta:
+        database = database
+        table_name = 'sensor_latest'
+    
+    def to_dict(self) -> dict:
+        """Словарь в формате показания WeatherData"""
+        return {
+            'id': self.data_id,
+            'sensor_id': self.sensor_id,
+            'timestamp': self.timestamp,
+            'value': self.value,
+            'quality': self.quality,
+            'raw_data': self.raw_data,
+        }
+
+class LocationRTree(VirtualModel):
+    """Пространственный индекс местоположений (SQLite R*Tree)"""
+    id = IntegerField(primary_key=True)
+    min_lat = FloatField()
+    max_lat = FloatField()
+    min_lon = FloatField()
+    max_lon = FloatField()
+    
+    class Meta:
+        database = database
+        table_name = 'location_rtree'
+        extension_module = 'rtree'
+
+class SearchIndex(FTS5Model):
+    """Полнотекстовый индекс местоположений и станций (SQLite FTS5)"""
+    entity_type = SearchField(unindexed=True)
+    entity_id = SearchField(unindexed=True)
+    name = SearchField()
+    code = SearchField()
+    place = SearchField()
+    details = SearchField()
+    
+    class Meta:
+        database = database
+        table_name = 'search_index'
+        options = {'tokenize': 'unicode61 remove_diacritics 2', 'prefix': '2 3'}
+
+def add_missing_columns(tables):
+    """Добавление в существующие таблицы колонок, появившихся в моделях"""
+    migrator = SqliteMigrator(database)
+    operations = []
+    for model in tables:
+        existing = {column.name for column in database.get_columns(model._meta.table_name)}
+        for field in model._meta.sorted_fields:
+            if field.column_name not in existing:
+                operations.append(migrator.add_column(model._meta.table_name, field.column_name, field))
+    if operations:
+        # Добавление NOT NULL колонки пересоздает таблицу; пока идет перенос, внешние ключи
+        # отключаются, иначе удаление старой таблицы нарушает ссылки на нее
+        database.pragma('foreign_keys', 0)
+        try:
+            migrate(*operations)
+        finally:
+            database.pragma('foreign_keys', 1)
+        print(f"✅ Добавлено колонок: {len(operations)}")
+
 def create_tables():
     """Создание таблиц в базе данных"""
-    tables = [Location, WeatherStation, SensorType, Sensor, WeatherData, WeatherAlert]
+    tables = [
+        Location, WeatherStation, SensorType, Sensor, WeatherDataSequence, WeatherAlert,
+        WeatherDataMinute, WeatherDataHour, WeatherDataDay, SensorRunningStats, SensorLatest,
+    ]
     
     try:
         database.connect()
         database.create_tables(tables, safe=True)
+        add_missing_columns(tables)
+        LocationRTree.create_table(safe=True)
+        SearchIndex.create_table(safe=True)
         print("✅ Таблицы успешно созданы")
     except Exception as e:
         print(f"❌ Ошибка при создании таблиц: {e}")
@@ -241,16 +516,19 @@ def initialize_database():
                 is_active=True
             )
         
-        # Создаем тестовые погодные данные
+        # Создаем тестовые погодные данные (через слой хранения: секции, агрегаты, последние значения)
+        from storage import insert_readings
         temp_sensor = Sensor.get(Sensor.sensor_code == "TEMP-001")
-        for i in range(24):
-            WeatherData.create(
-                sensor=temp_sensor,
-                timestamp=datetime.now() - timedelta(hours=i),
-                value=15 + i * 0.5,
-                quality=95,
-                raw_data=json.dumps({"raw": 15 + i * 0.5, "battery": 98})
-            )
+        insert_readings([
+            {
+                'sensor': temp_sensor.id,
+                'timestamp': datetime.now() - timedelta(hours=i),
+                'value': 15 + i * 0.5,
+                'quality': 95,
+                'raw_data': {"raw": 15 + i * 0.5, "battery": 98},
+            }
+            for i in range(24)
+        ])
         
         # Создаем тестовое предупреждение
         WeatherAlert.create(
@@ -272,13 +550,14 @@ def initialize_database():
 
 # Контекстный менеджер для работы с БД
 class DBContext:
-    """Контекстный менеджер для работы с базой данных"""
+    """Контекстный менеджер для работы с базой данных (соединение берется из пула и возвращается в него)"""
     def __enter__(self):
-        database.connect()
+        # Вложенный контекст использует уже открытое соединение потока
+        self._opened = database.connect(reuse_if_open=True)
         return database
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if not database.is_closed():
+        if self._opened and not database.is_closed():
             database.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,35 @@
+"""Курсорная (keyset) пагинация списков"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Sequence
+
+from fastapi import HTTPException, Response
+
+# Заголовок ответа с курсором следующей страницы
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+def encode_cursor(*values: Any) -> str:
+    """Непрозрачный курсор из значений ключа последней строки страницы"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str, *types: type) -> tuple:
+    """Разбор курсора в значения указанных типов (int или datetime)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != len(types):
+            raise ValueError(cursor)
+        return tuple(
+            datetime.fromisoformat(value) if kind is datetime else kind(value)
+            for kind, value in zip(types, payload)
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+def set_next_cursor(response: Response, rows: Sequence[Any], limit: int, key: Callable[[Any], tuple]):
+    """Курсор в заголовке ответа, если страница заполнена целиком"""
+    if rows and len(rows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*key(rows[-1]))
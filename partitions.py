@@ -0,0 +1,205 @@
+"""Помесячные секции погодных данных (weather_data_YYYYMM)"""
+import re
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional, Type
+
+from peewee import ForeignKeyField, Table, fn
+from models import database, Sensor, WeatherData, WeatherDataSequence
+
+PARTITION_TABLE = re.compile(r'^weather_data_(\d{4})(\d{2})$')
+SEQUENCE_NAME = 'weather_data'
+
+def month_of(timestamp: datetime) -> date:
+    """Месяц (первое число), к секции которого относится метка времени"""
+    return date(timestamp.year, timestamp.month, 1)
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def month_start(month: date) -> datetime:
+    return datetime(month.year, month.month, 1)
+
+def partition_table(month: date) -> str:
+    return f'weather_data_{month:%Y%m}'
+
+class PartitionRegistry:
+    """Список существующих секций и модели Peewee для них.
+
+    Таблицы секций имеют схему WeatherData; внешний ключ на датчик каскадно удаляет показания.
+    Список секций читается из sqlite_master один раз и далее ведется в памяти.
+    """
+    def __init__(self):
+        self._models: Dict[date, Type[WeatherData]] = {}
+        self._months: Optional[List[date]] = None
+        self._lock = threading.Lock()
+
+    def model(self, month: date) -> Type[WeatherData]:
+        with self._lock:
+            model = self._models.get(month)
+            if model is None:
+                class Meta:
+                    table_name = partition_table(month)
+                model = type(f'WeatherData{month:%Y%m}', (WeatherData,), {
+                    '__module__': __name__,
+                    '__doc__': f'Погодные данные за {month:%m.%Y}',
+                    # Индекс (sensor, timestamp) покрывает и поиск по датчику, отдельный индекс по FK не нужен
+                    'sensor': ForeignKeyField(Sensor, backref='+', on_delete='CASCADE', index=False, verbose_name='Датчик'),
+                    'Meta': Meta,
+                    'month': month,
+                })
+                self._models[month] = model
+            return model
+
+    def months(self) -> List[date]:
+        """Месяцы существующих секций по возрастанию"""
+        with self._lock:
+            if self._months is None:
+                months = []
+                for name in database.get_tables():
+                    match = PARTITION_TABLE.match(name)
+                    if match:
+                        months.append(date(int(match.group(1)), int(match.group(2)), 1))
+                self._months = sorted(months)
+            return list(self._months)
+
+    def models(
+        self,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        newest_first: bool = False
+    ) -> List[Type[WeatherData]]:
+        """Модели секций, пересекающихся с интервалом [start_time, end_time]"""
+        months = [
+            month for month in self.months()
+            if (start_time is None or month >= month_of(start_time)) and
+               (end_time is None or month <= month_of(end_time))
+        ]
+        if newest_first:
+            months.reverse()
+        return [self.model(month) for month in months]
+
+    def ensure(self, month: date) -> Type[WeatherData]:
+        """Модель секции с созданием таблицы при первом обращении.
+
+        Таблица создается собственной транзакцией до транзакции записи: откат записи
+        отменил бы и CREATE TABLE, а месяц уже остался бы в списке секций.
+        """
+        model = self.model(month)
+        if month not in self.months():
+            if database.in_transaction():
+                raise RuntimeError(f"Секция {partition_table(month)} должна создаваться вне транзакции записи")
+            with database.atomic():
+                model.create_table(safe=True)
+            with self._lock:
+                # После reset список перечитается из базы уже вместе с новой таблицей
+                if self._months is not None and month not in self._months:
+                    self._months = sorted(self._months + [month])
+        return model
+
+    def drop(self, month: date) -> int:
+        """Удаление секции целиком, возвращает количество удаленных показаний"""
+        if month not in self.months():
+            return 0
+        model = self.model(month)
+        count = model.select().count()
+        model.drop_table(safe=True)
+        with self._lock:
+            if self._months is not None:
+                self._months = [existing for existing in self._months if existing != month]
+        return count
+
+    def reset(self):
+        """Перечитать список секций из базы при следующем обращении (секции могли создать или удалить другие процессы)"""
+        with self._lock:
+            self._months = None
+
+    def find(self, data_id: int) -> Optional[WeatherData]:
+        """Показание по id: поиск по первичному ключу в секциях от новых к старым"""
+        for model in self.models(newest_first=True):
+            data = model.get_or_none(model.id == data_id)
+            if data is not None:
+                return data
+        return None
+
+registry = PartitionRegistry()
+
+def allocate_ids(count: int) -> int:
+    """Резервирование count подряд идущих id (внутри транзакции вставки), возвращает первый"""
+    WeatherDataSequence.insert(name=SEQUENCE_NAME, next_id=1).on_conflict_ignore().execute()
+    cursor = (WeatherDataSequence
+              .update(next_id=WeatherDataSequence.next_id + count)
+              .where(WeatherDataSequence.name == SEQUENCE_NAME)
+              .returning(WeatherDataSequence.next_id)
+              .tuples()
+              .execute())
+    next_id, = cursor[0]
+    return next_id - count
+
+def _copy_columns(fields, column):
+    # Текст JSON сжимается функцией SQLite при копировании, без разбора в Python
+    return [fn.compress_raw_data(column(field)) if field.name == 'raw_data' else column(field)
+            for field in fields]
+
+def migrate_legacy():
+    """Перенос показаний из общей таблицы weather_data в помесячные секции"""
+    if WeatherData._meta.table_name not in database.get_tables():
+        return
+    fields = WeatherData._meta.sorted_fields
+    months = sorted({
+        month_of(timestamp) for timestamp, in
+        WeatherData.select(WeatherData.timestamp).distinct().tuples().iterator()
+    })
+    for month in months:
+        registry.ensure(month)
+    with database.atomic():
+        total = WeatherData.select().count()
+        for month in months:
+            model = registry.model(month)
+            (model
+             .insert_from(
+                 WeatherData.select(*_copy_columns(fields, lambda field: field)).where(
+                     (WeatherData.timestamp >= month_start(month)) &
+                     (WeatherData.timestamp < month_start(next_month(month)))),
+                 [model._meta.fields[field.name] for field in fields])
+             .execute())
+        max_id = WeatherData.select(WeatherData.id).order_by(WeatherData.id.desc()).scalar() or 0
+        WeatherDataSequence.insert(name=SEQUENCE_NAME, next_id=max_id + 1).on_conflict(
+            conflict_target=[WeatherDataSequence.name],
+            update={WeatherDataSequence.next_id: fn.MAX(WeatherDataSequence.next_id, max_id + 1)}
+        ).execute()
+        WeatherData.drop_table()
+    print(f"✅ Погодные данные перенесены в секции ({total} показаний, {len(months)} секций)")
+
+def migrate_raw_data():
+    """Перевод секций с текстовой колонкой raw_data на сжатое хранение.
+
+    Секция пересоздается со схемой модели и заполняется копией строк, где raw_data сжимается
+    функцией SQLite; новая таблица плотнее старой, а тип колонки отмечает, что перенос выполнен.
+    """
+    migrated = []
+    for month in registry.months():
+        model = registry.model(month)
+        table_name = model._meta.table_name
+        types = {column.name: column.data_type.upper() for column in database.get_columns(table_name)}
+        if types['raw_data'] != 'TEXT':
+            continue
+        old_name = f'{table_name}_old'
+        fields = model._meta.sorted_fields
+        with database.atomic():
+            database.execute_sql(f'ALTER TABLE "{table_name}" RENAME TO "{old_name}"')
+            # Индексы переезжают вместе с таблицей, их имена нужны новой секции
+            for index in database.get_indexes(old_name):
+                if not index.name.startswith('sqlite_'):
+                    database.execute_sql(f'DROP INDEX "{index.name}"')
+            model.create_table(safe=False)
+            old = Table(old_name).bind(database)
+            (model
+             .insert_from(
+                 old.select(*_copy_columns(fields, lambda field: getattr(old.c, field.column_name))),
+                 fields)
+             .execute())
+            database.execute_sql(f'DROP TABLE "{old_name}"')
+        migrated.append(table_name)
+    if migrated:
+        print(f"✅ Сырые данные сжаты в секциях: {', '.join(migrated)}")
@@ -0,0 +1,188 @@
+"""Очистка устаревших сырых показаний: сначала проверка агрегатов, затем удаление порциями"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from peewee import fn
+import config
+import rollups
+from models import database, DBContext, SensorLatest, WeatherDataDay
+from partitions import registry, month_start, next_month
+from storage import drop_partition, refresh_latest
+from cache import responses
+
+class RetentionJob:
+    """Фоновый поток, удаляющий сырые показания старше RAW_RETENTION_DAYS суток.
+
+    Перед удалением суточные агрегаты сверяются с сырыми данными и, если учитывают
+    не все показания, пересобираются. Секции, целиком попавшие за границу, удаляются DROP TABLE,
+    в пограничной секции строки удаляются короткими транзакциями с контрольной точкой WAL
+    между ними, чтобы не держать блокировку записи и не раздувать журнал.
+    """
+    def __init__(self, retention_days: int, interval: float, chunk_size: int, chunk_pause: float):
+        self.retention_days = retention_days
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self._thread = None
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()
+        self.runs = 0
+        self.failed = 0
+        self.deleted_rows = 0
+        self.dropped_partitions = 0
+        self.rebuilt_days = 0
+        self.chunks = 0
+        self.last_cutoff: Optional[datetime] = None
+        self.last_started: Optional[datetime] = None
+        self.last_duration = 0.0
+        self.last_deleted = 0
+        self.last_error: Optional[str] = None
+        self.in_progress = False
+
+    def cutoff(self, now: Optional[datetime] = None) -> datetime:
+        """Граница хранения, выровненная по суткам (агрегаты пересобираются целыми сутками)"""
+        return rollups.truncate((now or datetime.now()) - timedelta(days=self.retention_days), '1d')
+
+    def start(self):
+        if self._thread is not None or self.retention_days <= 0:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='retention', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+
+    def trigger(self):
+        """Внеочередной запуск очистки"""
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.failed += 1
+                self.last_error = str(e)
+                print(f"Ошибка при очистке данных: {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def run_once(self, now: Optional[datetime] = None) -> int:
+        """Один проход очистки, возвращает количество удаленных показаний"""
+        cutoff = self.cutoff(now)
+        started = time.monotonic()
+        self.in_progress = True
+        self.last_started = datetime.now()
+        self.last_cutoff = cutoff
+        deleted = 0
+        try:
+            with DBContext():
+                for model in registry.models(end_time=cutoff - timedelta(microseconds=1)):
+                    if self._stopping.is_set():
+                        break
+                    self._ensure_rollups(model, cutoff)
+                    if month_start(next_month(model.month)) <= cutoff:
+                        deleted += drop_partition(model.month)
+                        self.dropped_partitions += 1
+                    else:
+                        deleted += self._delete_chunks(model, cutoff)
+        finally:
+            if deleted:
+                # Статистика станций в кэшированных ответах учитывала удаленные показания
+                responses.invalidate_all('station')
+            self.in_progress = False
+            self.runs += 1
+            self.deleted_rows += deleted
+            self.last_deleted = deleted
+            self.last_duration = time.monotonic() - started
+        return deleted
+
+    def _ensure_rollups(self, model, cutoff: datetime):
+        """Сверка суточных агрегатов с сырыми данными секции до границы, пересборка неполных суток датчика.
+
+        Пересобираются только сутки, где агрегаты учитывают меньше показаний, чем осталось сырых
+        (агрегатов нет или их собрали до появления части данных). Если сырых меньше, часть суток
+        уже удалена прерванной очисткой: пересборка из остатка уменьшила бы хранимые навсегда агрегаты.
+        """
+        start = month_start(model.month)
+        end = min(month_start(next_month(model.month)), cutoff)
+        day = fn.date(model.timestamp)
+        raw = {
+            (sensor_id, day_value): count for sensor_id, day_value, count in model
+            .select(model.sensor, day.coerce(False), fn.COUNT(model.id))
+            .where((model.timestamp >= start) & (model.timestamp < end))
+            .group_by(model.sensor, day)
+            .tuples()
+        }
+        aggregated = {
+            (sensor_id, bucket.date().isoformat()): count for sensor_id, bucket, count in WeatherDataDay
+            .select(WeatherDataDay.sensor, WeatherDataDay.bucket, WeatherDataDay.count)
+            .where((WeatherDataDay.bucket >= start) & (WeatherDataDay.bucket < end))
+            .tuples()
+        }
+        for (sensor_id, day_value), count in raw.items():
+            if aggregated.get((sensor_id, day_value), 0) < count:
+                day_start = datetime.fromisoformat(day_value)
+                rollups.rebuild(sensor_id, day_start, day_start)
+                self.rebuilt_days += 1
+
+    def _delete_chunks(self, model, cutoff: datetime) -> int:
+        deleted = 0
+        while not self._stopping.is_set():
+            with database.atomic():
+                batch = (model
+                         .select(model.id)
+                         .where(model.timestamp < cutoff)
+                         .limit(self.chunk_size))
+                count = model.delete().where(model.id.in_(batch)).execute()
+            deleted += count
+            self.chunks += 1
+            if count < self.chunk_size:
+                break
+            database.execute_sql('PRAGMA wal_checkpoint(PASSIVE)')
+            time.sleep(self.chunk_pause)
+        # Датчики, у которых не осталось показаний новее границы
+        stale = [
+            sensor_id for sensor_id, in SensorLatest
+            .select(SensorLatest.sensor)
+            .where(SensorLatest.timestamp < cutoff)
+            .tuples()
+        ]
+        if stale:
+            # Пересчет читает секции до записи: блокировка берется сразу, как в drop_partition
+            with database.atomic('IMMEDIATE'):
+                refresh_latest(stale)
+        database.execute_sql('PRAGMA wal_checkpoint(PASSIVE)')
+        return deleted
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'retention_days': self.retention_days,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'in_progress': self.in_progress,
+            'runs': self.runs,
+            'failed': self.failed,
+            'deleted_rows': self.deleted_rows,
+            'dropped_partitions': self.dropped_partitions,
+            'rebuilt_days': self.rebuilt_days,
+            'chunks': self.chunks,
+            'last_cutoff': self.last_cutoff.isoformat() if self.last_cutoff else None,
+            'last_started': self.last_started.isoformat() if self.last_started else None,
+            'last_duration_seconds': round(self.last_duration, 3),
+            'last_deleted': self.last_deleted,
+            'last_rows_per_second': round(self.last_deleted / self.last_duration, 1) if self.last_duration else 0.0,
+            'last_error': self.last_error,
+        }
+
+retention_job = RetentionJob(
+    config.RAW_RETENTION_DAYS, config.RETENTION_INTERVAL,
+    config.RETENTION_CHUNK_SIZE, config.RETENTION_CHUNK_PAUSE
+)
@@ -0,0 +1,190 @@
+"""Агрегаты погодных данных по минутам, часам и суткам"""
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from peewee import chunked, fn, Case, EXCLUDED
+
+import config
+from models import (
+    database, WeatherDataRollup,
+    WeatherDataMinute, WeatherDataHour, WeatherDataDay
+)
+from partitions import registry
+from columnar import sql_epoch_ms
+
+RESOLUTIONS = {
+    '1m': WeatherDataMinute,
+    '1h': WeatherDataHour,
+    '1d': WeatherDataDay,
+}
+
+# Размер пачки при пересборке агрегатов
+REBUILD_CHUNK_SIZE = 500
+
+def truncate(timestamp: datetime, resolution: str) -> datetime:
+    """Начало интервала, в который попадает метка времени"""
+    timestamp = timestamp.replace(second=0, microsecond=0)
+    if resolution in ('1h', '1d'):
+        timestamp = timestamp.replace(minute=0)
+    if resolution == '1d':
+        timestamp = timestamp.replace(hour=0)
+    return timestamp
+
+def _aggregate(rows: Iterable[Dict[str, Any]], resolution: str) -> List[Dict[str, Any]]:
+    """Свертка показаний в строки агрегатов по (датчик, интервал)"""
+    buckets = {}
+    for row in rows:
+        key = (row['sensor'], truncate(row['timestamp'], resolution))
+        value = row['value']
+        bucket = buckets.get(key)
+        if bucket is None:
+            buckets[key] = {
+                'sensor': key[0],
+                'bucket': key[1],
+                'count': 1,
+                'sum_value': value,
+                'min_value': value,
+                'max_value': value,
+                'last_value': value,
+                'last_timestamp': row['timestamp'],
+            }
+            continue
+        bucket['count'] += 1
+        bucket['sum_value'] += value
+        bucket['min_value'] = min(bucket['min_value'], value)
+        bucket['max_value'] = max(bucket['max_value'], value)
+        if row['timestamp'] >= bucket['last_timestamp']:
+            bucket['last_value'] = value
+            bucket['last_timestamp'] = row['timestamp']
+    return list(buckets.values())
+
+def apply_readings(rows: List[Dict[str, Any]]):
+    """Инкрементальное обновление агрегатов новыми показаниями (внутри транзакции вставки)"""
+    for resolution, model in RESOLUTIONS.items():
+        for chunk in chunked(_aggregate(rows, resolution), REBUILD_CHUNK_SIZE):
+            (model
+             .insert_many(chunk)
+             .on_conflict(
+                 conflict_target=[model.sensor, model.bucket],
+                 update={
+                     model.count: model.count + EXCLUDED.count,
+                     model.sum_value: model.sum_value + EXCLUDED.sum_value,
+                     model.min_value: fn.MIN(model.min_value, EXCLUDED.min_value),
+                     model.max_value: fn.MAX(model.max_value, EXCLUDED.max_value),
+                     model.last_value: Case(None, [
+                         (EXCLUDED.last_timestamp >= model.last_timestamp, EXCLUDED.last_value)
+                     ], model.last_value),
+                     model.last_timestamp: fn.MAX(model.last_timestamp, EXCLUDED.last_timestamp),
+                 })
+             .execute())
+
+def rebuild(
+    sensor_id: Optional[int] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None
+) -> int:
+    """Пересборка агрегатов из секций погодных данных, границы выравниваются по суткам"""
+    start_day = truncate(start_time, '1d') if start_time else None
+    end_day = truncate(end_time, '1d') + timedelta(days=1) if end_time else None
+
+    with database.atomic():
+        for model in RESOLUTIONS.values():
+            query = model.delete()
+            if sensor_id is not None:
+                query = query.where(model.sensor == sensor_id)
+            if start_day:
+                query = query.where(model.bucket >= start_day)
+            if end_day:
+                query = query.where(model.bucket < end_day)
+            query.execute()
+
+        total = 0
+        for model in registry.models(start_day, end_day):
+            readings = (model
+                        .select(model.sensor, model.timestamp, model.value)
+                        .order_by(model.sensor, model.timestamp))
+            if sensor_id is not None:
+                readings = readings.where(model.sensor == sensor_id)
+            if start_day:
+                readings = readings.where(model.timestamp >= start_day)
+            if end_day:
+                readings = readings.where(model.timestamp < end_day)
+            for chunk in chunked(readings.dicts().iterator(), REBUILD_CHUNK_SIZE * 10):
+                # Пачки не выровнены по интервалам, но upsert корректно дописывает соседние
+                apply_readings(chunk)
+                total += len(chunk)
+    return total
+
+def raw_cutoff(now: Optional[datetime] = None) -> Optional[datetime]:
+    """Начало суток, с которых хранятся сырые показания (None — хранятся бессрочно)"""
+    if not config.RAW_RETENTION_DAYS:
+        return None
+    return truncate((now or datetime.now()) - timedelta(days=config.RAW_RETENTION_DAYS), '1d')
+
+def _subtract(sensor_id: int, timestamp: datetime, value: float):
+    for resolution, model in RESOLUTIONS.items():
+        where = (model.sensor == sensor_id) & (model.bucket == truncate(timestamp, resolution))
+        model.update(count=model.count - 1, sum_value=model.sum_value - value).where(where).execute()
+        model.delete().where(where & (model.count <= 0)).execute()
+
+def replace_reading(old: Optional[Tuple[int, datetime, float]], new: Optional[Tuple[int, datetime, float]]):
+    """Поправка агрегатов после изменения показания old -> new или удаления (new — None).
+
+    Показания — кортежи (датчик, метка времени, значение). Сутки, сырые данные которых хранятся,
+    пересобираются точно. Сутки старше срока хранения пересобирать не из чего: старое значение
+    вычитается, новое добавляется; минимум, максимум и последнее значение при вычитании не пересчитываются.
+    """
+    cutoff = raw_cutoff()
+    rebuilt = set()
+    for reading, added in ((old, False), (new, True)):
+        if reading is None:
+            continue
+        sensor_id, timestamp, value = reading
+        day = truncate(timestamp, '1d')
+        if cutoff is None or day >= cutoff:
+            if (sensor_id, day) not in rebuilt:
+                rebuild(sensor_id, day, day)
+                rebuilt.add((sensor_id, day))
+        elif added:
+            apply_readings([{'sensor': sensor_id, 'timestamp': timestamp, 'value': value}])
+        else:
+            _subtract(sensor_id, timestamp, value)
+
+def ensure_built():
+    """Первичная сборка агрегатов для базы, заполненной до их появления"""
+    if WeatherDataDay.select().exists():
+        return
+    if any(model.select().exists() for model in registry.models()):
+        total = rebuild()
+        print(f"✅ Агрегаты пересобраны ({total} показаний)")
+
+def query_rollups(
+    sensor_id: int,
+    resolution: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    limit: int = 1000,
+    before: Optional[datetime] = None
+) -> List[WeatherDataRollup]:
+    """Агрегаты датчика за период, от новых к старым (before — курсор предыдущей страницы)"""
+    model = RESOLUTIONS[resolution]
+    query = model.select().where(model.sensor == sensor_id)
+    if before:
+        query = query.where(model.bucket < before)
+    if start_time:
+        query = query.where(model.bucket >= truncate(start_time, resolution))
+    if end_time:
+        query = query.where(model.bucket <= end_time)
+    return list(query.order_by(model.bucket.desc()).limit(limit))
+
+def iter_window(sensor_id: int, resolution: str, start_time: datetime, end_time: datetime):
+    """Агрегаты датчика за [start_time, end_time) по возрастанию: кортежи
+    (начало интервала в мс от эпохи, среднее, количество, минимум, максимум)"""
+    model = RESOLUTIONS[resolution]
+    query = (model
+             .select(sql_epoch_ms(model.bucket), model.sum_value / model.count, model.count,
+                     model.min_value, model.max_value)
+             .where((model.sensor == sensor_id) &
+                    (model.bucket >= truncate(start_time, resolution)) &
+                    (model.bucket < end_time))
+             .order_by(model.bucket))
+    return query.tuples().iterator()
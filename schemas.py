@@ -1,7 +1,9 @@
-from pydantic import BaseModel, Field, validator, ConfigDict
+from pydantic import BaseModel, Field, validator, field_validator, ConfigDict
 from datetime import datetime, date
 from typing import List, Optional, Dict, Any
 
+from models import SEVERITY_RANKS
+
 # Базовые схемы
 class LocationBase(BaseModel):
     name: str = Field(..., max_length=100)
@@ -30,6 +32,8 @@ class SensorTypeBase(BaseModel):
     description: Optional[str] = None
     min_value: Optional[float] = None
     max_value: Optional[float] = None
+    anomaly_window_hours: float = Field(168, gt=0)
+    anomaly_threshold: float = Field(3.0, gt=0)
 
 class SensorBase(BaseModel):
     station_id: int
@@ -75,7 +79,15 @@ class WeatherDataCreate(WeatherDataBase):
     pass
 
 class WeatherAlertCreate(WeatherAlertBase):
-    pass
+    @field_validator('severity')
+    @classmethod
+    def check_severity(cls, value: str) -> str:
+        if value not in SEVERITY_RANKS:
+            raise ValueError(f"Допустимые уровни: {', '.join(SEVERITY_RANKS)}")
+        return value
+
+class WeatherDataBatchCreate(BaseModel):
+    readings: List[WeatherDataCreate] = Field(..., min_length=1, max_length=10000)
 
 # Схемы для ответов
 class LocationResponse(LocationBase):
@@ -113,23 +125,138 @@ class WeatherDataResponse(WeatherDataBase):
 
 class WeatherAlertResponse(WeatherAlertBase):
     id: int
+    severity_rank: int = 0
     created_at: datetime
     updated_at: datetime
     
     model_config = ConfigDict(from_attributes=True)
 
+class WeatherDataBatchItemResult(BaseModel):
+    index: int
+    accepted: bool
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class WeatherDataBatchResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[WeatherDataBatchItemResult]
+
+class WeatherDataFrameResponse(BaseModel):
+    # id принятых показаний идут подряд от first_id в порядке записей кадра
+    accepted: int
+    rejected: int
+    first_id: Optional[int] = None
+    errors: List[WeatherDataBatchItemResult]
+
+class WeatherDataBufferedResponse(WeatherDataBatchResponse):
+    # Номер пакета в буфере приема: пакет записан, когда durable_sequence >= sequence
+    sequence: Optional[int] = None
+    durable_sequence: int
+    flush_deadline: datetime
+
+class WeatherDataIngestStatus(BaseModel):
+    sequence: int
+    state: str
+    error: Optional[str] = None
+    durable_sequence: int
+
+class WeatherDataRollupResponse(BaseModel):
+    sensor_id: int
+    timestamp: datetime
+    count: int
+    avg_value: float
+    min_value: float
+    max_value: float
+    last_value: float
+    
+    @classmethod
+    def from_rollup(cls, rollup) -> 'WeatherDataRollupResponse':
+        return cls(
+            sensor_id=rollup.sensor_id,
+            timestamp=rollup.bucket,
+            count=rollup.count,
+            avg_value=rollup.sum_value / rollup.count,
+            min_value=rollup.min_value,
+            max_value=rollup.max_value,
+            last_value=rollup.last_value
+        )
+
+class StationTimeseriesColumn(BaseModel):
+    sensor_type_id: int
+    name: str
+    unit: str
+    aggregation: str
+    sensor_ids: List[int]
+
+class StationTimeseriesResponse(BaseModel):
+    # values — строки по timestamps (начала интервалов), колонки по columns; null — нет показаний
+    station_id: int
+    start: datetime
+    end: datetime
+    step_seconds: int
+    timestamps: List[datetime]
+    columns: List[StationTimeseriesColumn]
+    values: List[List[Optional[float]]]
+
+class SensorAnalyticsTrend(BaseModel):
+    # Значение тренда: intercept + slope_per_hour * часы от начала окна
+    slope_per_hour: float
+    intercept: float
+    r_squared: float
+
+class SensorAnalyticsRate(BaseModel):
+    # Скорость изменения между соседними точками, в единицах датчика за час
+    last: float
+    mean: float
+    min: float
+    max: float
+
+class SensorAnalyticsResponse(BaseModel):
+    # source — raw (сырые показания) или разрешение агрегатов 1m, 1h, 1d
+    sensor_id: int
+    start: datetime
+    end: datetime
+    source: str
+    count: int
+    mean: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    p5: Optional[float] = None
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    trend: Optional[SensorAnalyticsTrend] = None
+    rate_of_change: Optional[SensorAnalyticsRate] = None
+    rolling_window_seconds: int
+    timestamps: List[datetime] = []
+    rolling_mean: List[float] = []
+
 # Схемы с отношениями
 class SensorWithType(SensorResponse):
     sensor_type: 'SensorTypeResponse'
 
 class WeatherStationWithSensors(WeatherStationResponse):
     location: 'LocationResponse'
-    sensors: List[SensorWithType] = []
+    sensors: List['SensorWithData'] = []
 
 class LocationWithStations(LocationResponse):
     stations: List['WeatherStationResponse'] = []
     active_alerts: List['WeatherAlertResponse'] = []
 
+class WeatherStationWithLatest(WeatherStationResponse):
+    latest_data: List['WeatherDataResponse'] = []
+
+class LocationWithDistance(LocationResponse):
+    distance_km: Optional[float] = None
+    stations: List['WeatherStationWithLatest'] = []
+
+class SearchResult(BaseModel):
+    entity_type: str
+    entity_id: int
+    rank: float
+    location: Optional['LocationResponse'] = None
+    station: Optional['WeatherStationResponse'] = None
+
 class WeatherDataWithSensor(WeatherDataResponse):
     sensor: 'SensorWithData'
 
@@ -148,6 +275,9 @@ class WeatherAlertWithLocation(WeatherAlertResponse):
 SensorWithType.model_rebuild()
 WeatherStationWithSensors.model_rebuild()
 LocationWithStations.model_rebuild()
+WeatherStationWithLatest.model_rebuild()
+LocationWithDistance.model_rebuild()
+SearchResult.model_rebuild()
 WeatherDataWithSensor.model_rebuild()
 SensorWithData.model_rebuild()
 WeatherAlertWithLocation.model_rebuild()
\ No newline at end of file
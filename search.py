@@ -0,0 +1,84 @@
+"""Полнотекстовый поиск по местоположениям и станциям (SQLite FTS5)"""
+import re
+from typing import List, Optional, Tuple
+
+from peewee import SQL
+from models import database, Location, WeatherStation, SearchIndex
+
+ENTITY_TYPES = ('location', 'station')
+
+# Веса колонок для bm25 в порядке объявления полей SearchIndex
+BM25_WEIGHTS = (0.0, 0.0, 10.0, 8.0, 4.0, 1.0)
+
+def _rowid(entity_type: str, entity_id: int) -> int:
+    """rowid строки индекса однозначно задается сущностью, поэтому удаление идет по первичному ключу"""
+    return entity_id * len(ENTITY_TYPES) + ENTITY_TYPES.index(entity_type)
+
+def _join(*values) -> str:
+    return ' '.join(str(value) for value in values if value)
+
+def _put(entity_type: str, entity_id: int, name: str, code: str, place: str, details: str):
+    rowid = _rowid(entity_type, entity_id)
+    SearchIndex.delete().where(SearchIndex.rowid == rowid).execute()
+    SearchIndex.insert(
+        rowid=rowid,
+        entity_type=entity_type,
+        entity_id=entity_id,
+        name=name,
+        code=code,
+        place=place,
+        details=details
+    ).execute()
+
+def index_location(location: Location):
+    _put('location', location.id, location.name, '',
+         _join(location.address, location.city, location.country), '')
+
+def index_station(station: WeatherStation):
+    _put('station', station.id, station.name, station.station_code, '',
+         _join(station.manufacturer, station.model, station.description))
+
+def unindex(entity_type: str, entity_id: int):
+    SearchIndex.delete().where(SearchIndex.rowid == _rowid(entity_type, entity_id)).execute()
+
+def unindex_location(location_id: int):
+    """Удаление местоположения вместе с его станциями, удаляемыми каскадно (до удаления из БД)"""
+    unindex('location', location_id)
+    for station_id, in WeatherStation.select(WeatherStation.id).where(WeatherStation.location == location_id).tuples():
+        unindex('station', station_id)
+
+def ensure_index():
+    """Пересборка индекса, если он расходится с таблицами местоположений и станций"""
+    expected = Location.select().count() + WeatherStation.select().count()
+    if SearchIndex.select().count() == expected:
+        return
+    with database.atomic():
+        SearchIndex.delete().execute()
+        for location in Location.select().iterator():
+            index_location(location)
+        for station in WeatherStation.select().iterator():
+            index_station(station)
+    print("✅ Поисковый индекс пересобран")
+
+def match_expression(text: str) -> Optional[str]:
+    """Запрос пользователя как набор префиксных термов FTS5 (операторы и кавычки отбрасываются)"""
+    terms = re.findall(r'\w+', text)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def search(text: str, entity_type: Optional[str] = None, limit: int = 50) -> List[Tuple[str, int, float]]:
+    """Найденные сущности (тип, id, релевантность) от более релевантных к менее"""
+    expression = match_expression(text)
+    if expression is None:
+        return []
+    query = (SearchIndex
+             .select(SearchIndex.entity_type, SearchIndex.entity_id,
+                     SearchIndex.bm25(*BM25_WEIGHTS).alias('rank'))
+             .where(SearchIndex.match(expression)))
+    if entity_type:
+        query = query.where(SearchIndex.entity_type == entity_type)
+    return [
+        (found_type, int(found_id), -rank)
+        for found_type, found_id, rank in query.order_by(SQL('rank')).limit(limit).tuples()
+    ]
@@ -0,0 +1,51 @@
+"""Быстрая сериализация списков: строки из базы сразу в JSON (orjson) без моделей pydantic.
+
+Обработчики списков читают колонки под именами полей схемы ответа (.dicts()/.tuples()),
+дополняют вложенные объекты и поля по умолчанию и отдают результат через json_response.
+Схема ответа остается в описании эндпоинта и задает состав и порядок полей.
+"""
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException, Response
+
+def response_fields(value: Optional[str], schema: type) -> List[str]:
+    """Поля ответа из параметра fields (через запятую) в порядке схемы; без параметра — все поля"""
+    names = list(schema.model_fields)
+    if not value:
+        return names
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = requested.difference(names)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные поля: {', '.join(sorted(unknown))}")
+    return [name for name in names if name in requested]
+
+def select_columns(model, names: Iterable[str], sources: Optional[Dict[str, Any]] = None) -> Tuple[List[str], list]:
+    """Колонки модели для полей схемы: имена и поля Peewee с псевдонимами (внешние ключи — как *_id).
+
+    sources задает колонку для поля, имя которого не совпадает с колонкой (например id -> data_id).
+    """
+    columns = {field.column_name: field for field in model._meta.sorted_fields}
+    columns.update(sources or {})
+    found = [name for name in dict.fromkeys(names) if name in columns]
+    return found, [columns[name].alias(name) for name in found]
+
+def schema_defaults(schema: type, names: Iterable[str]) -> Dict[str, Any]:
+    """Значения по умолчанию для полей схемы, которые не читаются из базы"""
+    fields = schema.model_fields
+    return {name: fields[name].get_default(call_default_factory=True) for name in names}
+
+def _default(value):
+    # DecimalField (координаты, высота) в схемах объявлен как float
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(type(value).__name__)
+
+def orjson_response(content: Any) -> Response:
+    """Ответ JSON, сериализованный orjson (NaN и бесконечности отдаются как null)"""
+    return Response(orjson.dumps(content, default=_default), media_type='application/json')
+
+def json_response(rows: List[Dict[str, Any]], names: List[str]) -> Response:
+    """Ответ со строками, сокращенными до полей names; служебные колонки (ключи курсора) отбрасываются"""
+    return orjson_response([{name: row[name] for name in names} for row in rows])
@@ -0,0 +1,103 @@
+"""Пространственный индекс местоположений на R*Tree SQLite"""
+import math
+from typing import List, Tuple
+
+from models import database, Location, LocationRTree
+
+# Средний радиус Земли (км)
+EARTH_RADIUS_KM = 6371.0088
+# Длина градуса меридиана (км)
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние по дуге большого круга"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def index_location(location: Location):
+    """Добавление или перемещение точки местоположения в индексе"""
+    latitude, longitude = float(location.latitude), float(location.longitude)
+    LocationRTree.replace(
+        id=location.id,
+        min_lat=latitude, max_lat=latitude,
+        min_lon=longitude, max_lon=longitude
+    ).execute()
+
+def unindex_location(location_id: int):
+    LocationRTree.delete().where(LocationRTree.id == location_id).execute()
+
+def ensure_index():
+    """Пересборка индекса, если он расходится с таблицей местоположений"""
+    if LocationRTree.select().count() == Location.select().count():
+        return
+    with database.atomic():
+        LocationRTree.delete().execute()
+        for location in Location.select(Location.id, Location.latitude, Location.longitude).iterator():
+            index_location(location)
+    print("✅ Пространственный индекс местоположений пересобран")
+
+def _longitude_ranges(min_lon: float, max_lon: float) -> List[Tuple[float, float]]:
+    """Диапазоны долгот с учетом перехода через 180-й меридиан"""
+    if max_lon - min_lon >= 360:
+        return [(-180.0, 180.0)]
+    if min_lon < -180:
+        return [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    if min_lon > max_lon:
+        return [(min_lon, 180.0), (-180.0, max_lon)]
+    return [(min_lon, max_lon)]
+
+def _query_bbox(min_lat: float, max_lat: float, lon_ranges: List[Tuple[float, float]], active_only: bool):
+    """Кандидаты из R*Tree (границы хранятся в float32 и округлены наружу)"""
+    condition = None
+    for lon_from, lon_to in lon_ranges:
+        part = (LocationRTree.min_lon <= lon_to) & (LocationRTree.max_lon >= lon_from)
+        condition = part if condition is None else condition | part
+    candidates = (LocationRTree
+                  .select(LocationRTree.id)
+                  .where((LocationRTree.min_lat <= max_lat) & (LocationRTree.max_lat >= min_lat) & (condition)))
+    query = Location.select().where(Location.id.in_(candidates))
+    if active_only:
+        query = query.where(Location.is_active == True)
+    return query
+
+def within(
+    min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+    limit: int = 1000, active_only: bool = True
+) -> List[Location]:
+    """Местоположения в прямоугольнике; min_lon > max_lon — прямоугольник через 180-й меридиан"""
+    lon_ranges = _longitude_ranges(min_lon, max_lon)
+    result = []
+    for location in _query_bbox(min_lat, max_lat, lon_ranges, active_only).order_by(Location.id):
+        latitude, longitude = float(location.latitude), float(location.longitude)
+        if min_lat <= latitude <= max_lat and any(lon_from <= longitude <= lon_to for lon_from, lon_to in lon_ranges):
+            result.append(location)
+            if len(result) >= limit:
+                break
+    return result
+
+def nearby(
+    latitude: float, longitude: float, radius_km: float,
+    limit: int = 100, active_only: bool = True
+) -> List[Tuple[Location, float]]:
+    """Местоположения в радиусе от точки, от ближних к дальним, с расстоянием в км"""
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    # У полюса окружность радиуса захватывает все долготы
+    cos_lat = min(math.cos(math.radians(min_lat)), math.cos(math.radians(max_lat)))
+    if min_lat <= -90 or max_lat >= 90 or cos_lat <= 0 or dlat / cos_lat >= 180:
+        lon_ranges = [(-180.0, 180.0)]
+    else:
+        dlon = dlat / cos_lat
+        lon_ranges = _longitude_ranges(longitude - dlon, longitude + dlon)
+    found = []
+    for location in _query_bbox(min_lat, max_lat, lon_ranges, active_only):
+        distance = haversine_km(latitude, longitude, float(location.latitude), float(location.longitude))
+        if distance <= radius_km:
+            found.append((location, distance))
+    found.sort(key=lambda item: item[1])
+    return found[:limit]
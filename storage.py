@@ -0,0 +1,348 @@
+"""Слой доступа к погодным данным"""
+from array import array
+from datetime import date, datetime, timezone
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple as TypingTuple
+from peewee import chunked, fn, Tuple, Value, EXCLUDED
+
+from models import database, DBContext, SensorType, WeatherData, SensorLatest
+from partitions import registry, month_of, month_start, next_month, allocate_ids
+import rollups
+from columnar import sql_epoch_ms
+
+# Количество строк в одном INSERT (с запасом до лимита переменных SQLite)
+INSERT_CHUNK_SIZE = 500
+
+def check_value_range(sensor_type: SensorType, value: float) -> Optional[str]:
+    """Проверка значения по диапазону типа датчика, возвращает текст ошибки"""
+    if sensor_type.min_value is not None and value < sensor_type.min_value:
+        return f"Значение ниже минимального ({sensor_type.min_value})"
+    if sensor_type.max_value is not None and value > sensor_type.max_value:
+        return f"Значение выше максимального ({sensor_type.max_value})"
+    return None
+
+def naive_utc(timestamp: datetime) -> datetime:
+    """Метка времени без часового пояса, как она хранится; метки с поясом переводятся в UTC"""
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+def reading_row(reading) -> Dict[str, Any]:
+    """Строка для вставки в WeatherData из схемы WeatherDataCreate"""
+    return {
+        'sensor': reading.sensor_id,
+        # Метки с поясом и без него в одном пакете иначе не сравнить (последнее значение, агрегаты)
+        'timestamp': naive_utc(reading.timestamp),
+        'value': reading.value,
+        'quality': reading.quality,
+        'raw_data': reading.raw_data,
+    }
+
+def ensure_partitions(timestamps: Iterable[datetime]):
+    """Создание недостающих секций для меток времени; вызывается до транзакции записи"""
+    for month in sorted({month_of(timestamp) for timestamp in timestamps}):
+        registry.ensure(month)
+
+def insert_readings(rows: List[Dict[str, Any]]) -> List[int]:
+    """Многострочная вставка показаний в секции по месяцам и обновление агрегатов в одной транзакции, возвращает id"""
+    if not rows:
+        return []
+    ensure_partitions(row['timestamp'] for row in rows)
+    with database.atomic():
+        first_id = allocate_ids(len(rows))
+        ids = list(range(first_id, first_id + len(rows)))
+        by_month = {}
+        for data_id, row in zip(ids, rows):
+            by_month.setdefault(month_of(row['timestamp']), []).append({'id': data_id, **row})
+        for month, month_rows in by_month.items():
+            model = registry.model(month)
+            for chunk in chunked(month_rows, INSERT_CHUNK_SIZE):
+                model.insert_many(chunk).execute()
+        rollups.apply_readings(rows)
+        _apply_latest(rows, ids)
+    return ids
+
+def get_reading(data_id: int) -> WeatherData:
+    """Показание по id из любой секции; бросает DoesNotExist, как Model.get"""
+    data = registry.find(data_id)
+    if data is None:
+        raise WeatherData.DoesNotExist(f"Показание {data_id} не найдено")
+    return data
+
+def save_reading(data: WeatherData) -> WeatherData:
+    """Сохранение измененного показания; при смене месяца строка переносится в другую секцию с тем же id.
+
+    Секция нового месяца создается заранее через ensure_partitions.
+    """
+    month = month_of(data.timestamp)
+    if month == type(data).month:
+        data.save()
+        return data
+    type(data).delete().where(type(data).id == data.id).execute()
+    model = registry.model(month)
+    moved = model(**{field.name: getattr(data, field.name) for field in model._meta.sorted_fields})
+    moved.save(force_insert=True)
+    return moved
+
+def delete_reading(data: WeatherData):
+    type(data).delete().where(type(data).id == data.id).execute()
+
+def _apply_latest(rows: List[Dict[str, Any]], ids: List[int]):
+    """Обновление последних показаний датчиков новыми строками (внутри транзакции вставки)"""
+    newest = {}
+    for data_id, row in zip(ids, rows):
+        current = newest.get(row['sensor'])
+        if current is None or (row['timestamp'], data_id) > (current['timestamp'], current['data_id']):
+            newest[row['sensor']] = {'data_id': data_id, **row}
+    for chunk in chunked(list(newest.values()), INSERT_CHUNK_SIZE):
+        (SensorLatest
+         .insert_many(chunk)
+         .on_conflict(
+             conflict_target=[SensorLatest.sensor],
+             preserve=[SensorLatest.data_id, SensorLatest.timestamp, SensorLatest.value,
+                       SensorLatest.quality, SensorLatest.raw_data],
+             where=(Tuple(EXCLUDED.timestamp, EXCLUDED.data_id) >
+                    Tuple(SensorLatest.timestamp, SensorLatest.data_id)))
+         .execute())
+
+def refresh_latest(sensor_ids: Iterable[int]):
+    """Пересчет последнего показания датчиков после изменения или удаления данных"""
+    for sensor_id in set(sensor_ids):
+        data = None
+        for model in registry.models(newest_first=True):
+            data = (model
+                    .select()
+                    .where(model.sensor == sensor_id)
+                    .order_by(model.timestamp.desc(), model.id.desc())
+                    .first())
+            if data is not None:
+                break
+        if data is None:
+            SensorLatest.delete().where(SensorLatest.sensor == sensor_id).execute()
+        else:
+            SensorLatest.replace(
+                sensor=data.sensor_id,
+                data_id=data.id,
+                timestamp=data.timestamp,
+                value=data.value,
+                quality=data.quality,
+                raw_data=data.raw_data
+            ).execute()
+
+def ensure_latest_built():
+    """Первичное заполнение последних показаний для базы, заполненной до их появления"""
+    if SensorLatest.select().exists():
+        return
+    sensor_ids = set()
+    for model in registry.models():
+        sensor_ids.update(sensor_id for sensor_id, in model.select(model.sensor).distinct().tuples())
+    if not sensor_ids:
+        return
+    with database.atomic():
+        refresh_latest(sensor_ids)
+    print(f"✅ Последние показания заполнены ({len(sensor_ids)} датчиков)")
+
+def drop_partition(month: date) -> int:
+    """Удаление месячной секции целиком (агрегаты сохраняются), возвращает число удаленных показаний"""
+    # Транзакция начинается с чтения: блокировка записи берется сразу, иначе запись другого соединения
+    # между чтением и DROP TABLE делает снимок устаревшим и SQLite отвечает "database is locked"
+    with database.atomic('IMMEDIATE'):
+        affected = [
+            sensor_id for sensor_id, in SensorLatest
+            .select(SensorLatest.sensor)
+            .where((SensorLatest.timestamp >= month_start(month)) &
+                   (SensorLatest.timestamp < month_start(next_month(month))))
+            .tuples()
+        ]
+        count = registry.drop(month)
+        refresh_latest(affected)
+    return count
+
+def sensor_stats(
+    sensor_ids: Iterable[int],
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None
+) -> Dict[int, Dict[str, Any]]:
+    """Количество, среднее, минимум и максимум по датчикам: по агрегатному запросу на секцию периода"""
+    sensor_ids = list(sensor_ids)
+    totals = {}
+    for model in registry.models(start_time, end_time):
+        query = (model
+                 .select(
+                     model.sensor,
+                     fn.COUNT(model.id),
+                     fn.SUM(model.value),
+                     fn.MIN(model.value),
+                     fn.MAX(model.value))
+                 .where(model.sensor.in_(sensor_ids)))
+        if start_time:
+            query = query.where(model.timestamp >= start_time)
+        if end_time:
+            query = query.where(model.timestamp <= end_time)
+        for sensor_id, count, total, minimum, maximum in query.group_by(model.sensor).tuples():
+            current = totals.get(sensor_id)
+            if current is None:
+                totals[sensor_id] = [count, total, minimum, maximum]
+            else:
+                current[0] += count
+                current[1] += total
+                current[2] = min(current[2], minimum)
+                current[3] = max(current[3], maximum)
+    return {
+        sensor_id: {
+            'data_count': count,
+            'avg_value': total / count,
+            'min_value': minimum,
+            'max_value': maximum,
+        }
+        for sensor_id, (count, total, minimum, maximum) in totals.items()
+    }
+
+def reading_fields(model, include_raw: bool) -> list:
+    """Колонки показаний для выборки; сырые данные распаковываются, только если они запрошены"""
+    return [field for field in model._meta.sorted_fields if include_raw or field.name != 'raw_data']
+
+def latest_readings(sensor_ids: Iterable[int]) -> Dict[int, SensorLatest]:
+    """Последнее показание каждого датчика из таблицы последних значений (без сырых данных)"""
+    query = SensorLatest.select(*reading_fields(SensorLatest, False)).where(SensorLatest.sensor.in_(list(sensor_ids)))
+    return {latest.sensor_id: latest for latest in query}
+
+def _sensor_partitions(start_time, end_time, before):
+    """Секции для обхода от новых к старым; курсор before сужает верхнюю границу"""
+    if before and (end_time is None or before[0] < end_time):
+        end_time = before[0]
+    return registry.models(start_time, end_time, newest_first=True)
+
+def _sensor_readings_query(query, model, sensor_id, start_time, end_time, limit, before):
+    query = query.where(model.sensor == sensor_id)
+    if start_time:
+        query = query.where(model.timestamp >= start_time)
+    if end_time:
+        query = query.where(model.timestamp <= end_time)
+    if before:
+        query = query.where(Tuple(model.timestamp, model.id) < Tuple(*before))
+    return query.order_by(model.timestamp.desc(), model.id.desc()).limit(limit)
+
+def sensor_reading_rows(
+    sensor_id: int,
+    names: Iterable[str],
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    limit: int = 1000,
+    before: Optional[tuple] = None
+) -> List[Dict[str, Any]]:
+    """Показания датчика от новых к старым словарями с колонками names (ключи — имена колонок, sensor_id).
+
+    before — ключ (timestamp, id) последней строки предыдущей страницы; модели не создаются.
+    """
+    names = set(names)
+    rows = []
+    for model in _sensor_partitions(start_time, end_time, before):
+        columns = [field.alias(field.column_name) for field in model._meta.sorted_fields
+                   if field.column_name in names]
+        query = _sensor_readings_query(
+            model.select(*columns), model, sensor_id, start_time, end_time, limit - len(rows), before)
+        rows.extend(query.dicts().iterator())
+        if len(rows) >= limit:
+            break
+    return rows
+
+def sensor_reading_columns(
+    sensor_id: int,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    limit: int = 1000,
+    before: Optional[tuple] = None
+) -> TypingTuple[array, array, array, array, Optional[datetime]]:
+    """Те же показания колонками (id, метка в мс от эпохи, значение, качество) без создания моделей.
+
+    Последний элемент — точная метка последней строки для курсора: метки в колонке округлены до мс.
+    Метка читается текстом, в datetime разбирается только последняя.
+    """
+    ids, timestamps, values, qualities = array('q'), array('q'), array('d'), array('B')
+    stored = None
+    for model in _sensor_partitions(start_time, end_time, before):
+        query = _sensor_readings_query(
+            model.select(model.id, sql_epoch_ms(model.timestamp), model.value, model.quality,
+                         model.timestamp.cast('TEXT')),
+            model, sensor_id, start_time, end_time, limit - len(ids), before)
+        for data_id, timestamp, value, quality, stored in query.tuples().iterator():
+            ids.append(data_id)
+            timestamps.append(timestamp)
+            values.append(value)
+            qualities.append(quality)
+        if len(ids) >= limit:
+            break
+    last_timestamp = datetime.fromisoformat(stored) if ids else None
+    return ids, timestamps, values, qualities, last_timestamp
+
+def station_reading_columns(
+    sensor_ids: List[int],
+    start_time: datetime,
+    end_time: datetime
+) -> TypingTuple[array, array, array]:
+    """Показания нескольких датчиков за [start_time, end_time) колонками (датчик, метка в мс от эпохи, значение).
+
+    Один запрос на секцию периода; порядок строк не задается, сортировку делает потребитель.
+    """
+    sensors, timestamps, values = array('q'), array('q'), array('d')
+    for model in registry.models(start_time, end_time):
+        query = (model
+                 .select(model.sensor, sql_epoch_ms(model.timestamp), model.value)
+                 .where(model.sensor.in_(sensor_ids) &
+                        (model.timestamp >= start_time) &
+                        (model.timestamp < end_time)))
+        for sensor_id, timestamp, value in query.tuples().iterator():
+            sensors.append(sensor_id)
+            timestamps.append(timestamp)
+            values.append(value)
+    return sensors, timestamps, values
+
+def iter_sensor_window(sensor_id: int, start_time: datetime, end_time: datetime) -> Iterator[tuple]:
+    """Показания датчика за [start_time, end_time) по возрастанию времени: кортежи (метка в мс от эпохи, значение)"""
+    for model in registry.models(start_time, end_time):
+        query = (model
+                 .select(sql_epoch_ms(model.timestamp), model.value)
+                 .where((model.sensor == sensor_id) &
+                        (model.timestamp >= start_time) &
+                        (model.timestamp < end_time))
+                 .order_by(model.timestamp, model.id))
+        yield from query.tuples().iterator()
+
+def iter_reading_pages(
+    sensor_ids: Optional[List[int]] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    page_size: int = 5000,
+    include_raw: bool = True
+) -> Iterator[List[tuple]]:
+    """Постраничный обход показаний по (timestamp, id) для потоковой выгрузки.
+
+    Секции периода обходятся от старых к новым, каждая страница читается курсором
+    (.tuples().iterator()) в отдельном контексте БД, поэтому обход можно продолжать
+    из другого потока, а память ограничена страницей.
+    Кортежи: (id, sensor_id, timestamp, value, quality, raw_data); без include_raw raw_data — None.
+    """
+    with DBContext():
+        models = registry.models(start_time, end_time)
+    for model in models:
+        after = None
+        while True:
+            with DBContext():
+                query = model.select(
+                    model.id, model.sensor, model.timestamp,
+                    model.value, model.quality, model.raw_data if include_raw else Value(None))
+                if sensor_ids:
+                    query = query.where(model.sensor.in_(sensor_ids))
+                if start_time:
+                    query = query.where(model.timestamp >= start_time)
+                if end_time:
+                    query = query.where(model.timestamp <= end_time)
+                if after:
+                    query = query.where(Tuple(model.timestamp, model.id) > Tuple(*after))
+                query = query.order_by(model.timestamp, model.id).limit(page_size)
+                page = list(query.tuples().iterator())
+            if page:
+                yield page
+            if len(page) < page_size:
+                break
+            after = (page[-1][2], page[-1][0])
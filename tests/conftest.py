@@ -0,0 +1,50 @@
+"""Общие фикстуры: приложение на временной базе и отдельная станция с датчиком на каждый тест"""
+import itertools
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_numbers = itertools.count(1)
+
+@pytest.fixture(scope='session')
+def client(tmp_path_factory):
+    # Путь к файлу базы в models относительный: база создается во временном каталоге
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('db'))
+    try:
+        import models
+        models.initialize_database()
+        from fastapi.testclient import TestClient
+        import main
+        with TestClient(main.app) as test_client:
+            yield test_client
+    finally:
+        os.chdir(cwd)
+
+@pytest.fixture
+def sensor(client):
+    """Новый датчик температуры (-50..60 °C) на новой станции, чтобы тесты не влияли друг на друга"""
+    number = next(_numbers)
+    station = client.post('/stations/', json={
+        'location_id': 1,
+        'name': f'Тестовая станция {number}',
+        'station_code': f'TEST-{number:03d}',
+        'installation_date': '2020-01-01',
+    }).json()
+    return client.post('/sensors/', json={
+        'station_id': station['id'],
+        'sensor_type_id': 1,
+        'sensor_code': f'TEST-TEMP-{number:03d}',
+    }).json()
+
+def post_readings(client, sensor_id: int, readings):
+    """Пакетная отправка пар (метка времени ISO, значение), возвращает id принятых показаний"""
+    response = client.post('/weather-data/batch', json={'readings': [
+        {'sensor_id': sensor_id, 'timestamp': timestamp, 'value': value, 'quality': 90}
+        for timestamp, value in readings
+    ]})
+    assert response.status_code == 200, response.text
+    return [result['id'] for result in response.json()['results']]
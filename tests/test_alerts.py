@@ -0,0 +1,50 @@
+"""Индекс активных предупреждений и метки времени с часовым поясом"""
+from alerts import active_alerts
+from models import DBContext, WeatherAlert
+
+def alert_json(title: str, start_time: str, end_time: str, issued_at: str):
+    return {
+        'location_id': 1,
+        'alert_type': 'storm',
+        'severity': 'ВЫСОКАЯ',
+        'title': title,
+        'description': 'Проверка индекса',
+        'start_time': start_time,
+        'end_time': end_time,
+        'issued_at': issued_at,
+        'issuer': 'pytest',
+    }
+
+def active_titles(client):
+    response = client.get('/alerts/active')
+    assert response.status_code == 200, response.text
+    return {alert['title'] for alert in response.json()}
+
+def test_aware_alert_times_are_stored_as_utc(client):
+    response = client.post('/alerts/', json=alert_json(
+        'UTC при создании', '2020-01-01T03:00:00+03:00', '2099-01-01T00:00:00Z', '2020-01-01T00:00:00Z'))
+    assert response.status_code == 201, response.text
+    alert = response.json()
+    assert alert['start_time'] == '2020-01-01T00:00:00'
+    assert alert['end_time'] == '2099-01-01T00:00:00'
+    with DBContext():
+        stored = WeatherAlert.get_by_id(alert['id'])
+        active_alerts.load()
+    assert stored.start_time.isoformat() == '2020-01-01T00:00:00'
+    assert 'UTC при создании' in active_titles(client)
+
+def test_index_reloads_alerts_stored_with_timezone(client):
+    alert = client.post('/alerts/', json=alert_json(
+        'Старая запись', '2020-01-01T00:00:00', '2099-01-01T00:00:00', '2020-01-01T00:00:00')).json()
+    with DBContext():
+        # Так записывали метки с поясом до перевода в UTC: строкой, которую Peewee не разбирает
+        (WeatherAlert
+         .update(start_time='2020-01-01 03:00:00+03:00', end_time='2099-01-01 00:00:00+00:00',
+                 issued_at='2020-01-01 00:00:00+00:00')
+         .where(WeatherAlert.id == alert['id'])
+         .execute())
+        active_alerts.load()
+        stored = WeatherAlert.get_by_id(alert['id'])
+    assert stored.start_time.isoformat() == '2020-01-01T00:00:00'
+    assert stored.end_time.isoformat() == '2099-01-01T00:00:00'
+    assert 'Старая запись' in active_titles(client)
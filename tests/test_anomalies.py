@@ -0,0 +1,29 @@
+"""Потоковая проверка аномалий по показаниям, принятым через API"""
+import time
+
+from anomalies import AnomalyWorker, detector, worker
+from conftest import post_readings
+
+def wait_for_worker(timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while worker.processed < worker.enqueued:
+        assert time.monotonic() < deadline, 'очередь проверки аномалий не разобрана'
+        time.sleep(0.01)
+
+def test_aware_and_naive_readings_update_stats(client, sensor):
+    failed = worker.failed
+    post_readings(client, sensor['id'], [('2016-10-01T10:00:00', 10.0), ('2016-10-01T10:05:00Z', 11.0)])
+    post_readings(client, sensor['id'], [('2016-10-01T13:10:00+03:00', 12.0), ('2016-10-01T10:15:00', 13.0)])
+    wait_for_worker()
+    assert worker.failed == failed
+    stats = detector._stats[sensor['id']]
+    assert stats.count == 4
+    assert stats.last_timestamp.isoformat() == '2016-10-01T10:15:00'
+
+def test_full_queue_delays_batch_once():
+    # Поток не запущен: очередь на два показания сразу переполняется
+    stalled = AnomalyWorker(maxsize=2, batch_size=10, put_timeout=0.2)
+    started = time.monotonic()
+    submitted = stalled.submit((None, float(value), None) for value in range(10))
+    assert time.monotonic() - started < 0.6
+    assert (submitted, stalled.enqueued, stalled.dropped) == (2, 2, 8)
@@ -0,0 +1,25 @@
+"""Кэш готовых ответов: ограничение по суммарному размеру"""
+from cache import ResponseCache
+
+def test_response_cache_is_bounded_by_bytes():
+    cache = ResponseCache(maxsize=100, maxbytes=250)
+    for index in range(3):
+        key = ('station', index)
+        cache.put(key, b'x' * 100, cache.generation(key))
+    assert cache.get(('station', 0)) is None
+    assert cache.get(('station', 2)).body == b'x' * 100
+    assert cache.metrics()['bytes'] == 200
+    # Ответ больше предела отдается, но не кэшируется и не вытесняет остальные
+    entry = cache.put(('station', 3), b'x' * 300, cache.generation(('station', 3)))
+    assert entry.etag and cache.get(('station', 3)) is None
+    assert cache.metrics()['size'] == 2
+
+def test_replacing_entry_keeps_byte_count():
+    cache = ResponseCache(maxsize=100, maxbytes=1000)
+    key = ('station', 1)
+    cache.put(key, b'x' * 100, cache.generation(key))
+    cache.put(key, b'x' * 40, cache.generation(key))
+    assert cache.metrics()['bytes'] == 40
+    cache.invalidate('station', 1)
+    cache.put(key, b'x' * 10, cache.generation(key))
+    assert cache.metrics()['bytes'] == 10
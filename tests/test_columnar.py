@@ -0,0 +1,40 @@
+"""Колоночный формат показаний датчика и курсорная пагинация в нем"""
+import struct
+from array import array
+
+from columnar import COLUMNAR_MEDIA_TYPE, MAGIC
+from conftest import post_readings
+
+def decode_columns(body: bytes) -> dict:
+    magic, _, ncolumns, nrows = struct.unpack_from('<4sBHI', body)
+    assert magic == MAGIC
+    offset = struct.calcsize('<4sBHI')
+    layout = []
+    for _ in range(ncolumns):
+        length = body[offset]
+        name = body[offset + 1:offset + 1 + length].decode()
+        layout.append((name, chr(body[offset + 1 + length])))
+        offset += length + 2
+    columns = {}
+    for name, typecode in layout:
+        values = array(typecode)
+        values.frombytes(body[offset:offset + nrows * values.itemsize])
+        offset += nrows * values.itemsize
+        columns[name] = list(values)
+    return columns
+
+def test_columnar_pages_cover_readings_once(client, sensor):
+    # Доли миллисекунды: метки в колонке округляются, курсор должен быть точным
+    readings = [(f'2013-03-01T10:00:00.{index * 100 + 70:06d}', float(index)) for index in range(25)]
+    post_readings(client, sensor['id'], readings)
+    values = []
+    params = {'limit': 10}
+    while True:
+        response = client.get(f"/sensors/{sensor['id']}/data", params=params,
+                              headers={'Accept': COLUMNAR_MEDIA_TYPE})
+        values += decode_columns(response.content)['value']
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+        params['cursor'] = cursor
+    assert values == [float(index) for index in reversed(range(25))]
@@ -0,0 +1,13 @@
+"""Бюджет соединений: все потоки, работающие с базой, помещаются в пул"""
+import config
+from anyio import to_thread
+from models import database
+
+async def _thread_limit() -> int:
+    return to_thread.current_default_thread_limiter().total_tokens
+
+def test_connection_pool_fits_all_threads(client):
+    assert client.portal.call(_thread_limit) == config.DB_SYNC_WORKERS
+    threads = (config.DB_READ_WORKERS + config.DB_WRITE_WORKERS + config.DB_SYNC_WORKERS +
+               config.DB_BACKGROUND_CONNECTIONS)
+    assert database._max_connections >= threads
@@ -0,0 +1,43 @@
+"""Бинарные кадры станций: разбор и прием через POST /weather-data/frame"""
+from datetime import datetime
+
+import pytest
+
+from columnar import epoch_ms
+from frames import FRAME_MEDIA_TYPE, RECORD, FrameError, decode_frame, encode_frame
+
+def post_frame(client, body: bytes):
+    return client.post('/weather-data/frame', content=body, headers={'Content-Type': FRAME_MEDIA_TYPE})
+
+def test_frame_round_trip():
+    records = [('T-1', 1700000000000, 1.5, 90), ('H-1', 1700000060000, 55.0, 100), ('T-1', 1700000120000, -3.25, 0)]
+    station_code, sensor_codes, decoded = decode_frame(encode_frame('ST-1', records))
+    assert (station_code, sensor_codes) == ('ST-1', ['T-1', 'H-1'])
+    assert decoded == [(0, 1700000000000, 1.5, 90), (1, 1700000060000, 55.0, 100), (0, 1700000120000, -3.25, 0)]
+
+@pytest.mark.parametrize('body', [
+    b'', b'XXXX\x01\x00', encode_frame('ST-1', [('T-1', 0, 1.0, 1)])[:-1],
+    encode_frame('ST-1', [('T-1', 0, 1.0, 1)]) + b'\x00' * RECORD.size,
+])
+def test_malformed_frames_are_rejected(body):
+    with pytest.raises(FrameError):
+        decode_frame(body)
+
+def test_frame_ingest(client, sensor):
+    station = client.get(f"/stations/{sensor['station_id']}").json()
+    timestamp = datetime(2019, 4, 1, 6, 30, 0, 250000)
+    body = encode_frame(station['station_code'], [
+        (sensor['sensor_code'], epoch_ms(timestamp), 11.5, 95),
+        ('NO-SUCH-SENSOR', epoch_ms(timestamp), 1.0, 95),
+        (sensor['sensor_code'], epoch_ms(timestamp), 99.0, 95),
+    ])
+    result = post_frame(client, body).json()
+    assert (result['accepted'], result['rejected']) == (1, 2)
+    assert [error['index'] for error in result['errors']] == [1, 2]
+    data = client.get(f"/sensors/{sensor['id']}/data").json()
+    assert [(item['id'], item['timestamp'], item['value'], item['quality']) for item in data] == [
+        (result['first_id'], '2019-04-01T06:30:00.250000', 11.5, 95)]
+
+def test_frame_errors(client):
+    assert post_frame(client, b'junk').status_code == 400
+    assert post_frame(client, encode_frame('NO-SUCH-STATION', [])).status_code == 404
@@ -0,0 +1,85 @@
+"""Агрегаты по минутам, часам и суткам и очистка сырых показаний с их сохранением"""
+from datetime import datetime
+
+from models import DBContext
+from retention import RetentionJob
+from rollups import RESOLUTIONS
+from conftest import post_readings
+
+def rollups(client, sensor_id: int, resolution: str):
+    response = client.get(f'/sensors/{sensor_id}/data', params={'resolution': resolution})
+    return [(item['timestamp'], item['count'], item['avg_value'], item['min_value'], item['max_value'],
+             item['last_value']) for item in response.json()]
+
+def test_rollups_follow_inserts(client, sensor):
+    post_readings(client, sensor['id'], [('2018-02-01T10:00:10', 3.0), ('2018-02-01T10:00:50', 1.0)])
+    post_readings(client, sensor['id'], [('2018-02-01T10:00:30', 5.0), ('2018-02-01T11:30:00', 7.0)])
+    assert rollups(client, sensor['id'], '1m') == [
+        ('2018-02-01T11:30:00', 1, 7.0, 7.0, 7.0, 7.0),
+        ('2018-02-01T10:00:00', 3, 3.0, 1.0, 5.0, 1.0),
+    ]
+    assert rollups(client, sensor['id'], '1d') == [('2018-02-01T00:00:00', 4, 4.0, 1.0, 7.0, 7.0)]
+
+def test_rollups_follow_update_and_delete(client, sensor):
+    first, second, _ = post_readings(client, sensor['id'], [
+        ('2018-03-01T10:00:00', 1.0), ('2018-03-01T11:00:00', 2.0), ('2018-03-02T10:00:00', 4.0)])
+    client.put(f'/weather-data/{first}', json={
+        'sensor_id': sensor['id'], 'timestamp': '2018-03-02T12:00:00', 'value': 6.0, 'quality': 90})
+    client.delete(f'/weather-data/{second}')
+    assert rollups(client, sensor['id'], '1d') == [('2018-03-02T00:00:00', 2, 5.0, 4.0, 6.0, 6.0)]
+
+def test_retention_purges_raw_and_keeps_rollups(client, sensor):
+    post_readings(client, sensor['id'], [
+        (f'2002-03-0{day}T{hour:02d}:00:00', float(hour)) for day in (1, 2, 3) for hour in range(10)])
+    before = rollups(client, sensor['id'], '1d')
+    job = RetentionJob(retention_days=10, interval=3600, chunk_size=4, chunk_pause=0)
+    deleted = job.run_once(now=datetime(2002, 3, 13, 6))
+    assert job.last_cutoff == datetime(2002, 3, 3)
+    assert deleted == 20
+    data = client.get(f"/sensors/{sensor['id']}/data").json()
+    assert {item['timestamp'][:10] for item in data} == {'2002-03-03'}
+    assert rollups(client, sensor['id'], '1d') == before
+    assert job.rebuilt_days == 0
+
+def test_interrupted_purge_keeps_rollups(client, sensor, monkeypatch):
+    post_readings(client, sensor['id'], [
+        (f'2003-05-01T{minute // 60:02d}:{minute % 60:02d}:00', minute * 0.5) for minute in range(100)])
+    before = rollups(client, sensor['id'], '1d')
+    job = RetentionJob(retention_days=10, interval=3600, chunk_size=30, chunk_pause=0)
+    # Остановка после первой порции удаления, как при завершении процесса
+    monkeypatch.setattr('retention.time.sleep', lambda seconds: job._stopping.set())
+    job.run_once(now=datetime(2003, 5, 12))
+    remaining = client.get(f"/sensors/{sensor['id']}/data").json()
+    assert len(remaining) == 70
+    job._stopping.clear()
+    monkeypatch.undo()
+    job.run_once(now=datetime(2003, 5, 12))
+    assert client.get(f"/sensors/{sensor['id']}/data").json() == []
+    assert rollups(client, sensor['id'], '1d') == before == [('2003-05-01T00:00:00', 100, 24.75, 0.0, 49.5, 49.5)]
+    assert job.rebuilt_days == 0
+
+def test_retention_rebuilds_missing_rollups(client, sensor):
+    post_readings(client, sensor['id'], [('2004-02-01T10:00:00', 1.0), ('2004-02-01T11:00:00', 3.0)])
+    with DBContext():
+        for model in RESOLUTIONS.values():
+            model.delete().where(model.sensor == sensor['id']).execute()
+    job = RetentionJob(retention_days=10, interval=3600, chunk_size=100, chunk_pause=0)
+    job.run_once(now=datetime(2004, 2, 12))
+    assert job.rebuilt_days == 1
+    assert rollups(client, sensor['id'], '1d') == [('2004-02-01T00:00:00', 2, 2.0, 1.0, 3.0, 3.0)]
+
+def test_changes_in_purged_day_adjust_rollups(client, sensor, monkeypatch):
+    post_readings(client, sensor['id'], [('2005-06-01T10:00:00', 1.0), ('2005-06-01T11:00:00', 2.0),
+                                          ('2005-06-01T12:00:00', 3.0)])
+    RetentionJob(retention_days=10, interval=3600, chunk_size=100, chunk_pause=0).run_once(now=datetime(2005, 6, 12))
+    monkeypatch.setattr('config.RAW_RETENTION_DAYS', 10)
+    # Опоздавшее показание за сутки, сырые данные которых уже удалены
+    late, = post_readings(client, sensor['id'], [('2005-06-01T20:00:00', 4.0)])
+    assert rollups(client, sensor['id'], '1d') == [('2005-06-01T00:00:00', 4, 2.5, 1.0, 4.0, 4.0)]
+    client.put(f'/weather-data/{late}', json={
+        'sensor_id': sensor['id'], 'timestamp': '2005-06-01T20:00:00', 'value': 6.0, 'quality': 90})
+    assert rollups(client, sensor['id'], '1d') == [('2005-06-01T00:00:00', 4, 3.0, 1.0, 6.0, 6.0)]
+    client.delete(f'/weather-data/{late}')
+    day, = rollups(client, sensor['id'], '1d')
+    assert day[:3] == ('2005-06-01T00:00:00', 3, 2.0)
+    assert rollups(client, sensor['id'], '1m')[0][:3] == ('2005-06-01T12:00:00', 1, 3.0)
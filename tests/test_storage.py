@@ -0,0 +1,123 @@
+"""Слой хранения показаний: пакетная вставка, помесячные секции, последние значения, сжатые сырые данные"""
+import json
+from datetime import date
+
+import pytest
+
+from models import database, DBContext
+from partitions import partition_table, registry
+from conftest import post_readings
+
+def test_batch_reports_each_reading(client, sensor):
+    response = client.post('/weather-data/batch', json={'readings': [
+        {'sensor_id': sensor['id'], 'timestamp': '2016-05-01T10:00:00', 'value': 12.5, 'quality': 90},
+        {'sensor_id': sensor['id'], 'timestamp': '2016-05-01T10:01:00', 'value': 100, 'quality': 90},
+        {'sensor_id': 999999, 'timestamp': '2016-05-01T10:02:00', 'value': 1, 'quality': 90},
+    ]})
+    body = response.json()
+    assert (body['accepted'], body['rejected']) == (1, 2)
+    assert body['results'][0]['accepted'] and body['results'][0]['id']
+    assert [result['error'] for result in body['results'][1:]] == [
+        'Значение выше максимального (60.0)', 'Датчик не найден']
+
+def test_readings_go_to_monthly_partitions(client, sensor):
+    ids = post_readings(client, sensor['id'], [
+        ('2015-01-31T23:59:00', 1.0), ('2015-02-01T00:00:00', 2.0), ('2015-02-15T12:00:00', 3.0)])
+    months = {item['month']: item['rows'] for item in client.get('/partitions').json()}
+    assert months['201501'] >= 1 and months['201502'] >= 2
+    data = client.get(f"/sensors/{sensor['id']}/data").json()
+    assert [item['id'] for item in data] == ids[::-1]
+
+def test_update_moves_reading_between_partitions(client, sensor):
+    data_id, = post_readings(client, sensor['id'], [('2015-03-10T08:00:00', 5.0)])
+    response = client.put(f'/weather-data/{data_id}', json={
+        'sensor_id': sensor['id'], 'timestamp': '2015-04-10T08:00:00', 'value': 6.0, 'quality': 80})
+    assert response.status_code == 200
+    data = client.get(f"/sensors/{sensor['id']}/data").json()
+    assert [(item['id'], item['timestamp'], item['value']) for item in data] == [
+        (data_id, '2015-04-10T08:00:00', 6.0)]
+
+def test_latest_keeps_newest_reading(client, sensor):
+    post_readings(client, sensor['id'], [('2017-06-01T12:00:00', 20.0), ('2017-06-01T11:00:00', 19.0)])
+    post_readings(client, sensor['id'], [('2017-06-01T10:00:00', 18.0)])
+    latest = client.get('/weather-data/latest', params={'station_id': sensor['station_id']}).json()
+    assert [(item['timestamp'], item['value']) for item in latest] == [('2017-06-01T12:00:00', 20.0)]
+
+def test_latest_falls_back_after_delete(client, sensor):
+    older, newer = post_readings(client, sensor['id'], [('2017-07-01T10:00:00', 1.0), ('2017-07-01T11:00:00', 2.0)])
+    assert client.delete(f'/weather-data/{newer}').status_code == 200
+    latest = client.get('/weather-data/latest', params={'station_id': sensor['station_id']}).json()
+    assert [item['id'] for item in latest] == [older]
+
+def test_raw_data_is_stored_compressed(client, sensor):
+    raw = {'raw': 12.5, 'battery': 90, 'samples': list(range(50))}
+    response = client.post('/weather-data/', json={
+        'sensor_id': sensor['id'], 'timestamp': '2016-08-01T00:00:00', 'value': 12.5, 'quality': 90, 'raw_data': raw})
+    data_id = response.json()['id']
+    with DBContext():
+        stored, = database.execute_sql(
+            f'SELECT raw_data FROM "{partition_table(date(2016, 8, 1))}" WHERE id = ?', (data_id,)).fetchone()
+    assert isinstance(stored, bytes) and stored[:1] == b'\x01'
+    assert len(stored) < len(str(raw))
+    url = f"/sensors/{sensor['id']}/data"
+    assert client.get(url).json()[0]['raw_data'] is None
+    assert client.get(url, params={'include_raw': 'true'}).json()[0]['raw_data'] == raw
+
+def test_failed_write_keeps_new_partition_usable(client, sensor, monkeypatch):
+    import rollups
+
+    def fail(rows):
+        raise RuntimeError('сбой записи')
+
+    monkeypatch.setattr(rollups, 'apply_readings', fail)
+    with pytest.raises(RuntimeError):
+        post_readings(client, sensor['id'], [('2014-06-01T00:00:00', 1.0)])
+    monkeypatch.undo()
+    data_id, = post_readings(client, sensor['id'], [('2014-06-02T00:00:00', 2.0)])
+    assert client.get('/partitions').status_code == 200
+    assert [item['id'] for item in client.get(f"/sensors/{sensor['id']}/data").json()] == [data_id]
+
+def test_aware_timestamps_are_stored_as_utc(client, sensor):
+    ids = post_readings(client, sensor['id'], [
+        ('2016-09-01T12:00:00Z', 1.0), ('2016-09-01T14:30:00+03:00', 2.0), ('2016-09-01T11:45:00', 3.0)])
+    data = client.get(f"/sensors/{sensor['id']}/data").json()
+    assert [(item['id'], item['timestamp']) for item in data] == [
+        (ids[0], '2016-09-01T12:00:00'), (ids[2], '2016-09-01T11:45:00'), (ids[1], '2016-09-01T11:30:00')]
+    latest = client.get('/weather-data/latest', params={'station_id': sensor['station_id']}).json()
+    assert [item['id'] for item in latest] == [ids[0]]
+    hours = client.get(f"/sensors/{sensor['id']}/data", params={'resolution': '1h'}).json()
+    assert [(item['timestamp'], item['count'], item['last_value']) for item in hours] == [
+        ('2016-09-01T12:00:00', 1, 1.0), ('2016-09-01T11:00:00', 2, 3.0)]
+    response = client.put(f'/weather-data/{ids[2]}', json={
+        'sensor_id': sensor['id'], 'timestamp': '2016-09-01T15:00:00+03:00', 'value': 4.0, 'quality': 90})
+    assert response.json()['timestamp'] == '2016-09-01T12:00:00'
+
+def test_aware_query_bounds_are_compared_in_utc(client, sensor):
+    post_readings(client, sensor['id'], [
+        ('2012-02-29T22:00:00', 1.0), ('2012-02-29T23:00:00', 2.0), ('2012-03-01T00:00:00', 3.0),
+        ('2012-03-01T01:00:00', 4.0), ('2012-03-01T02:00:00', 5.0), ('2012-03-01T03:00:00', 6.0)])
+    # Начало периода по UTC приходится на предыдущий месяц: нужны обе секции
+    window = {'start_time': '2012-03-01T02:00:00+03:00', 'end_time': '2012-03-01T05:00:00+03:00'}
+    data = client.get(f"/sensors/{sensor['id']}/data", params=window).json()
+    assert [item['value'] for item in data] == [5.0, 4.0, 3.0, 2.0]
+    hours = client.get(f"/sensors/{sensor['id']}/data", params={**window, 'resolution': '1h'}).json()
+    assert [item['last_value'] for item in hours] == [5.0, 4.0, 3.0, 2.0]
+    stats = client.get(f"/sensors/{sensor['id']}", params=window).json()
+    assert (stats['data_count'], stats['min_value'], stats['max_value']) == (4, 2.0, 5.0)
+    station = client.get(f"/stations/{sensor['station_id']}", params=window).json()
+    assert station['sensors'][0]['data_count'] == 4
+    exported = client.get('/weather-data/export', params={
+        'sensor_ids': sensor['id'], 'start': '2012-03-01T02:00:00Z', 'end': '2012-03-01T03:00:00Z'})
+    assert [json.loads(line)['value'] for line in exported.text.splitlines()] == [5.0, 6.0]
+
+def test_partition_list_follows_external_changes(client, sensor):
+    post_readings(client, sensor['id'], [('2011-02-01T00:00:00', 1.0)])
+    with DBContext():
+        # Другой процесс удаляет одну секцию и создает другую в обход реестра
+        database.execute_sql(f'DROP TABLE "{partition_table(date(2011, 2, 1))}"')
+        registry.model(date(2011, 1, 1)).create_table()
+    response = client.get('/partitions')
+    assert response.status_code == 200
+    months = {item['month'] for item in response.json()}
+    assert '201101' in months and '201102' not in months
+    assert client.delete('/partitions/201101').json()['rows'] == 0
@@ -0,0 +1,22 @@
+"""Выравнивание показаний станции на общую сетку"""
+from array import array
+
+import numpy as np
+import pytest
+
+from timeseries import align, parse_step
+
+def test_align_maps_sparse_sensor_ids_to_columns():
+    sensors = array('q', [10 ** 9, 7, 10 ** 9, 7, 42])
+    timestamps = array('q', [0, 500, 1500, 1200, 100])
+    values = array('d', [1.0, 2.0, 3.0, 4.0, 5.0])
+    result = align({7: 0, 42: 1, 10 ** 9: 1}, ['mean', 'max'], sensors, timestamps, values, 0, 1000, 2)
+    assert np.array_equal(result, [[2.0, 5.0], [4.0, 3.0]])
+
+@pytest.mark.parametrize('value', ['0s', '1w', 'h', '1.5h'])
+def test_parse_step_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_step(value)
+
+def test_parse_step():
+    assert parse_step('15m') == 900000
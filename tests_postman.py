@@ -165,6 +165,25 @@ def test_create_weather_data_negative():
     response = requests.post(f"{BASE_URL}/weather-data/", json=weather_data)
     print_response(response, "CREATE Weather Data (Негативный - некорректное значение)")
 
+def test_create_weather_data_batch():
+    """Позитивный/негативный тест: Пакетная отправка погодных данных"""
+    now = datetime.now()
+    readings = [
+        {
+            "sensor_id": 1,
+            "timestamp": (now - timedelta(minutes=i)).isoformat(),
+            "value": 20.0 + i * 0.1,
+            "quality": 95
+        }
+        for i in range(50)
+    ]
+    # Одно значение вне диапазона и один несуществующий датчик
+    readings.append({"sensor_id": 1, "timestamp": now.isoformat(), "value": -999, "quality": 95})
+    readings.append({"sensor_id": 99999, "timestamp": now.isoformat(), "value": 20.0, "quality": 95})
+    
+    response = requests.post(f"{BASE_URL}/weather-data/batch", json={"readings": readings})
+    print_response(response, "CREATE Weather Data Batch (50 принято, 2 отклонено)")
+
 def test_create_alert_positive(location_id):
     """Позитивный тест: Создание погодного предупреждения"""
     if not location_id:
@@ -377,6 +396,7 @@ def run_all_tests():
             
             # Создание данных
             weather_data_id = test_create_weather_data_positive(station_id)
+            test_create_weather_data_batch()
             alert_id = test_create_alert_positive(location_id)
             
             # Обновление
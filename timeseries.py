@@ -0,0 +1,73 @@
+"""Выравнивание показаний станции на общую временную сетку (NumPy)"""
+import re
+from array import array
+from typing import Dict, List
+
+import numpy as np
+
+AGGREGATIONS = ('mean', 'min', 'max', 'last')
+
+# Не больше строк сетки в одном ответе
+MAX_BUCKETS = 10000
+
+_STEP = re.compile(r'^(\d+)(s|m|h|d)$')
+_STEP_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def parse_step(value: str) -> int:
+    """Шаг сетки вида 30s, 15m, 1h, 1d в миллисекундах"""
+    match = _STEP.match(value)
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(value)
+    return int(match.group(1)) * _STEP_SECONDS[match.group(2)] * 1000
+
+def align(
+    sensor_columns: Dict[int, int],
+    aggregations: List[str],
+    sensors: array,
+    timestamps: array,
+    values: array,
+    start_ms: int,
+    step_ms: int,
+    nbuckets: int
+) -> np.ndarray:
+    """Матрица (интервал сетки x колонка) из показаний нескольких датчиков.
+
+    sensor_columns сопоставляет датчику колонку (несколько датчиков одного типа попадают в одну),
+    aggregations задает свертку каждой колонки. Показания сортируются один раз по (ячейка, время),
+    после чего все свертки считаются по границам групп через reduceat; пустые ячейки — NaN.
+    """
+    result = np.full((nbuckets, len(aggregations)), np.nan)
+    if not values:
+        return result
+    sensors = np.frombuffer(sensors, dtype=np.int64)
+    timestamps = np.frombuffer(timestamps, dtype=np.int64)
+    values = np.frombuffer(values, dtype=np.float64)
+
+    # Показания читаются только для датчиков из sensor_columns, поэтому id всегда находится
+    # среди отсортированных; размер таблицы — число датчиков, а не наибольший id
+    sensor_ids = np.array(sorted(sensor_columns), dtype=np.int64)
+    lookup = np.array([sensor_columns[sensor_id] for sensor_id in sensor_ids.tolist()], dtype=np.int64)
+    columns = lookup[np.searchsorted(sensor_ids, sensors)]
+    buckets = (timestamps - start_ms) // step_ms
+    keep = (buckets >= 0) & (buckets < nbuckets)
+    cells = columns[keep] * nbuckets + buckets[keep]
+    order = np.lexsort((timestamps[keep], cells))
+    cells = cells[order]
+    values = values[keep][order]
+    if not len(cells):
+        return result
+
+    starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+    ends = np.r_[starts[1:], len(cells)]
+    group_columns, group_buckets = np.divmod(cells[starts], nbuckets)
+    reducers = {
+        'mean': lambda: np.add.reduceat(values, starts) / (ends - starts),
+        'min': lambda: np.minimum.reduceat(values, starts),
+        'max': lambda: np.maximum.reduceat(values, starts),
+        'last': lambda: values[ends - 1],
+    }
+    wanted = np.array(aggregations)
+    for aggregation in set(aggregations):
+        mask = wanted[group_columns] == aggregation
+        result[group_buckets[mask], group_columns[mask]] = reducers[aggregation]()[mask]
+    return result